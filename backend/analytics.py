@@ -0,0 +1,280 @@
+# backend/analytics.py
+"""
+Due aging and collections reports, computed on columnar arrays.
+
+Each shard keeps dues and successful payments as pandas frames, reloaded
+only when data_version() of the table changes (file mtime and size, or the
+SQLite table version). Transactions only ever grow, so a change reads just
+what was appended since the last load: the byte tail of transactions.csv,
+or the rows past the last id on SQLite. Reports are then groupby, bincount
+and cumulative sums over those arrays, memoized until either table changes.
+
+pandas is imported on first use, so the API starts without it.
+"""
+import csv
+import io
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from os import getenv
+
+from backend.records import rupees
+from backend.utils import (
+    DUES_CSV, TRANSACTIONS_CSV,
+    current_shard, data_version, ensure_headers, get_sqlite, iter_records, shard_path
+)
+
+# upper bounds (days since the last payment) of the aging buckets; the rest is 90+
+AGING_BOUNDS = (30, 60, 90)
+AGING_LABELS = ("0-30", "31-60", "61-90", "90+", "no_payment")
+PERIODS = {"day": "D", "week": "W", "month": "M"}
+REPORT_CACHE_SIZE = int(getenv("ANALYTICS_REPORT_CACHE", "64"))
+
+TX_COLUMNS = ["date", "username", "amount", "status", "mode"]
+
+
+def _read_transactions(data: bytes, header: list):
+    """TX_COLUMNS of headerless CSV rows whose columns are named by `header`."""
+    import pandas as pd
+    if not data:
+        return pd.DataFrame({c: pd.Series([], dtype=object) for c in TX_COLUMNS})
+    positions = sorted(header.index(c) for c in TX_COLUMNS)
+    # repeated values parse straight to categories; the amount straight to float
+    dtypes = {i: "category" for i in positions}
+    dtypes[header.index("date")] = str
+    dtypes[header.index("amount")] = "float64"
+    try:
+        frame = pd.read_csv(io.BytesIO(data), header=None, usecols=positions, dtype=dtypes,
+                            keep_default_na=False, na_values={header.index("amount"): [""]}, engine="c")
+    except ValueError:  # a malformed amount: parse it as text, _payments() coerces it
+        dtypes[header.index("amount")] = str
+        frame = pd.read_csv(io.BytesIO(data), header=None, usecols=positions, dtype=dtypes,
+                            keep_default_na=False, engine="c")
+    frame.columns = [header[i] for i in positions]
+    return frame
+
+
+def _decode(column, fn=None):
+    """Object array of a string column, applying fn() once per distinct value."""
+    import numpy as np
+    column = column.astype("category")
+    values = [str(c) for c in column.cat.categories] + [""]  # code -1 (missing) -> ""
+    if fn is not None:
+        values = [fn(v) for v in values]
+    return np.array(values, dtype=object)[column.cat.codes.to_numpy()]
+
+
+def _payments(raw):
+    """Successful payments from raw transaction columns: day, username, amount (paise), mode."""
+    import numpy as np
+    import pandas as pd
+    status = _decode(raw["status"])
+    raw = raw[(status == "Success") | (status == "")]
+    amount = pd.to_numeric(raw["amount"], errors="coerce").fillna(0).to_numpy(dtype="float64")
+    return pd.DataFrame({
+        "day": pd.to_datetime(raw["date"].str.slice(0, 10), format="%Y-%m-%d", errors="coerce").to_numpy(),
+        "username": _decode(raw["username"]),
+        "amount": np.rint(amount * 100).astype("int64"),
+        "mode": _decode(raw["mode"], lambda m: m.lower() or "unknown"),
+    })
+
+
+def _load_dues():
+    import numpy as np
+    import pandas as pd
+    db = get_sqlite()
+    if db is not None:
+        rows = db.select("dues", ["username", "customer", "due"])
+        frame = pd.DataFrame.from_records(rows, columns=["username", "customer", "due"])
+        amount = pd.to_numeric(frame["due"], errors="coerce").fillna(0).to_numpy(dtype="float64")
+        frame["due"] = np.rint(amount * 100).astype("int64")
+        return frame
+    records = list(iter_records(DUES_CSV))
+    return pd.DataFrame({
+        "username": [d.username for d in records],
+        "customer": [d.customer for d in records],
+        "due": np.fromiter((d.due for d in records), dtype="int64", count=len(records)),
+    })
+
+
+class Frames:
+    """One shard's dues and payments as DataFrames, kept in step with the data."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dues = None
+        self._dues_version = None
+        self._payments = None
+        self._tx_version = None
+        self._tx_position = None  # (inode, byte offset, header) on CSV, last id on SQLite
+        self._reports = OrderedDict()
+
+    def _append_payments(self, new, reset: bool):
+        import pandas as pd
+        if reset or self._payments is None:
+            self._payments = new
+        elif len(new):
+            self._payments = pd.concat([self._payments, new], ignore_index=True)
+
+    def _load_csv_payments(self):
+        path = shard_path(TRANSACTIONS_CSV)
+        ensure_headers(path)
+        inode, offset, names = self._tx_position or (None, 0, None)
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            reset = inode != st.st_ino or st.st_size < offset  # first load, or the file was replaced
+            if reset:
+                names = next(csv.reader([f.readline().decode("utf-8")]), [])
+                offset = f.tell()
+            f.seek(offset)
+            data = f.read(max(0, st.st_size - offset))
+        data = data[:data.rfind(b"\n") + 1]  # the last row may still be being written
+        if data or reset:
+            self._append_payments(_payments(_read_transactions(data, names)), reset)
+        self._tx_position = (st.st_ino, offset + len(data), names)
+
+    def _load_sqlite_payments(self, db):
+        import pandas as pd
+        last = self._tx_position or 0
+        rows = db.select("transactions", ["id"] + TX_COLUMNS, "id > ?", (last,))
+        reset = self._payments is None or (not rows and last)  # rewritten, not appended
+        if reset and not rows:
+            last = 0
+            rows = db.select("transactions", ["id"] + TX_COLUMNS)
+        raw = pd.DataFrame.from_records(rows, columns=["id"] + TX_COLUMNS)
+        self._append_payments(_payments(raw), reset)
+        self._tx_position = int(raw["id"].iloc[-1]) if rows else last
+
+    def snapshot(self):
+        """(dues, payments, version) as of now; the frames must not be modified."""
+        with self._lock:
+            version = data_version(DUES_CSV)
+            if version != self._dues_version:
+                self._dues, self._dues_version = _load_dues(), version
+            version = data_version(TRANSACTIONS_CSV)
+            if version != self._tx_version:
+                db = get_sqlite()
+                if db is not None:
+                    self._load_sqlite_payments(db)
+                else:
+                    self._load_csv_payments()
+                self._tx_version = version
+            return self._dues, self._payments, (self._dues_version, self._tx_version)
+
+    def report(self, name: str, params: tuple, compute):
+        """compute(dues, payments), memoized on the parameters and the data versions."""
+        dues, payments, version = self.snapshot()
+        key = (name, params, version)
+        with self._lock:
+            if key in self._reports:
+                self._reports.move_to_end(key)
+                return self._reports[key]
+        result = compute(dues, payments)
+        with self._lock:
+            self._reports[key] = result
+            while len(self._reports) > REPORT_CACHE_SIZE:
+                self._reports.popitem(last=False)
+        return result
+
+
+def frames() -> Frames:
+    """The current shard's frames."""
+    return current_shard().resource("analytics", lambda shard: Frames())
+
+
+# ---------- Reports ----------
+
+def _day(value):
+    return None if value != value else str(value)[:10]  # NaT -> None
+
+
+def aging(as_of: str = None, top: int = 10) -> dict:
+    """
+    Outstanding dues by days since each customer's last payment (0-30,
+    31-60, 61-90, 90+; customers who never paid are "no_payment"), plus the
+    `top` largest debtors.
+    """
+    as_of = as_of or date.today().isoformat()
+
+    def compute(dues, payments):
+        import numpy as np
+        import pandas as pd
+        owing = dues[dues["due"].to_numpy() > 0]
+        last_paid = payments.groupby("username", sort=False)["day"].max().reindex(owing["username"])
+        last_paid.index = owing.index
+        days = (pd.Timestamp(as_of) - pd.to_datetime(last_paid)).dt.days.to_numpy(dtype="float64")
+        bucket = np.searchsorted(AGING_BOUNDS, days, side="left")
+        bucket[np.isnan(days)] = len(AGING_LABELS) - 1
+        due = owing["due"].to_numpy()
+        counts = np.bincount(bucket, minlength=len(AGING_LABELS))
+        totals = np.bincount(bucket, weights=due, minlength=len(AGING_LABELS))
+
+        debtors = owing.assign(last_paid=last_paid, days=days).nlargest(top, "due")
+        return {
+            "as_of": as_of,
+            "total_due": rupees(int(due.sum())),
+            "customers_with_due": int(len(owing)),
+            "buckets": [{"bucket": label, "customers": int(n), "due": rupees(int(t))}
+                        for label, n, t in zip(AGING_LABELS, counts, totals)],
+            "top_debtors": [{
+                "username": r.username,
+                "customer": r.customer,
+                "due": rupees(int(r.due)),
+                "last_payment": _day(r.last_paid),
+                "days_since_payment": None if r.days != r.days else int(r.days),
+            } for r in debtors.itertuples(index=False)],
+        }
+
+    return frames().report("aging", (as_of, top), compute)
+
+
+def collections(period: str = "month", start: str = None, end: str = None) -> dict:
+    """
+    Payments collected per day, week or month in [start, end] (whole periods),
+    with the collection rate: collected / balance at the start of the period.
+    That balance is approximated as today's outstanding dues plus everything
+    paid since the period began. Dues carry no creation date, so dues added
+    after the period began are counted too: for older periods the opening
+    balance is overstated and the rate understated.
+    """
+    def compute(dues, payments):
+        import pandas as pd
+        due = dues["due"].to_numpy()
+        outstanding = int(due[due > 0].sum())
+        by_period = payments.groupby(payments["day"].dt.to_period(PERIODS[period]))["amount"]
+        table = pd.DataFrame({"collected": by_period.sum(), "payments": by_period.size()}).sort_index()
+        # what was paid in each period or later, i.e. a reverse cumulative sum
+        paid_since = table["collected"].iloc[::-1].cumsum().iloc[::-1]
+        table["opening"] = outstanding + paid_since
+
+        starts = table.index.start_time
+        keep = pd.Series(True, index=table.index)
+        if start:
+            keep &= table.index.end_time >= pd.Timestamp(start[:10])
+        if end:
+            keep &= starts <= pd.Timestamp(end[:10])
+        table = table[keep.to_numpy()]
+
+        if len(table):
+            first, last = table.index[0].start_time, table.index[-1].end_time
+            in_range = payments[(payments["day"] >= first) & (payments["day"] <= last)]
+        else:
+            in_range = payments.iloc[:0]
+        by_mode = in_range.groupby("mode")["amount"].sum().sort_values(ascending=False)
+        return {
+            "period": period,
+            "outstanding": rupees(outstanding),
+            "periods": [{
+                "period": str(p.start_time.date()) if period == "week" else str(p),
+                "payments": int(row.payments),
+                "collected": rupees(int(row.collected)),
+                "opening_due": rupees(int(row.opening)),
+                "collection_rate": round(row.collected / row.opening, 4) if row.opening else None,
+            } for p, row in zip(table.index, table.itertuples(index=False))],
+            "by_mode": {mode: rupees(int(amount)) for mode, amount in by_mode.items()},
+        }
+
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    return frames().report("collections", (period, start, end), compute)
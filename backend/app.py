@@ -1,5 +1,6 @@
 # backend/app.py
 import sys
+from os import getenv
 from flask import Flask
 from flask_cors import CORS
 
@@ -20,6 +21,23 @@ def create_app():
     CORS(app)
     app.register_blueprint(routes_bp, url_prefix="/api")
     app.register_blueprint(payments_bp, url_prefix="/api")
+
+    # request timing, GET /metrics and the slow-request log
+    from backend import metrics
+    from backend.decorators import API_KEY, require_operator_key
+    from backend.utils import DATA_PATH, init_data_files
+    init_data_files()
+    # /metrics covers every tenant: operator key only, unless METRICS_PUBLIC=1
+    public = getenv("METRICS_PUBLIC", "0") == "1"
+    metrics.init_app(app,
+                     slow_ms=float(getenv("SLOW_REQUEST_MS", "0")),
+                     profile=getenv("SLOW_REQUEST_PROFILE", "0") == "1",
+                     profile_dir=DATA_PATH / "profiles",
+                     guard=None if public else require_operator_key(expected=API_KEY))
+
+    from backend import webhooks
+    if webhooks.WEBHOOK_SECRET and webhooks.WEBHOOK_WORKER:
+        webhooks.start_workers()
     return app
 
 
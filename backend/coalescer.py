@@ -0,0 +1,94 @@
+# backend/coalescer.py
+"""
+Group commit for due updates.
+
+Requests hand their (username, delta) to a single committer thread and wait.
+The committer collects deltas for up to `window` seconds or `max_batch`
+items, applies the whole batch with one durable write, then wakes every
+waiter at once. Enabled with DUE_COMMIT_WINDOW_MS > 0 (see backend/utils.py).
+"""
+import bisect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Upper bounds of the (non-cumulative) histogram buckets reported by stats()
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+LATENCY_BUCKETS_MS = [0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+
+class DueCoalescer:
+    def __init__(self, commit, window: float = 0.005, max_batch: int = 256):
+        """`commit(deltas)` applies [(username, delta), ...] and returns one result per delta."""
+        self.commit = commit
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._size_hist = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._latency_hist = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self._thread = threading.Thread(target=self._run, name="due-coalescer", daemon=True)
+        self._thread.start()
+
+    def submit(self, username: str, delta: int):
+        """Queue a delta and block until the batch containing it is durable."""
+        fut = Future()
+        self._pending.put((username, delta, fut))
+        return fut.result()
+
+    def _collect(self) -> list:
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.commit([(u, d) for u, d, _ in batch])
+            except Exception as e:
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            latency = time.perf_counter() - started
+            for (_, _, fut), result in zip(batch, results):
+                fut.set_result(result)
+            self._record(len(batch), latency)
+
+    def _record(self, size: int, latency: float):
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+            self._size_hist[bisect.bisect_left(BATCH_SIZE_BUCKETS, size)] += 1
+            self._latency_hist[bisect.bisect_left(LATENCY_BUCKETS_MS, latency * 1000)] += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            batches = self._batches or 1
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": self._items / batches,
+                "avg_commit_ms": self._latency_total / batches * 1000,
+                "max_commit_ms": self._latency_max * 1000,
+                "batch_size_histogram": dict(zip(map(str, BATCH_SIZE_BUCKETS + ["+Inf"]), self._size_hist)),
+                "commit_ms_histogram": dict(zip(map(str, LATENCY_BUCKETS_MS + ["+Inf"]), self._latency_hist)),
+            }
@@ -1,13 +1,69 @@
 from functools import wraps
-from flask import request, jsonify
+from os import getenv
+from flask import request, jsonify, g
+from backend.shards import ShardNotServed, load_tenant_keys
+from backend.utils import get_shard
 
-# Simple example decorator for API key protection (optional)
-def require_api_key(param_name="x-api-key", expected=None):
+# Operator key: may act on any tenant named by TENANT_HEADER
+API_KEY = getenv("API_KEY") or None
+# API key -> tenant ("key1=shop1,key2=shop2" or a JSON file); see backend/shards.py
+TENANT_KEYS = load_tenant_keys(getenv("TENANT_API_KEYS", ""))
+# Header naming the tenant for operator-key callers ("" = never trust a header)
+TENANT_HEADER = getenv("TENANT_HEADER", "X-Tenant")
+
+
+def select_shard(tenant):
+    """Bind this request to `tenant`'s shard; returns an error response if it cannot be served here."""
+    try:
+        g.shard = get_shard(tenant)
+    except ShardNotServed as e:
+        return jsonify({"error": str(e), "worker": e.worker}), 421
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return None
+
+
+def require_api_key(param_name="x-api-key", expected=None, exempt=()):
+    """
+    Reject requests without a valid key and run the view on the caller's shard.
+    A key from TENANT_API_KEYS selects its tenant. Any other caller needs
+    `expected` (when set, or when tenant keys exist at all) and gets the
+    default shard; only a caller presenting `expected` may name a tenant with
+    TENANT_HEADER, since opening a shard also creates it. Endpoints in
+    `exempt` authenticate themselves.
+    """
     def deco(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
+            if request.endpoint in exempt:
+                return f(*args, **kwargs)
             key = request.headers.get(param_name)
-            if expected and key != expected:
+            tenant = TENANT_KEYS.get(key) if key else None
+            if tenant is None:
+                operator = bool(expected) and key == expected
+                if not (operator or (not expected and not TENANT_KEYS)):
+                    return jsonify({"error": "Unauthorized"}), 401
+                tenant = request.headers.get(TENANT_HEADER) if TENANT_HEADER else None
+                if tenant and not operator:
+                    return jsonify({"error": "Naming a tenant needs the operator API key"}), 403
+            error = select_shard(tenant)
+            if error is not None:
+                return error
+            return f(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def require_operator_key(param_name="x-api-key", expected=None):
+    """
+    Admit only callers presenting `expected`, for endpoints that span every
+    tenant (such as /metrics); tenant keys are refused. As in
+    require_api_key, an install with no keys at all is left open.
+    """
+    def deco(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if (expected or TENANT_KEYS) and not (expected and request.headers.get(param_name) == expected):
                 return jsonify({"error": "Unauthorized"}), 401
             return f(*args, **kwargs)
         return wrapper
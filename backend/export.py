@@ -0,0 +1,139 @@
+# backend/export.py
+"""
+Streaming exports of transactions and dues as CSV, gzip-compressed CSV or Parquet.
+
+Rows are read in keyset batches of EXPORT_BATCH_ROWS through iter_page(), so
+filters run in the storage layer (SQL on SQLite, the row stream on CSV) and
+no batch holds a SQLite connection or table lock for longer than one read.
+Each batch is encoded and handed to the response before the next is read,
+which keeps memory flat however large the export grows.
+
+pyarrow is only needed for Parquet and is imported on first use.
+"""
+import csv
+import io
+import zlib
+from decimal import Decimal
+from os import getenv
+
+from backend.records import to_paise
+from backend.utils import iter_page
+
+EXPORT_BATCH_ROWS = int(getenv("EXPORT_BATCH_ROWS", "10000"))
+EXPORT_GZIP_LEVEL = int(getenv("EXPORT_GZIP_LEVEL", "6"))
+
+FORMATS = ("csv", "parquet")
+COMPRESSIONS = ("gzip",)
+MONEY_FIELDS = {"amount", "due"}
+
+
+def iter_batches(file, **filters):
+    """Lists of up to EXPORT_BATCH_ROWS matching rows, in storage order."""
+    after = None
+    while True:
+        batch = []
+        for after, row in iter_page(file, after, EXPORT_BATCH_ROWS, **filters):
+            batch.append(row)
+        if batch:
+            yield batch
+        if len(batch) < EXPORT_BATCH_ROWS:
+            return
+
+
+# ---------- Encoders ----------
+
+def csv_chunks(batches, fields: list):
+    """One UTF-8 CSV chunk per batch, the header first."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    yield buf.getvalue().encode("utf-8")
+    for batch in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([row.get(f, "") for f in fields] for row in batch)
+        yield buf.getvalue().encode("utf-8")
+
+
+def gzip_chunks(chunks):
+    """Compress a byte stream into a single gzip member as it goes."""
+    z = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip header and trailer
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+class _ChunkSink:
+    """Write-only file for pyarrow; what it wrote is drained after each row group."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _rupees(value):
+    """A stored amount as an exact Decimal, or None if it does not parse."""
+    try:
+        return Decimal(to_paise(value)).scaleb(-2)
+    except ValueError:
+        return None
+
+
+def parquet_chunks(batches, fields: list, compression: str = "snappy"):
+    """A Parquet file written one row group per batch; money columns are decimal(18, 2)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    money = pa.decimal128(18, 2)
+    schema = pa.schema([(f, money if f in MONEY_FIELDS else pa.string()) for f in fields])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression=compression) as writer:
+        for batch in batches:
+            columns = [pa.array([_rupees(row.get(f)) for row in batch], money) if f in MONEY_FIELDS
+                       else pa.array([row.get(f, "") for row in batch], pa.string())
+                       for f in fields]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            yield sink.drain()
+    yield sink.drain()  # the footer
+
+
+def open_export(file, fields: list, fmt: str = "csv", compress: str = None, **filters):
+    """
+    (chunks, mimetype, file suffix) for exporting `fields` of `file` rows
+    matching `filters` (see iter_page). Raises ValueError for an unknown
+    format or compression, and ImportError for Parquet without pyarrow.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if compress not in (None,) + COMPRESSIONS:
+        raise ValueError(f"compress must be one of {', '.join(COMPRESSIONS)}")
+    batches = iter_batches(file, **filters)
+    if fmt == "parquet":
+        import pyarrow.parquet  # noqa: F401  (fail before the response starts)
+        # Parquet compresses its pages itself: gzip selects the codec
+        return parquet_chunks(batches, fields, compress or "snappy"), "application/vnd.apache.parquet", ".parquet"
+    if compress == "gzip":
+        return gzip_chunks(csv_chunks(batches, fields)), "application/gzip", ".csv.gz"
+    return csv_chunks(batches, fields), "text/csv", ".csv"
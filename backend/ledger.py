@@ -0,0 +1,162 @@
+# backend/ledger.py
+"""
+Per-customer transaction ledger for the CSV storage engine.
+
+transactions.csv stays the complete, append-only record. Every row is also
+appended to a partition holding one customer's transactions for one month:
+
+    ledger/<bucket>/<username>/<YYYY-MM>.csv
+
+so a customer's history is read from their own files only, newest month
+first, whatever the size of transactions.csv. Partition files have no header
+(columns are in FIELDNAMES order) and every batch is one O_APPEND write.
+
+Appenders hold `ledger/.lock` shared around writing transactions.csv and
+the partitions; building the ledger from transactions.csv holds it exclusive,
+so a build never misses or doubles a row. The ledger is built on first use,
+or on demand. If writing the partitions fails after transactions.csv was
+written, the ledger is marked unbuilt, so the next read rebuilds it:
+
+    python -m backend.ledger rebuild
+"""
+import csv
+import io
+import logging
+import os
+import re
+import shutil
+import sys
+import zlib
+from pathlib import Path
+
+from backend.locks import FileLock
+
+PARTITION_FANOUT = 256  # subdirectories the customer folders are spread over
+BUILD_FLUSH_ROWS = 100_000
+
+_SAFE_NAME = re.compile(r"^[a-z0-9]+$")
+_MONTH = re.compile(r"^\d{4}-\d{2}$")
+
+log = logging.getLogger(__name__)
+
+
+class Ledger:
+    def __init__(self, root: Path, source: Path, fieldnames: list):
+        self.root = Path(root)
+        self.source = Path(source)
+        self.fieldnames = list(fieldnames)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.lock = FileLock(self.root / ".lock")
+        self._marker = self.root / ".built"
+
+    # ---------- Layout ----------
+
+    def _customer_dir(self, username: str) -> Path:
+        # usernames are generated as [a-z0-9]+; anything else is hex-encoded
+        # so a request can never name a path outside the ledger
+        name = username if _SAFE_NAME.match(username) else "x" + username.encode("utf-8").hex()
+        bucket = zlib.crc32(username.encode("utf-8")) % PARTITION_FANOUT
+        return self.root / f"{bucket:02x}" / name
+
+    @staticmethod
+    def _month(row: dict) -> str:
+        month = (row.get("date") or "")[:7]
+        return month if _MONTH.match(month) else "0000-00"
+
+    def _encode(self, rows: list) -> bytes:
+        buf = io.StringIO()
+        csv.DictWriter(buf, fieldnames=self.fieldnames, extrasaction="ignore").writerows(rows)
+        return buf.getvalue().encode("utf-8")
+
+    def _write_partitions(self, rows: list):
+        parts = {}
+        for row in rows:
+            if row.get("username"):
+                parts.setdefault((row["username"], self._month(row)), []).append(row)
+        for (username, month), part in parts.items():
+            folder = self._customer_dir(username)
+            folder.mkdir(parents=True, exist_ok=True)
+            with open(folder / f"{month}.csv", "ab", buffering=0) as f:
+                f.write(self._encode(part))
+
+    # ---------- Writes ----------
+
+    def append(self, rows: list, write_source):
+        """Call write_source() to append `rows` to transactions.csv, then index them."""
+        self.ensure_built()
+        with self.lock.hold(shared=True):
+            write_source()
+            try:
+                self._write_partitions(rows)
+            except Exception as e:
+                # the rows are safe in transactions.csv; have the next read rebuild from it
+                self._marker.unlink(missing_ok=True)
+                log.error("ledger: partition write failed, will rebuild: %s: %s", type(e).__name__, e)
+
+    def ensure_built(self):
+        if not self._marker.exists():
+            self.rebuild(only_if_missing=True)
+
+    def rebuild(self, only_if_missing: bool = False) -> int:
+        """(Re)create every partition from transactions.csv; returns the row count."""
+        with self.lock.hold():
+            if only_if_missing and self._marker.exists():
+                return 0
+            self._marker.unlink(missing_ok=True)
+            for bucket in self.root.iterdir():
+                if bucket.is_dir():
+                    shutil.rmtree(bucket)
+            count = 0
+            batch = []
+            if self.source.exists():
+                with open(self.source, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        batch.append(row)
+                        count += 1
+                        if len(batch) >= BUILD_FLUSH_ROWS:
+                            self._write_partitions(batch)
+                            batch = []
+            self._write_partitions(batch)
+            self._marker.touch()
+            return count
+
+    # ---------- Reads ----------
+
+    def _read_partition(self, path: Path) -> list:
+        with open(path, "rb") as f:
+            data = f.read()
+        data = data[:data.rfind(b"\n") + 1]  # skip a batch still being written
+        return [dict(zip(self.fieldnames, values))
+                for values in csv.reader(io.StringIO(data.decode("utf-8")))]
+
+    def history(self, username: str, before=None, limit: int = 100):
+        """
+        Yield (cursor, row) for up to `limit` of the customer's transactions,
+        newest first. A cursor is [month, index]; pass it back as `before` to
+        continue with the rows older than it.
+        """
+        self.ensure_built()
+        folder = self._customer_dir(username)
+        if not folder.is_dir():
+            return
+        months = sorted((p.stem for p in folder.glob("*.csv")), reverse=True)
+        if before is not None:
+            months = [m for m in months if m <= before[0]]
+        count = 0
+        for month in months:
+            rows = self._read_partition(folder / f"{month}.csv")
+            end = len(rows)
+            if before is not None and month == before[0]:
+                end = min(end, int(before[1]))
+            for i in range(end - 1, -1, -1):
+                if count >= limit:
+                    return
+                count += 1
+                yield [month, i], rows[i]
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m backend.ledger rebuild")
+    from backend.utils import get_ledger
+    print(f"{get_ledger().rebuild()} transactions indexed")
@@ -0,0 +1,118 @@
+# backend/locks.py
+"""
+Cross-process and per-username locking for the CSV storage engine.
+
+Every table has one `<file>.lock` file. Byte 0 of it is the table lock:
+writers hold it shared while appending to the journal and compaction holds
+it exclusive while rewriting the snapshot. Bytes 1..STRIPES are per-username
+stripes, so read-modify-write cycles for the same customer serialize across
+processes while different customers proceed in parallel.
+
+POSIX record locks belong to the process, not the thread, so each stripe is
+also guarded by a threading.Lock inside the process.
+"""
+import errno
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+STRIPES = int(os.getenv("USER_LOCK_STRIPES", "4096"))
+
+
+class FileLock:
+    """Byte-range locks on a single lock file (one open handle per process)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd = None
+        self._fd_lock = threading.Lock()
+
+    def _handle(self) -> int:
+        if self._fd is None:
+            with self._fd_lock:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    def acquire(self, offset: int = 0, shared: bool = False):
+        fd = self._handle()
+        if fcntl is not None:
+            delay = 0.001
+            while True:
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX, 1, offset)
+                    return
+                except OSError as e:
+                    # The kernel's deadlock detection works per process, so two
+                    # multi-threaded processes waiting on each other's *different*
+                    # threads get a false EDEADLK. Back off and try again.
+                    if e.errno != errno.EDEADLK:
+                        raise
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.05)
+        else:
+            # msvcrt has no shared locks; LK_LOCK gives up after ~10s so retry
+            while True:
+                os.lseek(fd, offset, os.SEEK_SET)
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    return
+                except OSError:
+                    continue
+
+    def release(self, offset: int = 0):
+        fd = self._handle()
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset)
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    @contextmanager
+    def hold(self, offset: int = 0, shared: bool = False):
+        self.acquire(offset, shared)
+        try:
+            yield
+        finally:
+            self.release(offset)
+
+
+class UserLocks:
+    """Striped per-username locks, valid both across threads and processes."""
+
+    def __init__(self, file_lock: FileLock, stripes: int = STRIPES):
+        self.file_lock = file_lock
+        self.stripes = stripes
+        self._thread_locks = [threading.Lock() for _ in range(stripes)]
+
+    def stripe(self, username: str) -> int:
+        return zlib.crc32(username.encode("utf-8")) % self.stripes
+
+    @contextmanager
+    def hold(self, *usernames: str):
+        """Lock one or more usernames; stripes are taken in order to avoid deadlock."""
+        stripes = sorted({self.stripe(u) for u in usernames})
+        taken = []
+        try:
+            for s in stripes:
+                self._thread_locks[s].acquire()
+                try:
+                    self.file_lock.acquire(1 + s)
+                except BaseException:
+                    self._thread_locks[s].release()
+                    raise
+                taken.append(s)
+            yield
+        finally:
+            for s in reversed(taken):
+                self.file_lock.release(1 + s)
+                self._thread_locks[s].release()
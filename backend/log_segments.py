@@ -0,0 +1,102 @@
+# backend/log_segments.py
+"""
+Compressed, time-indexed segments of the activity log.
+
+When logs.csv is rotated it is moved into the segment directory as
+`logs-<stamp>.csv`, then sealed: gzip-compressed to `logs-<stamp>.csv.gz`
+with a sidecar `logs-<stamp>.idx.json` holding its time range and per-action
+row counts. Range queries read the sidecars and only open the segments that
+can contain matching rows.
+"""
+import csv
+import gzip
+import json
+import os
+from collections import Counter
+from pathlib import Path
+
+SEGMENT_GLOB = "logs-*.csv*"
+
+
+def index_path(segment: Path) -> Path:
+    stem = segment.name.split(".csv")[0]
+    return segment.with_name(stem + ".idx.json")
+
+
+def seal_segment(raw: Path) -> Path:
+    """Compress a rotated raw segment and write its sidecar index."""
+    gz = raw.with_name(raw.name + ".gz")
+    tmp = gz.with_name("." + gz.name + ".tmp")
+    first = last = None
+    actions = Counter()
+    rows = 0
+    with open(raw, newline="", encoding="utf-8") as src, \
+            gzip.open(tmp, "wt", newline="", encoding="utf-8") as dst:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dst, fieldnames=reader.fieldnames or ["timestamp", "action", "details"])
+        writer.writeheader()
+        for row in reader:
+            writer.writerow(row)
+            ts = row.get("timestamp") or ""
+            first = ts if first is None or ts < first else first
+            last = ts if last is None or ts > last else last
+            actions[row.get("action") or ""] += 1
+            rows += 1
+    idx = index_path(gz)
+    idx_tmp = idx.with_name("." + idx.name + ".tmp")
+    with open(idx_tmp, "w", encoding="utf-8") as f:
+        json.dump({"from": first, "to": last, "rows": rows, "actions": dict(actions)}, f)
+    os.replace(idx_tmp, idx)
+    os.replace(tmp, gz)
+    raw.unlink()
+    return gz
+
+
+def _read_index(segment: Path):
+    try:
+        with open(index_path(segment), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _skip(idx, start, end, action) -> bool:
+    if idx is None:
+        return False
+    if not idx.get("rows"):
+        return True
+    if start and idx["to"] < start:
+        return True
+    if end and idx["from"] > end:
+        return True
+    return bool(action) and action not in idx.get("actions", {})
+
+
+def _scan(f, start, end, action):
+    for row in csv.DictReader(f):
+        ts = row.get("timestamp") or ""
+        if start and ts < start:
+            continue
+        if end and ts > end:
+            continue
+        if action and row.get("action") != action:
+            continue
+        yield row
+
+
+def iter_logs(log_file: Path, segment_dir: Path, start=None, end=None, action=None):
+    """Yield log rows with start <= timestamp <= end (and matching action), oldest first."""
+    segments = sorted(segment_dir.glob(SEGMENT_GLOB), key=lambda p: p.name.split(".csv")[0])
+    for seg in segments:
+        if seg.name.endswith(".csv.gz"):
+            if _skip(_read_index(seg), start, end, action):
+                continue
+            with gzip.open(seg, "rt", newline="", encoding="utf-8") as f:
+                yield from _scan(f, start, end, action)
+        elif seg.name.endswith(".csv") and not seg.with_name(seg.name + ".gz").exists():
+            # rotated but not sealed yet
+            with open(seg, newline="", encoding="utf-8") as f:
+                yield from _scan(f, start, end, action)
+    if log_file.exists():
+        with open(log_file, newline="", encoding="utf-8") as f:
+            yield from _scan(f, start, end, action)
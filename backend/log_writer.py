@@ -0,0 +1,201 @@
+# backend/log_writer.py
+"""
+Background writer for the activity log.
+
+log_action() only puts a row on an in-process queue; a daemon thread drains
+it in batches and hands each batch to a sink. A batch is flushed when it
+reaches `batch_size` rows or `flush_interval` seconds after its first row,
+and everything left is flushed on shutdown. When the queue is full, callers
+block until the writer catches up (backpressure) instead of growing memory.
+A batch the sink fails to write twice is dropped, logged and counted in
+log_rows_dropped_total.
+
+The CSV sink can also rotate the file by size or by day into compressed
+segments (see backend/log_segments.py).
+"""
+import csv
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, date
+from pathlib import Path
+
+from backend import metrics
+from backend.locks import FileLock
+from backend.log_segments import seal_segment
+
+_STOP = object()
+
+log = logging.getLogger(__name__)
+
+ROWS_DROPPED = metrics.Counter("log_rows_dropped_total",
+                               "Activity log rows dropped after the sink failed twice.")
+
+
+class CsvSink:
+    """
+    Appends batches to a CSV file through one handle that stays open.
+
+    With a `segment_dir`, the file is rotated once it reaches `max_bytes` or,
+    if `daily`, when a row for a new day arrives. Writers in every process
+    hold `<file>.lock` shared while appending; rotation holds it exclusive
+    and the other processes reopen the new file on their next write.
+    """
+
+    def __init__(self, file: Path, fieldnames: list, segment_dir: Path = None,
+                 max_bytes: int = 0, daily: bool = False):
+        self.file = Path(file)
+        self.fieldnames = fieldnames
+        self.segment_dir = Path(segment_dir) if segment_dir else None
+        self.max_bytes = max_bytes
+        self.daily = daily
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(self.file.with_name(self.file.name + ".lock"))
+        self._header = self._encode(None)
+        self._f = None
+        self._day = None
+
+    def _open(self):
+        self._f = open(self.file, "ab", buffering=0)
+        if self._f.tell() <= 2:  # new or blank placeholder file
+            self._f.truncate(0)
+            self._f.write(self._header)
+        self._day = date.fromtimestamp(os.fstat(self._f.fileno()).st_mtime).isoformat()
+
+    def _ensure_open(self):
+        if self._f is not None:
+            try:
+                if os.stat(self.file).st_ino == os.fstat(self._f.fileno()).st_ino:
+                    return
+            except FileNotFoundError:
+                pass
+            # rotated away by another process
+            self._f.close()
+        self._open()
+
+    def _due_for_rotation(self, rows: list) -> bool:
+        size = os.fstat(self._f.fileno()).st_size
+        if size <= len(self._header):
+            return False
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        return self.daily and (rows[0].get("timestamp") or "")[:10] != self._day
+
+    def rotate(self, rows: list):
+        with self._file_lock.hold():
+            self._ensure_open()
+            if not self._due_for_rotation(rows):
+                return  # someone else got there first
+            self.segment_dir.mkdir(parents=True, exist_ok=True)
+            raw = self.segment_dir / f"logs-{datetime.now():%Y%m%d-%H%M%S-%f}.csv"
+            os.replace(self.file, raw)
+            self._f.close()
+            self._open()
+        seal_segment(raw)
+
+    def _encode(self, rows) -> bytes:
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=self.fieldnames, extrasaction="ignore")
+        if rows is None:
+            writer.writeheader()
+        else:
+            writer.writerows(rows)
+        return buf.getvalue().encode("utf-8")
+
+    def write(self, rows: list):
+        with self._lock:
+            if self.segment_dir is None:
+                if self._f is None:
+                    self._open()
+                self._write(rows)
+                return
+            with self._file_lock.hold(shared=True):
+                self._ensure_open()
+                rotate = self._due_for_rotation(rows)
+            if rotate:
+                self.rotate(rows)
+            with self._file_lock.hold(shared=True):
+                self._ensure_open()
+                self._write(rows)
+
+    def _write(self, rows: list):
+        # one O_APPEND write per batch, so batches from several processes never interleave
+        self._f.write(self._encode(rows))
+        self._day = (rows[-1].get("timestamp") or "")[:10] or self._day
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+
+class LogWriter:
+    def __init__(self, sink, max_queue: int = 10000, batch_size: int = 256,
+                 flush_interval: float = 0.5):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, row: dict):
+        """Queue a row; blocks while the queue is full."""
+        self._queue.put(row)
+
+    def flush(self):
+        """Block until every row queued so far has reached the sink."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def pending(self) -> int:
+        """Rows waiting to be written (approximate)."""
+        return self._queue.qsize()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self.sink.close()
+
+    def _write(self, batch: list):
+        """Hand a batch to the sink, retrying once; never raises."""
+        for _ in range(2):
+            try:
+                self.sink.write(batch)
+                return
+            except Exception as e:
+                # never let a bad disk take the writer thread down with it
+                error = e
+        ROWS_DROPPED.inc(len(batch))
+        log.error("activity log: dropped %d rows: %s: %s", len(batch), type(error).__name__, error)
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, dict):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+            # size or time threshold reached, or a flush/stop was requested
+            if batch:
+                self._write(batch)
+                batch = []
+            deadline = None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                return
@@ -0,0 +1,237 @@
+# backend/metrics.py
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are labelled and thread-safe; `render()` produces
+the body served at /metrics. Components that already keep their own numbers
+(the due coalescer, the log and mail queues) register a collector callback
+instead of being instrumented twice.
+
+This module imports nothing from the backend, so any layer can use it.
+"""
+import bisect
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for key, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts[:-1]):
+                cumulative += count
+                le = 'le="%s"' % (bound if bound == "+Inf" else f"{bound:g}")
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {counts[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+
+
+def register_collector(fn):
+    """`fn()` returns extra exposition lines (with their own HELP/TYPE) at scrape time."""
+    with _registry_lock:
+        _collectors.append(fn)
+
+
+def render() -> str:
+    with _registry_lock:
+        metrics, collectors = list(_registry), list(_collectors)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    for fn in collectors:
+        try:
+            lines.extend(fn())
+        except Exception:
+            pass  # a broken collector must not take /metrics down
+    return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name: str, help: str, value: float) -> list:
+    return [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value:g}"]
+
+
+def histogram_lines(name: str, help: str, buckets: dict, total: float, count: int) -> list:
+    """Exposition lines for a histogram kept elsewhere as non-cumulative {upper_bound: count}."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    cumulative = 0
+    for bound, n in buckets.items():
+        cumulative += n
+        lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+    lines.append(f"{name}_sum {total:g}")
+    lines.append(f"{name}_count {count}")
+    return lines
+
+
+# ---------- Metrics shared across modules ----------
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests served.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency, including streaming.",
+                         ("method", "route"))
+
+STORAGE_LATENCY = Histogram("storage_operation_duration_seconds", "Time spent in storage helpers.",
+                            ("op", "table"))
+STORAGE_ROWS = Counter("storage_rows_total", "Rows read, parsed or written by storage helpers.",
+                       ("op", "table"))
+STORAGE_BYTES = Counter("storage_bytes_total", "Bytes read from or written to data files.",
+                        ("direction", "table"))
+
+EMAIL_LATENCY = Histogram("email_send_duration_seconds", "Time to hand one message to SMTP.", ("path",))
+EMAILS = Counter("emails_total", "Email send attempts by outcome.", ("path", "outcome"))
+
+
+@contextmanager
+def storage_op(op: str, table: str):
+    """Time a storage call; the body sets `result["rows"]` to count rows."""
+    result = {"rows": 0}
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        STORAGE_LATENCY.observe(time.perf_counter() - started, op=op, table=table)
+        if result["rows"]:
+            STORAGE_ROWS.inc(result["rows"], op=op, table=table)
+
+
+# ---------- Flask integration ----------
+
+def init_app(app, slow_ms: float = 0, profile: bool = False, profile_dir=None, guard=None):
+    """
+    Time every request per route and serve GET /metrics, wrapped in the
+    `guard` decorator if given (e.g. an API key check). Requests slower than
+    `slow_ms` are logged; with `profile`, each request runs under cProfile and
+    slow ones leave a .prof dump in `profile_dir`.
+    """
+    import cProfile
+    import pstats
+    import io
+    from datetime import datetime
+    from flask import Response, g, request
+
+    def start():
+        g.metrics_started = time.perf_counter()
+        g.metrics_profile = None
+        if profile:
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:
+                return  # another profiler is active (e.g. a concurrent request on 3.12+)
+            g.metrics_profile = prof
+
+    def finish(response):
+        started = g.get("metrics_started")
+        if started is None:
+            return response
+        prof = g.get("metrics_profile")
+        method = request.method
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        path = request.path
+
+        def done():
+            # runs once the (possibly streamed) body has been sent
+            elapsed = time.perf_counter() - started
+            HTTP_LATENCY.observe(elapsed, method=method, route=route)
+            HTTP_REQUESTS.inc(method=method, route=route, status=response.status_code)
+            if not (slow_ms and elapsed * 1000 >= slow_ms):
+                return
+            details = f"{method} {path} took {elapsed * 1000:.0f} ms"
+            if prof is not None:
+                profile_dir.mkdir(parents=True, exist_ok=True)
+                # rules like /api/transactions/<username> hold characters Windows rejects
+                name = re.sub(r"[^A-Za-z0-9_.-]", "_", route.strip("/")) or "root"
+                dump = profile_dir / f"{datetime.now():%Y%m%d-%H%M%S-%f}-{name}.prof"
+                prof.dump_stats(str(dump))
+                top = io.StringIO()
+                pstats.Stats(prof, stream=top).sort_stats("cumulative").print_stats(8)
+                details += f" (profile: {dump.name})\n" + top.getvalue()
+            from backend.utils import log_action
+            log_action("slow_request", details)
+
+        if prof is not None:
+            prof.disable()
+        response.call_on_close(done)
+        return response
+
+    app.before_request(start)
+    app.after_request(finish)
+    def view():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", guard(view) if guard else view)
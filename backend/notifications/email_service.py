@@ -1,8 +1,12 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.utils import formataddr
+# Imported on first use (see services.py), so workers that never send mail
+# skip dotenv, smtplib and the email package; smtplib itself loads on the first send.
+import atexit
+import threading
+import time
+from concurrent.futures import Future
 from os import getenv
 from dotenv import load_dotenv
+from backend import metrics
 
 load_dotenv()
 
@@ -11,22 +15,77 @@ SMTP_PORT = int(getenv("SMTP_PORT", "587"))
 SMTP_USER = getenv("SMTP_USER", "")
 SMTP_PASS = getenv("SMTP_PASS", "")
 FROM_EMAIL = getenv("FROM_EMAIL", SMTP_USER or "no-reply@example.com")
+SMTP_STARTTLS = getenv("SMTP_STARTTLS", "1") == "1"
 
-def send_email(to_email: str, subject: str, body: str) -> bool:
-    if not (SMTP_USER and SMTP_PASS and to_email):
-        # Not configured; treat as no-op success to avoid breaking flows
-        return True
+# Pooled delivery used by queue_email (see mail_queue.py)
+MAIL_WORKERS = int(getenv("MAIL_WORKERS", "4"))
+MAIL_RATE_PER_MINUTE = int(getenv("MAIL_RATE_PER_MINUTE", "0"))
+MAIL_MAX_RETRIES = int(getenv("MAIL_MAX_RETRIES", "3"))
+MAIL_RETRY_BACKOFF = float(getenv("MAIL_RETRY_BACKOFF", "1.0"))
+
+_mail_queue = None
+_mail_queue_lock = threading.Lock()
+
+def _collect_metrics() -> list:
+    if _mail_queue is None:
+        return []
+    return metrics.gauge_lines("mail_queue_depth", "Emails waiting for an SMTP worker.",
+                               _mail_queue.pending())
+
+metrics.register_collector(_collect_metrics)
+
+def _build_message(to_email: str, subject: str, body: str) -> str:
+    from email.mime.text import MIMEText
+    from email.utils import formataddr
 
     msg = MIMEText(body, "html")
     msg["Subject"] = subject
     msg["From"] = formataddr(("Customer Due Tracker", FROM_EMAIL))
     msg["To"] = to_email
+    return msg.as_string()
 
+def send_email(to_email: str, subject: str, body: str) -> bool:
+    if not (SMTP_USER and SMTP_PASS and to_email):
+        # Not configured; treat as no-op success to avoid breaking flows
+        return True
+
+    started = time.perf_counter()
     try:
+        import smtplib
         with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as s:
-            s.starttls()
+            if SMTP_STARTTLS:
+                s.starttls()
             s.login(SMTP_USER, SMTP_PASS)
-            s.sendmail(FROM_EMAIL, [to_email], msg.as_string())
+            s.sendmail(FROM_EMAIL, [to_email], _build_message(to_email, subject, body))
+        outcome = "sent"
         return True
     except Exception:
+        outcome = "failed"
         return False
+    finally:
+        metrics.EMAIL_LATENCY.observe(time.perf_counter() - started, path="direct")
+        metrics.EMAILS.inc(path="direct", outcome=outcome)
+
+def get_mail_queue():
+    global _mail_queue
+    with _mail_queue_lock:
+        if _mail_queue is None:
+            from backend.notifications.mail_queue import MailQueue
+            _mail_queue = MailQueue(
+                SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS, starttls=SMTP_STARTTLS,
+                workers=MAIL_WORKERS, rate_per_minute=MAIL_RATE_PER_MINUTE,
+                max_retries=MAIL_MAX_RETRIES, backoff=MAIL_RETRY_BACKOFF,
+            )
+            atexit.register(_mail_queue.close)
+        return _mail_queue
+
+def queue_email(to_email: str, subject: str, body: str) -> Future:
+    """
+    Hand a message to the pooled SMTP workers and return immediately.
+    The Future resolves to True once sent (or when mail is not configured).
+    """
+    if not (SMTP_USER and SMTP_PASS and to_email):
+        fut = Future()
+        fut.set_result(True)
+        return fut
+    return get_mail_queue().submit(FROM_EMAIL, [to_email], _build_message(to_email, subject, body))
@@ -0,0 +1,165 @@
+# backend/notifications/mail_queue.py
+"""
+Outbound mail queue with a pool of SMTP worker threads.
+
+Each worker keeps one authenticated SMTP connection open and sends many
+messages over it, reconnecting when the server drops it, after
+`max_per_connection` messages, or when it has been idle for `idle_timeout`
+seconds. Failed sends are retried with exponential backoff, and all workers
+share a token bucket that caps the send rate per minute. Any other error
+fails just that message and is logged, so a worker never dies mid-queue.
+"""
+import logging
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+
+from backend import metrics
+
+_STOP = object()
+
+log = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket allowing `per_minute` sends (0 = unlimited)."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class MailQueue:
+    def __init__(self, host: str, port: int, user: str, password: str, starttls: bool = True,
+                 workers: int = 4, rate_per_minute: int = 0, max_retries: int = 3,
+                 backoff: float = 1.0, max_per_connection: int = 100,
+                 idle_timeout: float = 30.0, max_queue: int = 10000):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_per_connection = max_per_connection
+        self.idle_timeout = idle_timeout
+        self.limiter = RateLimiter(rate_per_minute)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._workers = [
+            threading.Thread(target=self._run, name=f"mail-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._workers:
+            t.start()
+
+    def submit(self, from_addr: str, to_addrs: list, message: str) -> Future:
+        """Queue a message; the Future resolves to True once sent, False if it gave up."""
+        fut = Future()
+        self._queue.put((from_addr, to_addrs, message, fut))
+        return fut
+
+    def pending(self) -> int:
+        """Messages waiting for a worker (approximate)."""
+        return self._queue.qsize()
+
+    def close(self, wait: bool = True):
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        if wait:
+            for t in self._workers:
+                t.join()
+
+    # ---------- Worker ----------
+
+    def _connect(self):
+        s = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            s.starttls()
+        if self.user:
+            s.login(self.user, self.password)
+        return s
+
+    @staticmethod
+    def _disconnect(conn):
+        if conn is None:
+            return
+        try:
+            conn.quit()
+        except Exception:
+            conn.close()
+
+    def _run(self):
+        conn = None
+        sent_on_conn = 0
+        while True:
+            try:
+                job = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect(conn)  # idle: don't hold a server slot
+                conn = None
+                continue
+            if job is _STOP:
+                self._disconnect(conn)
+                return
+            from_addr, to_addrs, message, fut = job
+            if not fut.set_running_or_notify_cancel():
+                continue
+            self.limiter.acquire()
+            started = time.perf_counter()
+            outcome = "failed"
+            for attempt in range(self.max_retries + 1):
+                reused = conn is not None
+                try:
+                    if conn is None or sent_on_conn >= self.max_per_connection:
+                        self._disconnect(conn)
+                        conn = None
+                        conn = self._connect()
+                        sent_on_conn = 0
+                    conn.sendmail(from_addr, to_addrs, message)
+                    sent_on_conn += 1
+                    fut.set_result(True)
+                    outcome = "sent"
+                    break
+                except smtplib.SMTPRecipientsRefused:
+                    # permanent for this message; retrying won't help
+                    fut.set_result(False)
+                    outcome = "refused"
+                    break
+                except (smtplib.SMTPException, OSError):
+                    # connection may be half-dead; start fresh on the next attempt
+                    self._disconnect(conn)
+                    conn = None
+                    # a pooled connection the server dropped is retried right away
+                    if attempt < self.max_retries and not reused:
+                        time.sleep(self.backoff * (2 ** attempt))
+                except Exception as e:
+                    # e.g. UnicodeEncodeError for a non-ASCII address without SMTPUTF8
+                    log.error("mail queue: giving up on a message to %s: %s: %s",
+                              ", ".join(map(str, to_addrs)), type(e).__name__, e)
+                    self._disconnect(conn)
+                    conn = None
+                    fut.set_result(False)
+                    break
+            else:
+                fut.set_result(False)
+            metrics.EMAIL_LATENCY.observe(time.perf_counter() - started, path="queue")
+            metrics.EMAILS.inc(path="queue", outcome=outcome)
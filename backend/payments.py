@@ -1,19 +1,29 @@
 # backend/payments.py
-import razorpay
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
 from datetime import datetime
-from backend.utils import (
-    DUES_CSV, TRANSACTIONS_CSV,
-    read_csv, write_csv, ensure_headers, log_action
-)
+from backend.utils import current_shard, get_shard, log_action
+from backend.services import apply_payments, reconcile_settlement
+from backend import razorpay_orders, webhooks
+from backend.records import format_paise, to_paise
+from backend.streaming import upload_records
+from backend.decorators import API_KEY, require_api_key
+from backend.shards import ShardNotServed
 
 payments_bp = Blueprint("payments", __name__)
 
+
+@payments_bp.before_request
+@require_api_key(expected=API_KEY, exempt={"payments.razorpay_webhook"})
+def select_tenant():
+    """Check the caller's key and bind the request to its tenant's shard."""
+
+
 @payments_bp.route("/create_order", methods=["POST"])
 def create_order():
     """
     Create a Razorpay order using keys provided (not stored).
-    Body: { amount, mode, key_id, key_secret, upi_id, customer_name, username }
+    Body: { amount, mode, key_id, key_secret, upi_id, customer_name, username, async }
+    With "async": true, answers 202 with a pending_id to poll at /orders/<pending_id>.
     """
     data = request.json or {}
     try:
@@ -30,19 +40,21 @@ def create_order():
     if not all([amount > 0, mode in ("test", "live"), key_id, key_secret, owner_upi, customer_name, username]):
         return jsonify({"error": "Missing or invalid fields"}), 400
 
+    notes = {
+        "mode": mode,
+        "owner_upi": owner_upi,
+        "customer": customer_name,
+        "username": username
+    }
+    if current_shard().name:
+        notes["tenant"] = current_shard().name  # routes the signed webhook back to this shard
+    webhooks.watch()
+    if data.get("async"):
+        pending_id = razorpay_orders.submit_order(key_id, key_secret, mode, amount, notes)
+        return jsonify({"pending_id": pending_id, "status": "pending", "amount": amount}), 202
+
     try:
-        client = razorpay.Client(auth=(key_id, key_secret))
-        order = client.order.create({
-            "amount": amount * 100,  # paise
-            "currency": "INR",
-            "payment_capture": 1,
-            "notes": {
-                "mode": mode,
-                "owner_upi": owner_upi,
-                "customer": customer_name,
-                "username": username
-            }
-        })
+        order = razorpay_orders.create_order(key_id, key_secret, mode, amount, notes)
         return jsonify({
             "order_id": order["id"],
             "status": "created",
@@ -52,6 +64,15 @@ def create_order():
         return jsonify({"error": str(e)}), 500
 
 
+@payments_bp.route("/orders/<pending_id>", methods=["GET"])
+def order_status(pending_id):
+    """Poll an order created with "async": true."""
+    status = razorpay_orders.order_status(pending_id)
+    if status is None:
+        return jsonify({"error": "Unknown order"}), 404
+    return jsonify(status), 200
+
+
 @payments_bp.route("/confirm_payment", methods=["POST"])
 def confirm_payment():
     """
@@ -59,41 +80,74 @@ def confirm_payment():
     Body: { order_id, amount, customer_name, username, mode }
     """
     data = request.json or {}
-    order_id = data.get("order_id")
-    customer_name = data.get("customer_name")
-    username = data.get("username")
-    mode = (data.get("mode") or "test").lower()
+    if any(isinstance(data.get(k), (dict, list)) for k in ("order_id", "customer_name", "username", "mode")):
+        return jsonify({"error": "Invalid fields"}), 400
+    # JSON numbers are accepted but stored as text, like every other id
+    order_id = str(data.get("order_id") or "").strip()
+    customer_name = str(data.get("customer_name") or "").strip()
+    username = str(data.get("username") or "").strip()
+    mode = str(data.get("mode") or "test").lower()
     try:
-        amount = float(data.get("amount", 0))
-    except Exception:
-        amount = 0.0
+        amount = to_paise(data.get("amount", 0))
+    except ValueError:
+        amount = 0
 
     if not all([order_id, customer_name, username, amount > 0]):
         return jsonify({"error": "Missing fields"}), 400
 
-    # Reduce dues
-    dues = read_csv(DUES_CSV)
-    for d in dues:
-        if d["username"] == username:
-            current = float(d.get("due", 0))
-            d["due"] = f"{max(0.0, current - amount):.2f}"
-            break
-    write_csv(DUES_CSV, ["username", "customer", "due"], dues)
-
-    # Record transaction
-    ensure_headers(TRANSACTIONS_CSV)
-    with open(TRANSACTIONS_CSV, "a", newline="", encoding="utf-8") as f:
-        import csv
-        writer = csv.DictWriter(f, fieldnames=["date", "username", "customer", "amount", "order_id", "status", "mode"])
-        writer.writerow({
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "username": username,
-            "customer": customer_name,
-            "amount": f"{amount:.2f}",
-            "order_id": order_id,
-            "status": "Success",
-            "mode": mode
-        })
-
-    log_action("payment_success", f"{username} paid {amount} (order {order_id})")
+    # Retried webhooks and double clicks are recorded once; dues are left alone
+    applied = apply_payments([{
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "username": username,
+        "customer": customer_name,
+        "amount": format_paise(amount),
+        "order_id": order_id,
+        "status": "Success",
+        "mode": mode
+    }])
+    if not applied:
+        return jsonify({"success": True, "duplicate": True,
+                        "message": "Payment already recorded"}), 200
+
+    log_action("payment_success", f"{username} paid {format_paise(amount)} (order {order_id})")
     return jsonify({"success": True, "message": "Payment confirmed, dues updated"}), 200
+
+
+@payments_bp.route("/razorpay/webhook", methods=["POST"])
+def razorpay_webhook():
+    """
+    Razorpay webhook (payment.captured / order.paid). The event is verified
+    and stored; dues are updated shortly after by the webhook worker.
+    Authenticated by its signature instead of an API key. The shard comes from
+    the signed order notes, never from the URL, so an event cannot be replayed
+    into another tenant. Any pinned worker accepts it: an event for a tenant
+    served elsewhere goes to that tenant's inbox (see backend/webhooks.py).
+    """
+    if not webhooks.WEBHOOK_SECRET:
+        return jsonify({"error": "Webhook secret not configured"}), 503
+    body = request.get_data()
+    if not webhooks.verify_signature(body, request.headers.get("X-Razorpay-Signature", "")):
+        return jsonify({"error": "Invalid signature"}), 400
+    event_id = request.headers.get("X-Razorpay-Event-Id", "")
+    try:
+        g.shard = get_shard(webhooks.event_tenant(body))
+    except ShardNotServed as e:
+        webhooks.forward(e.tenant, body, event_id)
+        return jsonify({"status": "accepted"}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    webhooks.accept(body, event_id)
+    return jsonify({"status": "accepted"}), 200
+
+
+@payments_bp.route("/payments/reconcile", methods=["POST"])
+def reconcile_payments():
+    """
+    Bulk reconciliation of a daily settlement file.
+    Body: CSV (text/csv) or NDJSON (application/x-ndjson) with
+    username, amount, reference_id and optional mode, date.
+    """
+    records = upload_records()
+    if records is None:
+        return jsonify({"error": "Send text/csv or application/x-ndjson"}), 415
+    return jsonify(reconcile_settlement(records)), 200
@@ -0,0 +1,178 @@
+# backend/razorpay_orders.py
+"""
+Razorpay order creation with cached clients and an optional async mode.
+
+Clients are cached per (key_id, mode), each with its own pooled HTTP
+session, so repeated orders reuse warm keep-alive connections instead of
+opening a new TLS connection per request. A cached client is replaced when
+the caller presents a different secret for the same key.
+
+In async mode the API answers immediately with a `pending_...` id and a
+worker thread creates the order; the client polls /api/orders/<pending_id>.
+Pending results live in a small journaled table so any API process can
+answer the poll. A job is only reported failed once it started and stalled,
+or once the process that queued it has gone: one still waiting for a worker
+stays pending, since it may yet create the order.
+"""
+import hashlib
+import hmac
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from os import getenv
+
+from backend.store import IndexedTable
+from backend.utils import DATA_PATH, current_shard, log_action, shard_path
+
+RAZORPAY_BASE_URL = getenv("RAZORPAY_BASE_URL", "")  # e.g. a local fake server
+RAZORPAY_TIMEOUT = float(getenv("RAZORPAY_TIMEOUT", "15"))
+RAZORPAY_POOL_SIZE = int(getenv("RAZORPAY_POOL_SIZE", "10"))
+RAZORPAY_CLIENT_CACHE = int(getenv("RAZORPAY_CLIENT_CACHE", "32"))  # 0 = new client per order
+ORDER_WORKERS = int(getenv("ORDER_WORKERS", "8"))
+PENDING_ORDER_TTL = int(getenv("PENDING_ORDER_TTL_HOURS", "24")) * 3600
+
+PENDING_ORDERS_CSV = DATA_PATH / "pending_orders.csv"
+PENDING_FIELDS = ["id", "status", "order_id", "amount", "error", "created", "started", "owner"]
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+_executor = None
+_last_prune = {}  # pending orders file -> time of its last prune
+
+
+# ---------- Clients ----------
+
+def _new_client(key_id: str, key_secret: str):
+    # imported on first use: the SDK and its HTTP stack cost ~60 ms at startup
+    import razorpay
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=RAZORPAY_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    options = {"base_url": RAZORPAY_BASE_URL} if RAZORPAY_BASE_URL else {}
+    return razorpay.Client(session=session, auth=(key_id, key_secret), **options)
+
+
+def get_client(key_id: str, key_secret: str, mode: str):
+    if RAZORPAY_CLIENT_CACHE <= 0:
+        return _new_client(key_id, key_secret)
+    secret_hash = hashlib.sha256(key_secret.encode("utf-8")).digest()
+    with _clients_lock:
+        entry = _clients.get((key_id, mode))
+        if entry is not None and hmac.compare_digest(entry[0], secret_hash):
+            _clients.move_to_end((key_id, mode))
+            return entry[1]
+    client = _new_client(key_id, key_secret)
+    with _clients_lock:
+        _clients[(key_id, mode)] = (secret_hash, client)
+        _clients.move_to_end((key_id, mode))
+        while len(_clients) > RAZORPAY_CLIENT_CACHE:
+            _, (_, old) = _clients.popitem(last=False)
+            old.session.close()
+    return client
+
+
+def create_order(key_id: str, key_secret: str, mode: str, amount: int, notes: dict) -> dict:
+    """Create an order for `amount` rupees; raises on any Razorpay or network error."""
+    client = get_client(key_id, key_secret, mode)
+    return client.order.create({
+        "amount": amount * 100,  # paise
+        "currency": "INR",
+        "payment_capture": 1,
+        "notes": notes
+    }, timeout=RAZORPAY_TIMEOUT)
+
+
+# ---------- Async mode ----------
+
+def _pending_table() -> IndexedTable:
+    """The current shard's pending orders; also starts the (process-wide) order workers."""
+    global _executor
+    with _clients_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ORDER_WORKERS, thread_name_prefix="razorpay-order")
+    return current_shard().resource(
+        "pending_orders", lambda shard: IndexedTable(shard_path(PENDING_ORDERS_CSV), PENDING_FIELDS, key="id"))
+
+
+def _prune(table: IndexedTable):
+    """Forget results older than PENDING_ORDER_TTL (at most once an hour per file)."""
+    now = time.time()
+    if now - _last_prune.get(table.file, 0.0) < 3600:
+        return
+    _last_prune[table.file] = now
+    for row in table.rows():
+        if now - float(row.get("created") or 0) > PENDING_ORDER_TTL:
+            table.delete(row["id"])
+
+
+def _owner_alive(owner: str) -> bool:
+    """Whether the process that queued a job still runs (assumed so on another host)."""
+    if not owner:
+        return False  # queued before owners were recorded, i.e. before a restart
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by someone else
+    return True
+
+
+def _run(pending_id: str, created: str, args: tuple):
+    key_id, key_secret, mode, amount, notes = args
+    table = _pending_table()
+    row = {"id": pending_id, "status": "pending", "amount": str(amount), "created": created,
+           "started": f"{time.time():.3f}", "owner": OWNER}
+    table.put(row)
+    try:
+        order = create_order(key_id, key_secret, mode, amount, notes)
+        row.update(status="created", order_id=order["id"])
+    except Exception as e:
+        row.update(status="failed", error=str(e))
+        log_action("order_failed", f"{notes.get('username')}: {e}")
+    table.put(row)
+    _prune(table)
+
+
+def submit_order(key_id: str, key_secret: str, mode: str, amount: int, notes: dict) -> str:
+    """Queue order creation and return a pending id to poll with order_status()."""
+    table = _pending_table()
+    pending_id = f"pending_{uuid.uuid4().hex}"
+    created = f"{time.time():.0f}"
+    table.put({"id": pending_id, "status": "pending", "amount": str(amount), "created": created,
+               "owner": OWNER})
+    _executor.submit(current_shard().bind(_run), pending_id, created, (key_id, key_secret, mode, amount, notes))
+    return pending_id
+
+
+def order_status(pending_id: str):
+    """{"status": "pending" | "created" | "failed", ...} or None for an unknown id."""
+    row = _pending_table().get(pending_id)
+    if row is None:
+        return None
+    status = {"pending_id": pending_id, "status": row["status"], "amount": int(row["amount"] or 0)}
+    started = float(row.get("started") or 0)
+    if row["status"] == "pending" and not _owner_alive(row.get("owner")):
+        status.update(status="failed", error="The server handling this order stopped")
+    elif row["status"] == "pending" and started and time.time() - started > 3 * RAZORPAY_TIMEOUT:
+        # create_order() gives up after RAZORPAY_TIMEOUT, so this worker is stuck
+        status.update(status="failed", error="Order creation timed out")
+    elif row["status"] == "created":
+        status["order_id"] = row["order_id"]
+    elif row["status"] == "failed":
+        status["error"] = row["error"]
+    status["created"] = datetime.fromtimestamp(float(row["created"] or 0)).strftime("%Y-%m-%d %H:%M:%S")
+    return status
@@ -0,0 +1,135 @@
+# backend/records.py
+"""
+Typed rows and money.
+
+Money is held as integer paise: parsed once when a row is loaded (or once
+per request), added exactly, and turned back into "123.45" only where it
+leaves the process (CSV, journal, JSON). Customer, Due and Transaction are
+__slots__ records, so a loaded table keeps one small object per row instead
+of a dict plus a string for every amount.
+
+Records are never changed in place once stored: writers build a new row and
+put it, so readers may share them freely.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+_CENT = Decimal("0.01")
+
+
+def to_paise(value) -> int:
+    """Rupees ("123.45", 123.45, 123) -> paise, rounding half up. Raises ValueError."""
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return 0
+        # fast path for what the data files hold: [-]digits[.d[d]]
+        point = text.find(".")
+        decimals = len(text) - point - 1 if point >= 0 else 0
+        if decimals <= 2 and "e" not in text and "E" not in text:
+            try:
+                digits = int(text[:point] + text[point + 1:] if point >= 0 else text)
+                return digits * (1, 10, 100)[2 - decimals]
+            except ValueError:
+                pass
+    elif value is None:
+        return 0
+    elif isinstance(value, int) and not isinstance(value, bool):
+        return value * 100
+    elif isinstance(value, float):
+        value = repr(value)  # the shortest exact spelling, so 0.1 stays 0.1
+    try:
+        amount = Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"invalid amount: {value!r}") from None
+    if not amount.is_finite():
+        raise ValueError(f"invalid amount: {value!r}")
+    return int((amount.quantize(_CENT, rounding=ROUND_HALF_UP) * 100).to_integral_value())
+
+
+def format_paise(paise: int) -> str:
+    """Paise -> "123.45"."""
+    sign = "-" if paise < 0 else ""
+    whole, cents = divmod(abs(paise), 100)
+    return f"{sign}{whole}.{cents:02d}"
+
+
+def rupees(paise: int) -> float:
+    """Paise -> a float for JSON responses (exact to the paisa)."""
+    return round(paise / 100, 2)
+
+
+def money(row, field: str) -> int:
+    """Paise in `field` of a record or a plain dict row (0 if blank or invalid)."""
+    if isinstance(row, Record):
+        return getattr(row, field)
+    try:
+        return to_paise(row.get(field))
+    except ValueError:
+        return 0
+
+
+class Record:
+    """Base for slotted rows; `__slots__` doubles as the CSV column order."""
+    __slots__ = ()
+    MONEY = ()  # fields held as paise
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_row(cls, row: dict):
+        rec = cls.__new__(cls)
+        for name in cls.__slots__:
+            value = row.get(name)
+            if name in cls.MONEY:
+                try:
+                    value = to_paise(value)
+                except ValueError:
+                    value = 0
+            elif value is None:
+                value = ""
+            setattr(rec, name, value)
+        return rec
+
+    def get(self, name: str, default=None):
+        """dict-style access to the stored (CSV) form of a field."""
+        if name not in self.__slots__:
+            return default
+        value = getattr(self, name)
+        return format_paise(value) if name in self.MONEY else value
+
+    def __getitem__(self, name: str):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return self.get(name)
+
+    def as_row(self) -> dict:
+        return {name: self.get(name) for name in self.__slots__}
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values() == other._values()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{n}={getattr(self, n)!r}' for n in self.__slots__)})"
+
+
+class Customer(Record):
+    __slots__ = ("name", "email", "phone", "username", "password")
+
+
+class Due(Record):
+    __slots__ = ("username", "customer", "due")
+    MONEY = ("due",)
+
+
+class Transaction(Record):
+    __slots__ = ("date", "username", "customer", "amount", "order_id", "status", "mode")
+    MONEY = ("amount",)
@@ -1,13 +1,99 @@
 # backend/routes.py
-from flask import Blueprint, request, jsonify
+import itertools
+import zlib
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from backend.services import (
     create_customer_account,
+    bulk_create_customers,
     change_password_service,
+    login_service,
     record_offline_payment
 )
+from backend.utils import (
+    CUSTOMERS_CSV, DUES_CSV, TRANSACTIONS_CSV, TIMESTAMP_RE,
+    iter_logs, iter_page, iter_history, data_version
+)
+from backend import stats
+from backend.decorators import API_KEY, require_api_key
+from backend.records import to_paise
+from backend.streaming import (
+    stream_json_array, stream_ndjson, stream_page, upload_records, decode_cursor
+)
 
 routes_bp = Blueprint("routes", __name__)
 
+
+@routes_bp.before_request
+@require_api_key(expected=API_KEY)
+def select_tenant():
+    """Check the caller's key and bind the request to its tenant's shard."""
+
+
+PAGE_DEFAULT_LIMIT = 100
+PAGE_MAX_LIMIT = 1000
+
+# Fields each read endpoint may return (passwords are never exposed)
+CUSTOMER_FIELDS = ["name", "email", "phone", "username"]
+DUE_FIELDS = ["username", "customer", "due"]
+TRANSACTION_FIELDS = ["date", "username", "customer", "amount", "order_id", "status", "mode"]
+
+
+def _date_range():
+    """Parse ?from=&to= (inclusive); raises ValueError on a malformed date."""
+    start = (request.args.get("from") or "").strip().replace("T", " ")
+    end = (request.args.get("to") or "").strip().replace("T", " ")
+    for value in (start, end):
+        if value and not TIMESTAMP_RE.match(value):
+            raise ValueError("Dates must be YYYY-MM-DD or YYYY-MM-DD HH:MM:SS")
+    if len(end) == 10:
+        end += " 23:59:59"  # a bare date means the whole day
+    elif len(end) == 16:
+        end += ":59"
+    return start or None, end or None
+
+
+def _paged(file, allowed_fields: list, fetch=None, **filters):
+    """
+    Shared GET handler: ?limit=&cursor=&fields= plus the given filters.
+    Streams one keyset page and answers If-None-Match with 304 when the
+    underlying data has not changed. `fetch(after, limit)` replaces the
+    default iter_page() over `file`.
+    """
+    try:
+        limit = int(request.args.get("limit", PAGE_DEFAULT_LIMIT))
+        cursor = request.args.get("cursor")
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": str(e) if "cursor" in str(e) else "Invalid limit"}), 400
+    limit = max(1, min(limit, PAGE_MAX_LIMIT))
+    fields = allowed_fields
+    if request.args.get("fields"):
+        fields = [f.strip() for f in request.args["fields"].split(",") if f.strip()]
+        unknown = [f for f in fields if f not in allowed_fields]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    etag = f"{data_version(file)}-{zlib.crc32(request.query_string):08x}"
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+    if fetch is None:
+        pairs = iter_page(file, after, limit, **filters)
+    else:
+        pairs = fetch(after, limit)
+    try:
+        # a cursor of the wrong shape only fails once the query starts
+        first = list(itertools.islice(pairs, 1))
+    except (TypeError, ValueError, IndexError):
+        return jsonify({"error": "Invalid cursor"}), 400
+    resp = Response(stream_with_context(stream_page(itertools.chain(first, pairs), limit, fields)),
+                    mimetype="application/json")
+    resp.set_etag(etag)
+    return resp
+
+
 @routes_bp.route("/create_customer", methods=["POST"])
 def create_customer():
     data = request.json or {}
@@ -22,10 +108,36 @@ def create_customer():
         return jsonify({"error": str(e)}), 400
 
 
+@routes_bp.route("/customers/bulk", methods=["POST"])
+def bulk_create_customers_api():
+    """
+    Streamed bulk import. Body: CSV (text/csv) or NDJSON (application/x-ndjson)
+    with name, email, phone and optional due. Responds with one NDJSON result per row.
+    """
+    records = upload_records()
+    if records is None:
+        return jsonify({"error": "Send text/csv or application/x-ndjson"}), 415
+    return Response(stream_with_context(stream_ndjson(bulk_create_customers(records))),
+                    mimetype="application/x-ndjson")
+
+
+@routes_bp.route("/login", methods=["POST"])
+def login():
+    """Body: { username or email, password }"""
+    data = request.json or {}
+    identifier = (data.get("username") or data.get("email") or "").strip()
+    password = data.get("password") or ""
+    if not (identifier and password):
+        return jsonify({"error": "Missing fields"}), 400
+    res = login_service(identifier, password)
+    code = 200 if "success" in res else 401
+    return jsonify(res), code
+
+
 @routes_bp.route("/change_password", methods=["POST"])
 def change_password():
     data = request.json or {}
-    username = data.get("username", "").strip()
+    username = (data.get("username") or data.get("email") or "").strip()
     old_password = data.get("old_password", "")
     new_password = data.get("new_password", "")
     if not (username and old_password and new_password):
@@ -41,9 +153,9 @@ def record_offline_payment_api():
     username = data.get("username", "").strip()
     customer = data.get("customer", "").strip()
     try:
-        amount = float(data.get("amount", 0))
-    except Exception:
-        amount = 0.0
+        amount = to_paise(data.get("amount", 0))
+    except ValueError:
+        amount = 0
 
     if not (username and customer and amount > 0):
         return jsonify({"error": "Missing fields"}), 400
@@ -51,3 +163,142 @@ def record_offline_payment_api():
     res = record_offline_payment(username, customer, amount)
     code = 200 if "success" in res else 400
     return jsonify(res), code
+
+
+@routes_bp.route("/logs", methods=["GET"])
+def logs():
+    """
+    Stream activity log rows as a JSON array.
+    Query: from, to (YYYY-MM-DD or YYYY-MM-DD HH:MM:SS, inclusive), action
+    """
+    try:
+        start, end = _date_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    action = (request.args.get("action") or "").strip()
+    # streamed with the request context, which carries the tenant's shard
+    return Response(stream_with_context(stream_json_array(iter_logs(start, end, action or None))),
+                    mimetype="application/json")
+
+
+@routes_bp.route("/stats", methods=["GET"])
+def dashboard_stats():
+    """Totals for the owner dashboard, read from incrementally maintained counters."""
+    resp = jsonify(stats.dashboard())
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+
+@routes_bp.route("/analytics/aging", methods=["GET"])
+def aging_report():
+    """
+    Outstanding dues bucketed by days since the last payment, plus top debtors.
+    Query: as_of (YYYY-MM-DD, default today), top (default 10)
+    """
+    as_of = (request.args.get("as_of") or "").strip()
+    try:
+        top = int(request.args.get("top", 10))
+        if as_of:
+            datetime.strptime(as_of, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "as_of must be YYYY-MM-DD and top a number"}), 400
+    from backend import analytics
+    resp = jsonify(analytics.aging(as_of or None, max(0, min(top, PAGE_MAX_LIMIT))))
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+
+@routes_bp.route("/analytics/collections", methods=["GET"])
+def collections_report():
+    """
+    Collected amount, payment count and collection rate per period.
+    Query: period (day, week or month; default month), from, to
+    """
+    from backend import analytics
+    try:
+        start, end = _date_range()
+        report = analytics.collections(request.args.get("period", "month"), start, end)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    resp = jsonify(report)
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+
+def _export(file, fields: list, name: str, **filters):
+    """
+    Shared export handler: ?format=csv|parquet&compress=gzip. The body is
+    streamed in batches with chunked transfer, bound to the request's shard.
+    """
+    from backend.export import open_export
+    fmt = (request.args.get("format") or "csv").strip().lower()
+    compress = (request.args.get("compress") or "").strip().lower() or None
+    try:
+        chunks, mimetype, suffix = open_export(file, fields, fmt, compress, **filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ImportError:
+        return jsonify({"error": "Parquet export needs pyarrow installed"}), 501
+    resp = Response(stream_with_context(chunks), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f'attachment; filename="{name}{suffix}"'
+    return resp
+
+
+@routes_bp.route("/export/transactions", methods=["GET"])
+def export_transactions():
+    """Query: format, compress, from, to, username"""
+    try:
+        start, end = _date_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return _export(TRANSACTIONS_CSV, TRANSACTION_FIELDS, "transactions",
+                   username=(request.args.get("username") or "").strip() or None,
+                   date_from=start, date_to=end)
+
+
+@routes_bp.route("/export/dues", methods=["GET"])
+def export_dues():
+    """Query: format, compress, min_due"""
+    try:
+        min_due = to_paise(request.args["min_due"]) if request.args.get("min_due") else None
+    except ValueError:
+        return jsonify({"error": "Invalid min_due"}), 400
+    return _export(DUES_CSV, DUE_FIELDS, "dues", min_due=min_due)
+
+
+@routes_bp.route("/customers", methods=["GET"])
+def list_customers():
+    """Query: limit, cursor, fields, username"""
+    return _paged(CUSTOMERS_CSV, CUSTOMER_FIELDS,
+                  username=(request.args.get("username") or "").strip() or None)
+
+
+@routes_bp.route("/dues", methods=["GET"])
+def list_dues():
+    """Query: limit, cursor, fields, username, min_due"""
+    try:
+        min_due = to_paise(request.args["min_due"]) if request.args.get("min_due") else None
+    except ValueError:
+        return jsonify({"error": "Invalid min_due"}), 400
+    return _paged(DUES_CSV, DUE_FIELDS,
+                  username=(request.args.get("username") or "").strip() or None,
+                  min_due=min_due)
+
+
+@routes_bp.route("/transactions", methods=["GET"])
+def list_transactions():
+    """Query: limit, cursor, fields, username, from, to (oldest first)"""
+    try:
+        start, end = _date_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return _paged(TRANSACTIONS_CSV, TRANSACTION_FIELDS,
+                  username=(request.args.get("username") or "").strip() or None,
+                  date_from=start, date_to=end)
+
+
+@routes_bp.route("/transactions/<username>", methods=["GET"])
+def customer_transactions(username):
+    """One customer's payment history, newest first. Query: limit, cursor, fields"""
+    return _paged(TRANSACTIONS_CSV, TRANSACTION_FIELDS,
+                  fetch=lambda after, limit: iter_history(username, after, limit))
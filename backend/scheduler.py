@@ -1,13 +1,180 @@
 """
-Optional simple scheduler (run separately if you want periodic jobs).
-Example: send reminders for high dues.
+Scheduler for periodic jobs (run separately from the API server).
+
+Sends due reminders once a day at DAILY_EMAIL_HOUR:DAILY_EMAIL_MINUTE to
+every customer whose due is at least REMINDER_MIN_DUE, or who still owes
+something and has not paid in REMINDER_AFTER_DAYS days. Each run covers the
+default shard and every tenant shard (see backend/shards.py).
+
+    python -m backend.scheduler          # run the daily schedule
+    python -m backend.scheduler --now    # send today's reminders once and exit
 """
+import bisect
+import sys
 import time
+from concurrent.futures import as_completed
+from datetime import datetime, timedelta
+from os import getenv
+from string import Template
+
 import schedule
-from backend.services import send_email  # if you add scheduled emails
+from backend.utils import (
+    CUSTOMERS_CSV, DUES_CSV, TRANSACTIONS_CSV, DATA_PATH, SHARDS,
+    iter_logs, iter_records, iter_rows, log_action, shard_path
+)
+from backend.notifications import email_service
+from backend.records import format_paise, to_paise
+from backend.shards import use_shard
+
+REMINDER_MIN_DUE = float(getenv("REMINDER_MIN_DUE", "1000"))
+REMINDER_AFTER_DAYS = int(getenv("REMINDER_AFTER_DAYS", "30"))
+REMINDER_BATCH_SIZE = int(getenv("REMINDER_BATCH_SIZE", "500"))
+DAILY_EMAIL_HOUR = int(getenv("DAILY_EMAIL_HOUR", "9"))
+DAILY_EMAIL_MINUTE = int(getenv("DAILY_EMAIL_MINUTE", "0"))
+SHOP_NAME = getenv("shop_name", "Customer Due Tracker")
+
+PROGRESS_DIR = DATA_PATH / "reminders"
+
+SUBJECT = Template("Payment reminder from $shop: Rs. $due due")
+BODY = Template(
+    "<p>Hello $name,</p>"
+    "<p>This is a friendly reminder that your outstanding due with <b>$shop</b> "
+    "is <b>Rs. $due</b>.</p>"
+    "<p>Log in with username <b>$username</b> to view your dues and pay online.</p>"
+)
+
+
+class DueIndex:
+    """
+    One-pass index over dues, customers and transactions for a reminder run:
+    dues sorted for threshold queries, plus each customer's email and last
+    payment date, so selecting recipients never rescans the CSV files.
+    """
+
+    def __init__(self):
+        self.dues = {}  # username -> paise
+        for d in iter_records(DUES_CSV):
+            if d.due > 0:
+                self.dues[d.username] = d.due
+        self._sorted = sorted((due, u) for u, due in self.dues.items())
+        self._keys = [due for due, _ in self._sorted]
+
+        self.customers = {}
+        for c in iter_rows(CUSTOMERS_CSV):
+            if c.get("username") in self.dues and c.get("email"):
+                self.customers[c["username"]] = c
+
+        self.last_paid = {}
+        for t in iter_rows(TRANSACTIONS_CSV):
+            u = t.get("username")
+            if u in self.dues and (t.get("date") or "") > self.last_paid.get(u, ""):
+                self.last_paid[u] = t["date"]
+
+    def above(self, threshold: float) -> list:
+        """Usernames with due >= threshold (paise), largest first."""
+        start = bisect.bisect_left(self._keys, threshold)
+        return [u for _, u in reversed(self._sorted[start:])]
+
+    def not_paid_since(self, cutoff: str) -> list:
+        """
+        Usernames with a due and no payment on or after `cutoff` (YYYY-MM-DD HH:MM:SS).
+        Customers have no creation date of their own, so one who never paid is
+        aged by their create_customer log entry and skipped while that is newer
+        than `cutoff`; with no entry (older than the logs) they count as overdue.
+        """
+        created = None
+        selected = []
+        for u in self.dues:
+            last = self.last_paid.get(u)
+            if last is None:
+                if created is None:
+                    created = {(r.get("details") or "").split(" ", 1)[0]
+                               for r in iter_logs(cutoff, None, "create_customer")}
+                if u in created:
+                    continue
+            elif last >= cutoff:
+                continue
+            selected.append(u)
+        return selected
+
+    def recipients(self, min_due: float, after_days: int) -> list:
+        """`min_due` is in rupees."""
+        cutoff = (datetime.now() - timedelta(days=after_days)).strftime("%Y-%m-%d %H:%M:%S")
+        selected = dict.fromkeys(self.above(to_paise(min_due)))
+        selected.update(dict.fromkeys(self.not_paid_since(cutoff)))
+        return [u for u in selected if u in self.customers]
+
+
+class Progress:
+    """Append-only record of who was reminded in a run, so a restart resumes."""
+
+    def __init__(self, run_id: str):
+        folder = shard_path(PROGRESS_DIR)
+        folder.mkdir(parents=True, exist_ok=True)
+        self.path = folder / f"{run_id}.sent"
+        self.sent = set()
+        if self.path.exists():
+            self.sent = set(self.path.read_text(encoding="utf-8").split())
+        self._f = open(self.path, "a", encoding="utf-8")
+
+    def mark(self, username: str):
+        self._f.write(username + "\n")
+        self._f.flush()
+        self.sent.add(username)
+
+    def close(self):
+        self._f.close()
+
+
+def run_reminders(run_id: str = None) -> dict:
+    if not (email_service.SMTP_USER and email_service.SMTP_PASS):
+        print("SMTP is not configured; skipping reminders")
+        return {"sent": 0, "failed": 0, "skipped": 0}
+
+    run_id = run_id or datetime.now().strftime("%Y-%m-%d")
+    index = DueIndex()
+    progress = Progress(run_id)
+    todo = [u for u in index.recipients(REMINDER_MIN_DUE, REMINDER_AFTER_DAYS)
+            if u not in progress.sent]
+    skipped = len(progress.sent)
+    sent = failed = 0
+    try:
+        for i in range(0, len(todo), REMINDER_BATCH_SIZE):
+            futures = {}
+            for username in todo[i:i + REMINDER_BATCH_SIZE]:
+                c = index.customers[username]
+                fields = {"name": c.get("name") or username, "username": username,
+                          "due": format_paise(index.dues[username]), "shop": SHOP_NAME}
+                fut = email_service.queue_email(c["email"], SUBJECT.substitute(fields),
+                                                BODY.substitute(fields))
+                futures[fut] = username
+            for fut in as_completed(futures):
+                if fut.result():
+                    progress.mark(futures[fut])
+                    sent += 1
+                else:
+                    failed += 1
+    finally:
+        progress.close()
+
+    log_action("due_reminders", f"run {run_id}: {sent} sent, {failed} failed, {skipped} already sent")
+    return {"sent": sent, "failed": failed, "skipped": skipped}
+
+
+def run_all_reminders() -> dict:
+    """run_reminders() on the default shard and on every tenant shard, keyed by tenant."""
+    results = {"default": run_reminders()}
+    for tenant in SHARDS.tenants():
+        with use_shard(SHARDS.get(tenant)):
+            results[tenant] = run_reminders()
+    return results
+
 
 def main():
-    # schedule.every().day.at("09:00").do(your_job)
+    if "--now" in sys.argv[1:]:
+        print(run_all_reminders())
+        return
+    schedule.every().day.at(f"{DAILY_EMAIL_HOUR:02d}:{DAILY_EMAIL_MINUTE:02d}").do(run_all_reminders)
     while True:
         schedule.run_pending()
         time.sleep(30)
@@ -1,77 +1,322 @@
 # backend/services.py
+import hmac
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from os import getenv
 from typing import Tuple
 from backend.utils import (
-    CUSTOMERS_CSV, DUES_CSV,
-    read_csv, write_csv, log_action,
+    CUSTOMERS_CSV, DUES_CSV, TRANSACTIONS_CSV,
+    get_row, find_rows, put_row, put_rows, update_row, adjust_due, adjust_dues,
+    append_rows, current_shard, get_order_index, log_action, normalize_timestamp,
     generate_unique_username, generate_random_password
 )
-from backend.notifications.email_service import send_email
+from backend.records import format_paise, rupees, to_paise
+from backend import stats
+
+BULK_CHUNK_SIZE = int(getenv("BULK_CHUNK_SIZE", "500"))
+
+
+def _signup_lock():
+    """Serializes "is this email free?" with the insert that claims it, per shard."""
+    return current_shard().resource("signup_lock", lambda shard: threading.Lock())
+
+
+def _account_email(name: str, username: str, password: str) -> str:
+    return (
+        f"<p>Hello {name},</p>"
+        f"<p>Your account has been created.</p>"
+        f"<p><b>Username:</b> {username}<br><b>Password:</b> {password}</p>"
+    )
+
+
+def _text(rec: dict, key: str) -> str:
+    """An uploaded field as stripped text. Numbers are accepted; nested values raise ValueError."""
+    value = rec.get(key)
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        raise ValueError(f"invalid {key}")
+    return str(value).strip()
+
+
+def email_registered(email: str) -> bool:
+    return bool(email and email.strip() and find_rows(CUSTOMERS_CSV, "email", email))
+
+
+def find_customer(identifier: str):
+    """Customer row by username or, failing that, by email (None if unknown)."""
+    identifier = (identifier or "").strip()
+    if not identifier:
+        return None
+    customer = get_row(CUSTOMERS_CSV, identifier)
+    if customer is None and "@" in identifier:
+        matches = find_rows(CUSTOMERS_CSV, "email", identifier)
+        customer = matches[0] if len(matches) == 1 else None
+    return customer
 
 
 def create_customer_account(name: str, email: str, phone: str) -> Tuple[str, str]:
     if not name:
         raise ValueError("Name is required")
 
-    username = generate_unique_username(name)
     password = generate_random_password()  # keep random generator
-
-    customers = read_csv(CUSTOMERS_CSV)
-    customers.append({
-        "name": name.strip(),
-        "email": (email or "").strip(),
-        "phone": (phone or "").strip(),
-        "username": username,
-        "password": password
-    })
-    write_csv(CUSTOMERS_CSV, ["name", "email", "phone", "username", "password"], customers)
+    with _signup_lock():
+        if email_registered(email):
+            raise ValueError("Email already registered")
+        username = generate_unique_username(name)
+        put_row(CUSTOMERS_CSV, {
+            "name": name.strip(),
+            "email": (email or "").strip(),
+            "phone": (phone or "").strip(),
+            "username": username,
+            "password": password
+        })
 
     # init dues if missing
-    dues = read_csv(DUES_CSV)
-    if not any(d.get("username") == username for d in dues):
-        dues.append({"username": username, "customer": name, "due": "0"})
-        write_csv(DUES_CSV, ["username", "customer", "due"], dues)
+    if get_row(DUES_CSV, username) is None:
+        put_row(DUES_CSV, {"username": username, "customer": name, "due": format_paise(0)})
+    stats.customers_added(1)
 
     log_action("create_customer", f"{username} ({name}) created")
 
-    # optional email
+    # optional email, delivered in the background by the mail queue
     if email:
-        send_email(
-            email,
-            "Your Account Details",
-            f"<p>Hello {name},</p>"
-            f"<p>Your account has been created.</p>"
-            f"<p><b>Username:</b> {username}<br><b>Password:</b> {password}</p>"
-        )
+        from backend.notifications.email_service import queue_email
+        queue_email(email, "Your Account Details", _account_email(name, username, password))
 
     return username, password
 
 
+def bulk_create_customers(records, chunk_size: int = BULK_CHUNK_SIZE):
+    """
+    Create customers from an iterable of dicts (name, email, phone, optional due).
+    Usernames come from the shared allocator, emails already registered (or
+    repeated in the upload) are rejected, customers.csv and dues.csv are
+    written once per chunk, and welcome emails are queued. Yields one result
+    per input row, in order, as each chunk is committed.
+
+    Emails are checked again under the signup lock when a chunk is written,
+    so a signup made meanwhile wins and its row is reported as a duplicate.
+    """
+    seen_emails = set()
+    customers, dues, emails, results = [], [], [], []
+
+    def commit():
+        with _signup_lock():
+            taken = {c["username"] for c in customers if c["email"] and email_registered(c["email"])}
+            if taken:
+                customers[:] = [c for c in customers if c["username"] not in taken]
+                dues[:] = [d for d in dues if d["username"] not in taken]
+                emails[:] = [e for e in emails if e[3] not in taken]
+                results[:] = [{"row": r["row"], "error": "Email already registered"}
+                              if r.get("username") in taken else r for r in results]
+            put_rows(CUSTOMERS_CSV, customers)
+        put_rows(DUES_CSV, dues)
+        stats.customers_added(len(customers))
+        stats.dues_changed([(0, to_paise(d["due"])) for d in dues])
+        for c in customers:
+            log_action("create_customer", f"{c['username']} ({c['name']}) created")
+        if emails:
+            from backend.notifications.email_service import queue_email
+            for email, subject, body, _ in emails:
+                queue_email(email, subject, body)
+        done = list(results)
+        for buf in (customers, dues, emails, results):
+            buf.clear()
+        return done
+
+    for row_no, rec in enumerate(records, start=1):
+        try:
+            name, email, phone = _text(rec, "name"), _text(rec, "email"), _text(rec, "phone")
+        except (AttributeError, ValueError):  # not an object, or a nested field
+            results.append({"row": row_no, "error": "Invalid record"})
+            continue
+        try:
+            due = to_paise(rec.get("due"))
+        except ValueError:
+            due = -1
+        if not name:
+            results.append({"row": row_no, "error": "Name is required"})
+            continue
+        if due < 0:
+            results.append({"row": row_no, "error": "Invalid due"})
+            continue
+        if email and (email.lower() in seen_emails or email_registered(email)):
+            results.append({"row": row_no, "error": "Email already registered"})
+            continue
+        seen_emails.add(email.lower())
+
+        username = generate_unique_username(name)
+        password = generate_random_password()
+        customers.append({"name": name, "email": email, "phone": phone,
+                          "username": username, "password": password})
+        dues.append({"username": username, "customer": name, "due": format_paise(due)})
+        if email:
+            emails.append((email, "Your Account Details", _account_email(name, username, password), username))
+        results.append({"row": row_no, "username": username, "password": password})
+
+        if len(customers) >= chunk_size:
+            yield from commit()
+    yield from commit()
+
+
+def login_service(identifier: str, password: str):
+    """Check a username (or email) and password; returns the profile without the password."""
+    customer = find_customer(identifier)
+    if customer is None or not hmac.compare_digest(customer.get("password") or "", password or ""):
+        return {"error": "Invalid username or password"}
+    log_action("login", f"{customer['username']} logged in")
+    return {"success": True,
+            "customer": {k: customer.get(k, "") for k in ("username", "name", "email", "phone")}}
+
+
 def change_password_service(username: str, old_password: str, new_password: str):
-    customers = read_csv(CUSTOMERS_CSV)
-    changed = False
-    for c in customers:
-        if c["username"] == username and c["password"] == old_password:
-            c["password"] = new_password
-            changed = True
-            break
-    if not changed:
+    """`username` may also be the customer's email."""
+    def apply(customer):
+        if not hmac.compare_digest(customer["password"], old_password):
+            return None
+        customer["password"] = new_password
+        return customer
+
+    customer = find_customer(username)
+    if customer is None:
+        return {"error": "Invalid username or old password"}
+    username = customer["username"]
+    if update_row(CUSTOMERS_CSV, username, apply) is None:
         return {"error": "Invalid username or old password"}
 
-    write_csv(CUSTOMERS_CSV, ["name", "email", "phone", "username", "password"], customers)
     log_action("change_password", f"{username} changed password")
     return {"success": True, "message": "Password updated"}
 
 
-def record_offline_payment(username: str, customer: str, amount: float):
+def record_offline_payment(username: str, customer: str, amount: int):
+    """`amount` is in paise."""
     if amount <= 0:
         return {"error": "Invalid amount"}
 
-    dues = read_csv(DUES_CSV)
-    for d in dues:
-        if d["username"] == username:
-            new_due = max(0.0, float(d.get("due", 0)) - amount)
-            d["due"] = f"{new_due:.2f}"
-            break
-    write_csv(DUES_CSV, ["username", "customer", "due"], dues)
-    log_action("offline_payment", f"{username} paid {amount} offline")
+    adjust_due(username, -amount)
+    transaction = {
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "username": username,
+        "customer": customer,
+        "amount": format_paise(amount),
+        "order_id": "",
+        "status": "Success",
+        "mode": "offline"
+    }
+    append_rows(TRANSACTIONS_CSV, [transaction])
+    stats.payments_recorded([transaction])
+    log_action("offline_payment", f"{username} paid {format_paise(amount)} offline")
     return {"success": True}
+
+
+def apply_payments(transactions: list) -> list:
+    """
+    Record successful payments exactly once per order_id. Rows whose order_id
+    is already recorded are dropped; the rest are appended to transactions
+    (one write) and their dues reduced (one write). Returns the applied rows.
+    """
+    orders = get_order_index()
+    applied, batch = [], set()
+    with orders.hold(*{t["order_id"] for t in transactions}):
+        for t in transactions:
+            # the key is the order_id alone: a second confirmation under another username is a duplicate
+            if t["order_id"] in batch or orders.seen(t["order_id"]):
+                continue
+            batch.add(t["order_id"])
+            applied.append(t)
+        if not applied:
+            return applied
+
+        # Transactions first: if we crash in between, a retry dedupes these
+        # rows instead of reducing the dues twice.
+        append_rows(TRANSACTIONS_CSV, applied)
+        orders.add(t["order_id"] for t in applied)
+        totals = OrderedDict()
+        for t in applied:
+            totals[t["username"]] = totals.get(t["username"], 0) + to_paise(t["amount"])
+        if len(totals) == 1:
+            # a single customer goes through group commit when it is enabled
+            (username, total), = totals.items()
+            adjust_due(username, -total)
+        else:
+            adjust_dues([(u, -total) for u, total in totals.items()])
+    stats.payments_recorded(applied)
+    return applied
+
+
+def reconcile_settlement(records) -> dict:
+    """
+    Apply a bank/UPI settlement file in one pass. Each record needs username,
+    amount and reference_id (optional: mode, date). Rows whose reference_id
+    was already recorded (or repeats within the file) are skipped; rows for
+    unknown usernames are returned as unmatched.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    known = {}
+    in_file = set()
+    candidates, invalid, unmatched = [], [], []
+    rows = duplicates = 0
+
+    for row_no, rec in enumerate(records, start=1):
+        rows += 1
+        try:
+            username, ref = _text(rec, "username"), _text(rec, "reference_id")
+            mode, date = _text(rec, "mode"), _text(rec, "date")
+        except (AttributeError, ValueError):
+            invalid.append({"row": row_no, "error": "Invalid record"})
+            continue
+        try:
+            amount = to_paise(rec.get("amount"))
+        except ValueError:
+            amount = 0
+        if not (username and ref and amount > 0):
+            invalid.append({"row": row_no, "error": "username, amount and reference_id are required"})
+            continue
+        if date:
+            try:
+                date = normalize_timestamp(date)
+            except ValueError:
+                invalid.append({"row": row_no, "error": "date must be YYYY-MM-DD or YYYY-MM-DD HH:MM:SS"})
+                continue
+        if ref in in_file:
+            duplicates += 1
+            continue
+        if username not in known:
+            known[username] = get_row(DUES_CSV, username)
+        due = known[username]
+        if due is None:
+            unmatched.append({"row": row_no, "username": username, "reference_id": ref,
+                              "amount": rupees(amount)})
+            continue
+
+        in_file.add(ref)
+        candidates.append({
+            "date": date or now,
+            "username": username,
+            "customer": due.get("customer", ""),
+            "amount": format_paise(amount),
+            "order_id": ref,
+            "status": "Success",
+            "mode": (mode or "upi").lower()
+        })
+
+    transactions = apply_payments(candidates)
+    duplicates += len(candidates) - len(transactions)
+    totals = OrderedDict()
+    for t in transactions:
+        totals[t["username"]] = totals.get(t["username"], 0) + to_paise(t["amount"])
+
+    total_amount = sum(totals.values())
+    log_action("reconcile_settlement",
+               f"{len(transactions)} payments ({format_paise(total_amount)}) applied to {len(totals)} customers")
+    return {
+        "rows": rows,
+        "applied": len(transactions),
+        "customers_updated": len(totals),
+        "total_amount": rupees(total_amount),
+        "duplicates": duplicates,
+        "invalid": invalid,
+        "unmatched": unmatched,
+    }
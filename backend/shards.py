@@ -0,0 +1,255 @@
+# backend/shards.py
+"""
+Tenant shards.
+
+Every tenant (shop) gets its own data directory, TENANTS_DIR/<tenant>, with
+its own CSV files or SQLite database, journals, ledger, stats and webhook
+inbox. A Shard owns everything opened on its directory (tables, the SQLite
+pool, the due coalescer, the log writer, ...) behind its own lock, so tenants
+never share a file lock, a cache or a write path, and writes for different
+tenants proceed in parallel.
+
+The shard of a request is chosen by require_api_key (backend/decorators.py):
+a key listed in TENANT_API_KEYS selects its tenant; otherwise, if allowed,
+the TENANT_HEADER header names one. Without either the request runs on the
+default shard, which is DATA_DIR itself (or the TENANT env var's shard), so
+a single-shop install keeps its layout. Scripts pick a shard the same way:
+
+    TENANT=shop1 python -m backend.stats rebuild
+
+Pinning: a process started with SHARD_WORKER=i/n serves only the tenants
+that hash to worker i (crc32 of the name, mod n) and answers 421 for the
+rest, so each shard is written by one process and no two workers contend
+for its locks. The Razorpay webhook is the exception: its single URL is
+accepted by every worker, which appends events for other workers' tenants
+to their inbox files (see backend/webhooks.py). To start n pinned workers on consecutive ports, and to find
+the worker for a tenant (for a proxy or the client):
+
+    python -m backend.shards serve --workers 4 --port 5001
+    python -m backend.shards route shop1 --workers 4
+"""
+import argparse
+import contextvars
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import zlib
+from contextlib import contextmanager
+from os import getenv
+from pathlib import Path
+
+TENANT_RE = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+
+# "i/n": this process is worker i of n and serves only the tenants hashed to it
+SHARD_WORKER = getenv("SHARD_WORKER", "")
+
+_active = contextvars.ContextVar("shard", default=None)
+
+
+class ShardNotServed(Exception):
+    """The tenant is pinned to another worker process."""
+
+    def __init__(self, tenant: str, worker: int):
+        super().__init__(f"tenant {tenant!r} is served by worker {worker}")
+        self.tenant = tenant
+        self.worker = worker
+
+
+def parse_worker(spec: str):
+    """"i/n" -> (i, n); "" -> None. Raises ValueError."""
+    if not spec:
+        return None
+    index, _, count = spec.partition("/")
+    index, count = int(index), int(count)
+    if not 0 <= index < count:
+        raise ValueError(f"SHARD_WORKER must be i/n with 0 <= i < n, not {spec!r}")
+    return index, count
+
+
+def worker_for(tenant: str, workers: int) -> int:
+    """The worker a tenant is pinned to (stable across processes and restarts)."""
+    return zlib.crc32(tenant.encode("utf-8")) % workers
+
+
+def tenant_name(tenant: str) -> str:
+    """Normalize a tenant id; raises ValueError unless it is safe as a directory name."""
+    name = (tenant or "").strip().lower()
+    if not TENANT_RE.fullmatch(name):
+        raise ValueError("Tenant ids are 1-64 letters, digits, '-' or '_'")
+    return name
+
+
+def load_tenant_keys(spec: str) -> dict:
+    """
+    API key -> tenant from TENANT_API_KEYS: either "key1=shop1,key2=shop2" or
+    the path of a JSON file holding {"key1": "shop1", ...}.
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return {}
+    if os.path.isfile(spec):
+        with open(spec, encoding="utf-8") as f:
+            pairs = json.load(f).items()
+    else:
+        pairs = (item.split("=", 1) for item in spec.split(",") if item.strip())
+    return {key.strip(): tenant_name(tenant) for key, tenant in pairs}
+
+
+class Shard:
+    """One tenant's data directory and the state opened on it."""
+
+    def __init__(self, name: str, root: Path):
+        self.name = name  # "" for the default shard
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        # opened lazily by backend/utils.py
+        self.tables = {}
+        self.sqlite = None
+        self.coalescer = None
+        self.ledger = None
+        self.order_index = None
+        self.usernames = None
+        self.log_sink = None
+        self.log_writer = None
+        self._resources = {}
+
+    def __repr__(self):
+        return f"Shard({self.name or 'default'!r}, {str(self.root)!r})"
+
+    def resource(self, key: str, factory):
+        """Return this shard's `key` resource, created with factory(shard) on first use."""
+        with self.lock:
+            value = self._resources.get(key)
+            if value is None:
+                value = self._resources[key] = factory(self)
+            return value
+
+    def peek(self, key: str):
+        """The `key` resource if it has been created, else None."""
+        return self._resources.get(key)
+
+    def bind(self, fn):
+        """Wrap `fn` to run on this shard, e.g. in a background thread."""
+        def run(*args, **kwargs):
+            with use_shard(self):
+                return fn(*args, **kwargs)
+        return run
+
+
+class ShardRegistry:
+    """Open shards by tenant; the default shard lives in `root` itself."""
+
+    def __init__(self, root: Path, tenants_dir: Path, default_tenant: str = "", worker: str = ""):
+        self.tenants_dir = Path(tenants_dir)
+        self.worker = parse_worker(worker)
+        self._shards = {}
+        self._lock = threading.Lock()
+        if default_tenant:
+            self.default = self.get(default_tenant)
+        else:
+            self.default = Shard("", root)
+
+    def get(self, tenant: str = None) -> Shard:
+        """The shard for `tenant` (the default shard for None/"")."""
+        if not tenant:
+            return self.default
+        name = tenant_name(tenant)
+        if self.worker is not None:
+            index, count = self.worker
+            owner = worker_for(name, count)
+            if owner != index:
+                raise ShardNotServed(name, owner)
+        with self._lock:
+            shard = self._shards.get(name)
+            if shard is None:
+                shard = self._shards[name] = Shard(name, self.tenants_dir / name)
+            return shard
+
+    def open_shards(self) -> list:
+        with self._lock:
+            shards = list(self._shards.values())
+        return shards if self.default in shards else [self.default] + shards
+
+    def tenants(self) -> list:
+        """Tenants with a data directory that this process serves."""
+        if not self.tenants_dir.is_dir():
+            return []
+        names = sorted(p.name for p in self.tenants_dir.iterdir()
+                       if p.is_dir() and TENANT_RE.fullmatch(p.name))
+        if self.worker is not None:
+            index, count = self.worker
+            names = [n for n in names if worker_for(n, count) == index]
+        return names
+
+
+def active_shard():
+    """The shard chosen with use_shard(), else the one bound to the current request."""
+    shard = _active.get()
+    if shard is None:
+        from flask import g, has_request_context
+        if has_request_context():
+            shard = g.get("shard")
+    return shard
+
+
+@contextmanager
+def use_shard(shard: Shard):
+    token = _active.set(shard)
+    try:
+        yield shard
+    finally:
+        _active.reset(token)
+
+
+# ---------- Pinned workers ----------
+
+def _serve(host: str, port: int):
+    import logging
+    from werkzeug.serving import run_simple
+    from backend.app import create_app
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    run_simple(host, port, create_app(), threaded=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pinned shard workers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="start one API process per worker on consecutive ports")
+    serve.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=5001, help="port of worker 0")
+    worker = sub.add_parser("worker", help="run a single API process (SHARD_WORKER picks its tenants)")
+    worker.add_argument("--host", default="127.0.0.1")
+    worker.add_argument("--port", type=int, default=5000)
+    route = sub.add_parser("route", help="print the worker a tenant is pinned to")
+    route.add_argument("tenant")
+    route.add_argument("--workers", type=int, required=True)
+    args = parser.parse_args()
+
+    if args.command == "route":
+        print(worker_for(tenant_name(args.tenant), args.workers))
+    elif args.command == "worker":
+        _serve(args.host, args.port)
+    else:
+        procs = []
+        for i in range(args.workers):
+            env = dict(os.environ, SHARD_WORKER=f"{i}/{args.workers}")
+            procs.append(subprocess.Popen([sys.executable, "-m", "backend.shards", "worker",
+                                           "--host", args.host, "--port", str(args.port + i)], env=env))
+            print(f"worker {i}/{args.workers}: http://{args.host}:{args.port + i}")
+        try:
+            for p in procs:
+                p.wait()
+        except KeyboardInterrupt:
+            for p in procs:
+                p.terminate()
+            for p in procs:
+                p.wait()
+
+
+if __name__ == "__main__":
+    main()
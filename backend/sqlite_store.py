@@ -0,0 +1,265 @@
+# backend/sqlite_store.py
+"""
+SQLite storage engine, selected with STORAGE_BACKEND=sqlite.
+
+Mirrors the CSV files in backend/data as tables of the same name (customers,
+dues, logs, transactions). The database runs in WAL mode so readers never
+block the writer, and connections come from a small pool shared by the
+Flask worker threads.
+
+One-shot migration of the existing CSV files:
+    python -m backend.sqlite_store migrate
+"""
+import queue
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# Tables keyed by username; the rest are append-only with a rowid.
+KEYED_TABLES = {"customers", "dues"}
+
+INDEXES = [
+    # entries are ordered by (username, rowid), which also serves per-customer history
+    "CREATE INDEX IF NOT EXISTS idx_transactions_username ON transactions(username)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_order_id ON transactions(order_id)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)",
+    # customer lookups by email / phone match store.index_value(): lower(trim(x))
+    "CREATE INDEX IF NOT EXISTS idx_customers_email ON customers(lower(trim(email)))",
+    "CREATE INDEX IF NOT EXISTS idx_customers_phone ON customers(lower(trim(phone)))",
+]
+
+
+class ConnectionPool:
+    def __init__(self, db_path: Path, size: int = 8, timeout: float = 30.0):
+        self.db_path = str(db_path)
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._idle.put(None)  # connections are opened lazily
+        self._local = threading.local()
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                               check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; nested calls on one thread reuse it."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._idle.get(timeout=self.timeout) or self._open()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn is not None:
+                conn.close()
+
+
+class SQLiteStore:
+    def __init__(self, db_path: Path, schema: dict, pool_size: int = 8):
+        """`schema` maps table name -> ordered column names (all TEXT)."""
+        self.schema = schema
+        self.pool = ConnectionPool(db_path, size=pool_size)
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.pool.transaction() as conn:
+            for table, columns in self.schema.items():
+                if table in KEYED_TABLES:
+                    cols = ", ".join(
+                        f"{c} TEXT PRIMARY KEY" if c == "username" else f"{c} TEXT"
+                        for c in columns
+                    )
+                else:
+                    cols = "id INTEGER PRIMARY KEY, " + ", ".join(f"{c} TEXT" for c in columns)
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({cols})")
+            for stmt in INDEXES:
+                conn.execute(stmt)
+            # named numeric counters (dashboard aggregates, see backend/stats.py)
+            conn.execute("CREATE TABLE IF NOT EXISTS counters "
+                         "(name TEXT PRIMARY KEY, value REAL NOT NULL DEFAULT 0)")
+            # per-table change counters, bumped by triggers (used for ETags)
+            conn.execute("CREATE TABLE IF NOT EXISTS table_versions "
+                         "(name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)")
+            for table in self.schema:
+                conn.execute("INSERT OR IGNORE INTO table_versions (name) VALUES (?)", (table,))
+                for event in ("INSERT", "UPDATE", "DELETE"):
+                    conn.execute(
+                        f"CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version "
+                        f"AFTER {event} ON {table} BEGIN "
+                        f"UPDATE table_versions SET version = version + 1 WHERE name = '{table}'; END"
+                    )
+
+    def _values(self, table: str, row: dict) -> tuple:
+        return tuple("" if row.get(c) is None else row.get(c) for c in self.schema[table])
+
+    # ---------- Reads ----------
+
+    def rows(self, table: str) -> list:
+        cols = ", ".join(self.schema[table])
+        with self.pool.connection() as conn:
+            cur = conn.execute(f"SELECT {cols} FROM {table} ORDER BY rowid")
+            return [dict(r) for r in cur]
+
+    def iter_where(self, table: str, where: str = "", params=(), order_by: str = "rowid"):
+        """Stream rows matching a WHERE clause without materializing the result."""
+        cols = ", ".join(self.schema[table])
+        sql = f"SELECT {cols} FROM {table}" + (f" WHERE {where}" if where else "") + f" ORDER BY {order_by}"
+        with self.pool.connection() as conn:
+            for row in conn.execute(sql, list(params)):
+                yield dict(row)
+
+    def iter_page(self, table: str, after=None, limit: int = 100, where: str = "", params=(),
+                  descending: bool = False):
+        """
+        Keyset pagination: yields (cursor, row) for up to `limit` rows after
+        `after`, ordered by username for keyed tables and by id otherwise
+        (newest first with `descending`).
+        """
+        key = "username" if table in KEYED_TABLES else "id"
+        clauses = [where] if where else []
+        params = list(params)
+        if after is not None:
+            clauses.append(f"{key} {'<' if descending else '>'} ?")
+            params.append(after)
+        cols = ", ".join(self.schema[table])
+        sql = (f"SELECT {key} AS _cursor, {cols} FROM {table}"
+               + (f" WHERE {' AND '.join(clauses)}" if clauses else "")
+               + f" ORDER BY {key}{' DESC' if descending else ''} LIMIT ?")
+        with self.pool.connection() as conn:
+            for row in conn.execute(sql, params + [limit]):
+                row = dict(row)
+                yield row.pop("_cursor"), row
+
+    def select(self, table: str, columns: list, where: str = "", params=()) -> list:
+        """Plain tuples of `columns` (which may include id) in rowid order, for bulk loads."""
+        sql = (f"SELECT {', '.join(columns)} FROM {table}"
+               + (f" WHERE {where}" if where else "") + " ORDER BY rowid")
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = None  # tuples, not Row objects
+            return cur.execute(sql, list(params)).fetchall()
+
+    def version(self, table: str) -> int:
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT version FROM table_versions WHERE name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def counters(self) -> dict:
+        with self.pool.connection() as conn:
+            return {name: value for name, value in conn.execute("SELECT name, value FROM counters")}
+
+    def get(self, table: str, username: str):
+        cols = ", ".join(self.schema[table])
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                f"SELECT {cols} FROM {table} WHERE username = ?", (username,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    # ---------- Writes ----------
+
+    def put_many(self, table: str, rows: list):
+        columns = self.schema[table]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "username")
+        sql = (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(username) DO UPDATE SET {updates}"
+        )
+        with self.pool.transaction() as conn:
+            conn.executemany(sql, [self._values(table, r) for r in rows])
+
+    def update(self, table: str, username: str, fn):
+        """Read-modify-write one row inside a single write transaction."""
+        with self.pool.transaction():
+            row = self.get(table, username)
+            if row is None:
+                return None
+            row = fn(row)
+            if row is not None:
+                self.put_many(table, [row])
+            return row
+
+    def update_many(self, table: str, usernames: list, fn):
+        """Like update(), for several rows at once: fn({username: row}) -> rows to write."""
+        with self.pool.transaction():
+            rows = {}
+            for u in usernames:
+                row = self.get(table, u)
+                if row is not None:
+                    rows[u] = row
+            changed = fn(rows)
+            self.put_many(table, changed)
+            return changed
+
+    def append(self, table: str, rows: list):
+        columns = self.schema[table]
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        with self.pool.transaction() as conn:
+            conn.executemany(sql, [self._values(table, r) for r in rows])
+
+    def replace_all(self, table: str, rows: list):
+        with self.pool.transaction() as conn:
+            conn.execute(f"DELETE FROM {table}")
+            if table in KEYED_TABLES:
+                self.put_many(table, rows)
+            else:
+                self.append(table, rows)
+
+    def add_counters(self, deltas: dict):
+        with self.pool.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(deltas.items())
+            )
+
+    def replace_counters(self, values: dict):
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM counters")
+            conn.executemany("INSERT INTO counters (name, value) VALUES (?, ?)", list(values.items()))
+
+    def close(self):
+        self.pool.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["migrate"]:
+        sys.exit("usage: python -m backend.sqlite_store migrate")
+    from backend.utils import migrate_csv_to_sqlite
+    for table, count in migrate_csv_to_sqlite().items():
+        print(f"{table}: {count} rows")
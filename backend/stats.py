@@ -0,0 +1,155 @@
+# backend/stats.py
+"""
+Dashboard aggregates, maintained incrementally by the write paths.
+
+Every aggregate is a named counter: customers, total due, customers with a
+nonzero due, payment count and amount per day, and collections per mode.
+Writers add deltas (one journal append, or one upsert on SQLite), so reading
+the dashboard costs the same however large the data set is. Money counters
+are integer paise, so they never drift however many deltas are added.
+
+The counters are rebuilt from the data files the first time they are read,
+or on demand after editing the files by hand:
+
+    python -m backend.stats rebuild
+"""
+import atexit
+import sys
+from datetime import datetime
+
+from backend.records import Transaction, rupees
+from backend.store import IndexedTable
+from backend.utils import (
+    CUSTOMERS_CSV, DUES_CSV, TRANSACTIONS_CSV, DATA_PATH,
+    current_shard, get_sqlite, iter_records, iter_rows, shard_path
+)
+
+STATS_CSV = DATA_PATH / "stats.csv"
+
+# marks a counter set that was built from the data, not just incremented
+# (sets from before money was counted in paise lack it and are rebuilt)
+BUILT = "built:paise"
+
+
+def _open_table(shard) -> IndexedTable:
+    table = IndexedTable(shard_path(STATS_CSV), ["name", "value"], key="name")
+    atexit.register(table.close)
+    return table
+
+
+def _get_table() -> IndexedTable:
+    """The current shard's counters."""
+    return current_shard().resource("stats", _open_table)
+
+
+def _to_int(value) -> int:
+    try:
+        return int(round(float(value or 0)))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _add(deltas: dict):
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    db = get_sqlite()
+    if db is not None:
+        db.add_counters(deltas)
+        return
+    table = _get_table()
+    with table.user_locks.hold(*deltas):
+        rows = []
+        for name, delta in deltas.items():
+            value = _to_int((table.get(name) or {}).get("value")) + delta
+            rows.append({"name": name, "value": str(value)})
+        table.put_many(rows)
+
+
+def _counters() -> dict:
+    db = get_sqlite()
+    if db is not None:
+        values = {name: _to_int(value) for name, value in db.counters().items()}
+    else:
+        values = {r["name"]: _to_int(r["value"]) for r in _get_table().rows()}
+    if BUILT not in values:
+        values = rebuild()
+    return values
+
+
+def rebuild() -> dict:
+    """Recompute every counter with one scan of customers, dues and transactions."""
+    values = {BUILT: 1, "customers": sum(1 for _ in iter_rows(CUSTOMERS_CSV))}
+    for d in iter_records(DUES_CSV):
+        if d.due > 0:
+            values["total_due"] = values.get("total_due", 0) + d.due
+            values["customers_with_due"] = values.get("customers_with_due", 0) + 1
+    for name, delta in _payment_deltas(
+            t for t in iter_records(TRANSACTIONS_CSV)
+            if (t.status or "Success") == "Success").items():
+        values[name] = values.get(name, 0) + delta
+
+    db = get_sqlite()
+    if db is not None:
+        db.replace_counters(values)
+    else:
+        _get_table().replace_all([{"name": k, "value": str(v)} for k, v in values.items()])
+    return values
+
+
+def _payment_deltas(transactions) -> dict:
+    """Counter deltas for Transaction records (amounts in paise)."""
+    deltas = {}
+    for t in transactions:
+        day = t.date[:10]
+        mode = t.mode.lower() or "unknown"
+        for name, delta in ((f"payments:{day}", 1), (f"paid:{day}", t.amount), (f"mode:{mode}", t.amount)):
+            deltas[name] = deltas.get(name, 0) + delta
+    return deltas
+
+
+# ---------- Write-path hooks ----------
+
+def customers_added(count: int):
+    _add({"customers": count})
+
+
+def dues_changed(changes):
+    """`changes` is [(old_due, new_due), ...] in paise (a new customer has old_due 0)."""
+    total = with_due = 0
+    for old, new in changes:
+        total += new - old
+        with_due += (new > 0) - (old > 0)
+    _add({"total_due": total, "customers_with_due": with_due})
+
+
+def payments_recorded(transactions: list):
+    """Count successful payments given as transaction rows (date, amount, mode)."""
+    _add(_payment_deltas(Transaction.from_row(t) for t in transactions))
+
+
+# ---------- Reads ----------
+
+def dashboard(day: str = None) -> dict:
+    day = day or datetime.now().strftime("%Y-%m-%d")
+    values = _counters()
+    return {
+        "total_customers": int(values.get("customers", 0)),
+        "total_due": rupees(values.get("total_due", 0)),
+        "customers_with_due": int(values.get("customers_with_due", 0)),
+        "payments_today": {
+            "count": int(values.get(f"payments:{day}", 0)),
+            "amount": rupees(values.get(f"paid:{day}", 0)),
+        },
+        "collections_by_mode": {
+            name[len("mode:"):]: rupees(v)
+            for name, v in sorted(values.items()) if name.startswith("mode:") and v
+        },
+    }
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m backend.stats rebuild")
+    rebuild()
+    print(dashboard())
@@ -0,0 +1,314 @@
+# backend/store.py
+"""
+In-memory indexed tables backed by a CSV snapshot plus an append-only journal.
+
+Rows live in a dict keyed by `key` (the username), as plain dicts or, when
+the table has a `record` type (see backend/records.py), as slotted records
+parsed once at load; readers always get dicts back. Fields named in
+`indexes` get a hash index (value -> keys, case-insensitive) for find(), built
+on first use and kept in step with every change. Every change is appended
+to `<file>.journal` as one JSON line, so a single update costs an append
+instead of a full rewrite. The journal is folded back into the CSV by
+`compact()` once it holds JOURNAL_COMPACT_EVERY records or as many records
+as the table has rows, whichever is larger (so rewrite cost stays amortized
+O(1) per change), and is replayed on top of the CSV on the next load.
+
+Several processes may share the same files: before every access a table
+reads whatever other processes appended to the journal since it last looked,
+and reloads the snapshot if someone else compacted it (see backend/locks.py).
+"""
+import bisect
+import csv
+import json
+import os
+import threading
+from pathlib import Path
+
+from backend import metrics
+from backend.locks import FileLock, UserLocks
+
+JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", "1000"))
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "1") == "1"
+
+
+def index_value(value) -> str:
+    """Normalized form of a secondary-index value (see IndexedTable.find)."""
+    return (value or "").strip().lower()
+
+
+def atomic_write_csv(file: Path, fieldnames: list, rows):
+    """Write to a temp file and rename over `file`, so readers never see a partial file."""
+    tmp = file.with_name(f".{file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, file)
+
+
+class IndexedTable:
+    def __init__(self, file: Path, fieldnames: list, key: str = "username", record=None,
+                 indexes: tuple = ()):
+        self.file = Path(file)
+        self.journal = self.file.with_name(self.file.name + ".journal")
+        self.fieldnames = list(fieldnames)
+        self.key = key
+        self.record = record
+        self._make = record.from_row if record is not None else (lambda row: row)
+        self.file_lock = FileLock(self.file.with_name(self.file.name + ".lock"))
+        self.user_locks = UserLocks(self.file_lock)
+        self._lock = threading.RLock()
+        self._rows = None
+        self._sorted_keys = None  # built on first page() call, then kept in step
+        self.indexes = tuple(indexes)
+        self._index = None  # {field: {value: {key, ...}}}, built on first find()
+        self._snapshot_id = None
+        self._journal_pos = 0
+        self._journal_entries = 0
+        self._jf = None
+
+    # ---------- Loading / syncing (callers hold self._lock and the table lock) ----------
+
+    def _snapshot_stat(self):
+        try:
+            st = self.file.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        rows = {}
+        self._snapshot_id = self._snapshot_stat()
+        if self._snapshot_id is not None:
+            with open(self.file, newline="", encoding="utf-8") as f:
+                make = self._make
+                for row in csv.DictReader(f):
+                    rows[row.get(self.key) or ""] = make(row)
+            metrics.STORAGE_BYTES.inc(self._snapshot_id[2], direction="read", table=self.file.stem)
+            metrics.STORAGE_ROWS.inc(len(rows), op="load", table=self.file.stem)
+        self._rows = rows
+        self._sorted_keys = None
+        self._index = None
+        self._journal_pos = 0
+        self._journal_entries = 0
+        if self._jf is None:
+            self._jf = open(self.journal, "ab")
+        self._read_journal_tail()
+
+    def _read_journal_tail(self):
+        with open(self.journal, "rb") as f:
+            f.seek(self._journal_pos)
+            data = f.read()
+        # only consume complete lines; a record still being written stays for next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].split(b"\n"):
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                # torn tail from a crash mid-append
+                continue
+            self._apply(rec)
+            self._journal_entries += 1
+        self._journal_pos += end
+        if end:
+            metrics.STORAGE_BYTES.inc(end, direction="read", table=self.file.stem)
+
+    def _sync(self):
+        if self._rows is None or self._snapshot_stat() != self._snapshot_id:
+            self._load()
+            return
+        size = os.fstat(self._jf.fileno()).st_size
+        if size < self._journal_pos:
+            # another process compacted and truncated the journal
+            self._load()
+        elif size > self._journal_pos:
+            self._read_journal_tail()
+
+    def _apply(self, rec: dict):
+        if rec.get("op") == "put":
+            row = self._make(rec["row"])
+            key = row.get(self.key) or ""
+            if self._sorted_keys is not None and key not in self._rows:
+                bisect.insort(self._sorted_keys, key)
+            if self._index is not None:
+                self._unindex(key, self._rows.get(key))
+                self._index_row(key, row)
+            self._rows[key] = row
+        elif rec.get("op") == "del":
+            key = rec.get("key")
+            old = self._rows.pop(key, None)
+            if old is not None and self._sorted_keys is not None:
+                del self._sorted_keys[bisect.bisect_left(self._sorted_keys, key)]
+            if self._index is not None:
+                self._unindex(key, old)
+
+    def _index_row(self, key: str, row):
+        for field in self.indexes:
+            value = index_value(row.get(field))
+            if value:
+                self._index[field].setdefault(value, set()).add(key)
+
+    def _unindex(self, key: str, row):
+        if row is None:
+            return
+        for field in self.indexes:
+            value = index_value(row.get(field))
+            keys = self._index[field].get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[field][value]
+
+    # ---------- Reads ----------
+
+    def _public(self, row) -> dict:
+        return row.as_row() if self.record is not None else dict(row)
+
+    def rows(self) -> list:
+        with self._lock, self.file_lock.hold(shared=True):
+            self._sync()
+            return [self._public(r) for r in self._rows.values()]
+
+    def records(self) -> list:
+        """The stored rows themselves (records when the table has a type); do not modify them."""
+        with self._lock, self.file_lock.hold(shared=True):
+            self._sync()
+            return list(self._rows.values())
+
+    def get(self, key: str):
+        with self._lock, self.file_lock.hold(shared=True):
+            self._sync()
+            row = self._rows.get(key)
+            return self._public(row) if row is not None else None
+
+    def page(self, after=None, limit: int = 100, predicate=None) -> list:
+        """
+        Up to `limit` rows with key > `after`, in key order (keyset pagination).
+        `predicate` sees the stored row (a record, for typed tables).
+        """
+        with self._lock, self.file_lock.hold(shared=True):
+            self._sync()
+            if self._sorted_keys is None:
+                self._sorted_keys = sorted(self._rows)
+            keys = self._sorted_keys
+            i = bisect.bisect_right(keys, after) if after is not None else 0
+            out = []
+            while i < len(keys) and len(out) < limit:
+                row = self._rows[keys[i]]
+                if predicate is None or predicate(row):
+                    out.append(self._public(row))
+                i += 1
+            return out
+
+    def find(self, field: str, value: str) -> list:
+        """Rows whose indexed `field` equals `value` (ignoring case and surrounding spaces)."""
+        with self._lock, self.file_lock.hold(shared=True):
+            self._sync()
+            if self._index is None:
+                self._index = {f: {} for f in self.indexes}
+                for key, row in self._rows.items():
+                    self._index_row(key, row)
+            keys = self._index[field].get(index_value(value), ())
+            return [self._public(self._rows[k]) for k in sorted(keys)]
+
+    def version(self) -> str:
+        """Token that changes whenever the table's contents may have changed."""
+        with self._lock, self.file_lock.hold(shared=True):
+            self._sync()
+            return "-".join(map(str, (*(self._snapshot_id or ()), self._journal_pos)))
+
+    def __contains__(self, key) -> bool:
+        with self._lock, self.file_lock.hold(shared=True):
+            self._sync()
+            return key in self._rows
+
+    def __len__(self) -> int:
+        with self._lock, self.file_lock.hold(shared=True):
+            self._sync()
+            return len(self._rows)
+
+    # ---------- Writes ----------
+
+    def _normalize(self, row: dict) -> dict:
+        return {k: row.get(k, "") for k in self.fieldnames}
+
+    def _write_records(self, records: list):
+        # Each record is written as "\n<json>\n" in a single O_APPEND write: the
+        # leading newline terminates any torn line left behind by a crash.
+        data = b"".join(
+            b"\n" + json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in records
+        )
+        self._jf.write(data)
+        metrics.STORAGE_BYTES.inc(len(data), direction="write", table=self.file.stem)
+        self._jf.flush()
+        if JOURNAL_FSYNC:
+            os.fsync(self._jf.fileno())
+        # read our records back together with anything other processes appended
+        self._sync()
+
+    def _write_snapshot(self):
+        rows = self._rows.values()
+        if self.record is not None:
+            rows = (r.as_row() for r in rows)
+        atomic_write_csv(self.file, self.fieldnames, rows)
+        self._jf.truncate(0)
+        self._snapshot_id = self._snapshot_stat()
+        metrics.STORAGE_BYTES.inc(self._snapshot_id[2], direction="write", table=self.file.stem)
+        self._journal_pos = 0
+        self._journal_entries = 0
+
+    def _append(self, records: list):
+        if not records:
+            return
+        with self._lock:
+            with self.file_lock.hold(shared=True):
+                self._sync()
+                self._write_records(records)
+            if self._journal_entries >= max(JOURNAL_COMPACT_EVERY, len(self._rows)):
+                self.compact()
+
+    def put(self, row: dict):
+        self.put_many([row])
+
+    def put_many(self, rows: list):
+        self._append([{"op": "put", "row": self._normalize(r)} for r in rows])
+
+    def delete(self, key: str):
+        self._append([{"op": "del", "key": key}])
+
+    def replace_all(self, rows: list):
+        """Make the table equal to `rows`, journaling only what changed."""
+        with self._lock, self.file_lock.hold():
+            self._sync()
+            new = {}
+            for r in rows:
+                r = self._make(self._normalize(r))
+                new[r.get(self.key) or ""] = r
+            records = [{"op": "del", "key": k} for k in self._rows if k not in new]
+            records += [{"op": "put", "row": self._public(r)} for k, r in new.items() if self._rows.get(k) != r]
+            if len(records) > len(new) // 2:
+                # mostly rewritten: cheaper to take a new snapshot
+                self._rows = new
+                self._sorted_keys = None
+                self._index = None
+                self._write_snapshot()
+            elif records:
+                self._write_records(records)
+
+    def compact(self):
+        with self._lock, self.file_lock.hold():
+            self._sync()
+            self._write_snapshot()
+
+    def close(self):
+        with self._lock:
+            if self._jf is not None:
+                if self._journal_entries:
+                    self.compact()
+                self._jf.close()
+                self._jf = None
+                self._rows = None
@@ -0,0 +1,75 @@
+# backend/streaming.py
+"""
+Helpers for streaming request and response bodies, so endpoints that handle
+large uploads or results never hold the whole payload in memory.
+"""
+import base64
+import csv
+import io
+import json
+from flask import request
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines")
+CSV_TYPES = ("text/csv", "application/csv")
+
+
+def stream_json_array(rows):
+    """Serialize rows one at a time as a JSON array."""
+    yield "["
+    first = True
+    for row in rows:
+        yield ("" if first else ",") + json.dumps(row)
+        first = False
+    yield "]"
+
+
+def encode_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Inverse of encode_cursor; raises ValueError for a malformed token."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def stream_page(pairs, limit: int, fields: list):
+    """
+    Stream {"items": [...], "next_cursor": ...} from (cursor, row) pairs,
+    keeping only `fields` of each row. next_cursor is null on the last page.
+    """
+    yield '{"items":['
+    count = 0
+    last = None
+    for cursor, row in pairs:
+        yield ("," if count else "") + json.dumps({f: row.get(f, "") for f in fields})
+        count += 1
+        last = cursor
+    next_cursor = encode_cursor(last) if count == limit else None
+    yield '],"next_cursor":' + json.dumps(next_cursor) + "}"
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def _ndjson_records(stream):
+    for line in io.TextIOWrapper(stream, encoding="utf-8"):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None  # reported by the caller as an invalid row
+
+
+def upload_records():
+    """Iterate an uploaded CSV or NDJSON body without buffering it, or None if unsupported."""
+    if request.mimetype in CSV_TYPES:
+        return csv.DictReader(io.TextIOWrapper(request.stream, encoding="utf-8", newline=""))
+    if request.mimetype in NDJSON_TYPES:
+        return _ndjson_records(request.stream)
+    return None
@@ -0,0 +1,47 @@
+# backend/usernames.py
+"""
+Username allocation in O(1) per new customer.
+
+Usernames are a base derived from the name plus an optional number (asha,
+asha1, asha2, ...). Instead of probing base1, base2, ... against the whole
+customer list, the allocator remembers the next free number for every base,
+seeded once from the existing usernames. A candidate is still checked with
+`exists()` (an indexed lookup), so names taken by another process are skipped
+rather than reused.
+"""
+import re
+import threading
+
+_NUMBERED = re.compile(r"(.*?)(\d+)")
+
+
+class UsernameAllocator:
+    def __init__(self, existing, exists=None):
+        """`existing` iterates over current usernames; `exists(name)` checks for one taken since."""
+        self._exists = exists or (lambda name: False)
+        self._taken = set()
+        self._next = {}  # base -> next number to try (0 = the bare base)
+        self._lock = threading.Lock()
+        for name in existing:
+            self._remember(name.lower())
+
+    def _remember(self, name: str):
+        self._taken.add(name)
+        self._next.setdefault(name, 1)
+        m = _NUMBERED.fullmatch(name)
+        if m:
+            base, n = m.group(1), int(m.group(2))
+            if n >= self._next.get(base, 0):
+                self._next[base] = n + 1
+
+    def allocate(self, base: str) -> str:
+        with self._lock:
+            n = self._next.get(base, 1) if base in self._taken else 0
+            while True:
+                candidate = f"{base}{n}" if n else base
+                n += 1
+                if candidate not in self._taken and not self._exists(candidate):
+                    break
+            self._next[base] = max(n, self._next.get(base, 0))
+            self._remember(candidate)
+            return candidate
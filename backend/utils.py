@@ -3,55 +3,684 @@ import csv
 import re
 import random
 import string
+import sys
+import atexit
+from os import getenv
 from pathlib import Path
 from datetime import datetime
 
-DATA_PATH = Path(__file__).parent / "data"
+from backend import metrics
+from backend.records import Customer, Due, Transaction, format_paise, money
+from backend.store import IndexedTable, atomic_write_csv, index_value
+from backend.log_writer import CsvSink, LogWriter
+from backend.log_segments import iter_logs as _iter_log_segments
+from backend.shards import SHARD_WORKER, ShardRegistry, active_shard
+
+# "csv" (default) or "sqlite" -- see backend/sqlite_store.py
+STORAGE_BACKEND = getenv("STORAGE_BACKEND", "csv").lower()
+
+DATA_PATH = Path(getenv("DATA_DIR") or Path(__file__).parent / "data")
 DATA_PATH.mkdir(parents=True, exist_ok=True)
 
 CUSTOMERS_CSV = DATA_PATH / "customers.csv"
 DUES_CSV = DATA_PATH / "dues.csv"
 LOGS_CSV = DATA_PATH / "logs.csv"
 TRANSACTIONS_CSV = DATA_PATH / "transactions.csv"
+SQLITE_PATH = Path(getenv("SQLITE_PATH") or DATA_PATH / "tracker.db")
+SQLITE_POOL_SIZE = int(getenv("SQLITE_POOL_SIZE", "8"))
+
+# Group commit for due updates (0 = every update commits on its own)
+DUE_COMMIT_WINDOW_MS = float(getenv("DUE_COMMIT_WINDOW_MS", "0"))
+DUE_COMMIT_MAX_BATCH = int(getenv("DUE_COMMIT_MAX_BATCH", "256"))
+
+# Activity log is written by a background thread unless LOG_ASYNC=0
+LOG_ASYNC = getenv("LOG_ASYNC", "1") == "1"
+LOG_QUEUE_SIZE = int(getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(getenv("LOG_BATCH_SIZE", "256"))
+LOG_FLUSH_INTERVAL_MS = float(getenv("LOG_FLUSH_INTERVAL_MS", "500"))
+# order_id dedupe: exact in-memory set, or a Bloom filter sized for this many ids
+ORDER_INDEX_BLOOM_CAPACITY = int(getenv("ORDER_INDEX_BLOOM_CAPACITY", "0"))
+# per-customer, per-month partitions of transactions.csv (see backend/ledger.py)
+LEDGER_DIR = DATA_PATH / "ledger"
+# logs.csv is rotated into gzip segments by size and/or by day
+LOG_SEGMENT_DIR = DATA_PATH / "logs"
+LOG_ROTATE_BYTES = int(getenv("LOG_ROTATE_BYTES", str(64 * 1024 * 1024)))
+LOG_ROTATE_DAILY = getenv("LOG_ROTATE_DAILY", "1") == "1"
+# one data directory per tenant (see backend/shards.py)
+TENANTS_DIR = Path(getenv("TENANTS_DIR") or DATA_PATH / "tenants")
+
+FIELDNAMES = {
+    "customers.csv": ["name", "email", "phone", "username", "password"],
+    "dues.csv": ["username", "customer", "due"],
+    "logs.csv": ["timestamp", "action", "details"],
+    "transactions.csv": ["date", "username", "customer", "amount", "order_id", "status", "mode"],
+}
+
+# Typed rows for each table, money in integer paise (see backend/records.py)
+RECORD_TYPES = {
+    "customers.csv": Customer,
+    "dues.csv": Due,
+    "transactions.csv": Transaction,
+}
+
+# Tables kept in memory and indexed by username (see backend/store.py)
+INDEXED_TABLES = {"customers.csv", "dues.csv"}
+
+# Secondary lookups (case-insensitive hash indexes; SQLite has matching indexes)
+LOOKUP_FIELDS = {"customers.csv": ("email", "phone")}
+
+SHARDS = ShardRegistry(DATA_PATH, TENANTS_DIR, default_tenant=getenv("TENANT", ""),
+                       worker=SHARD_WORKER)
+
+# ---------- Shards ----------
+
+def current_shard():
+    """The shard of the current request or use_shard() block, else the default one."""
+    return active_shard() or SHARDS.default
+
+def get_shard(tenant: str = None):
+    """Open `tenant`'s shard (ValueError for a bad id, ShardNotServed if pinned elsewhere)."""
+    return SHARDS.get(tenant)
+
+def shard_path(file: Path) -> Path:
+    """Map a DATA_PATH file or folder (DUES_CSV, LEDGER_DIR, ...) into the current shard."""
+    file = Path(file)
+    root = current_shard().root
+    if file.parent != DATA_PATH or root == DATA_PATH:
+        return file
+    return root / file.name
 
 # ---------- CSV Helpers ----------
 
 def ensure_csv(file: Path, fieldnames: list):
-    if not file.exists():
+    # a blank placeholder file (no header line) counts as missing
+    if not file.exists() or file.stat().st_size <= 2:
         with open(file, "w", newline="", encoding="utf-8") as f:
             writer = csv.DictWriter(f, fieldnames=fieldnames)
             writer.writeheader()
 
+_checked_files = set()
+
 def ensure_headers(file: Path):
-    if file == CUSTOMERS_CSV:
-        ensure_csv(file, ["name", "email", "phone", "username", "password"])
-    elif file == DUES_CSV:
-        ensure_csv(file, ["username", "customer", "due"])
-    elif file == LOGS_CSV:
-        ensure_csv(file, ["timestamp", "action", "details"])
-    elif file == TRANSACTIONS_CSV:
-        ensure_csv(file, ["date", "username", "customer", "amount", "order_id", "status", "mode"])
+    """Create `file` with its header if missing; checked once per process."""
+    file = Path(file)
+    if file in _checked_files:
+        return
+    fieldnames = FIELDNAMES.get(file.name)
+    if fieldnames:
+        ensure_csv(file, fieldnames)
+    _checked_files.add(file)
+
+def init_data_files():
+    """Boot-time check of the data files, so requests never have to."""
+    if get_sqlite() is not None:
+        return  # tables are created when the store opens
+    for name in FIELDNAMES:
+        ensure_headers(shard_path(DATA_PATH / name))
+
+def get_table(file: Path):
+    """Return the shard's in-memory IndexedTable for `file`, or None if it is a plain CSV."""
+    file = shard_path(file)
+    if file.name not in INDEXED_TABLES:
+        return None
+    shard = current_shard()
+    with shard.lock:
+        table = shard.tables.get(file.name)
+        if table is None:
+            ensure_headers(file)
+            table = shard.tables[file.name] = IndexedTable(file, FIELDNAMES[file.name],
+                                                           record=RECORD_TYPES.get(file.name),
+                                                           indexes=LOOKUP_FIELDS.get(file.name, ()))
+        return table
+
+def _sqlite_path(shard) -> Path:
+    return SQLITE_PATH if shard.root == DATA_PATH else shard.root / "tracker.db"
+
+def get_sqlite():
+    """Return the shard's SQLiteStore, or None when STORAGE_BACKEND is csv."""
+    if STORAGE_BACKEND != "sqlite":
+        return None
+    shard = current_shard()
+    with shard.lock:
+        if shard.sqlite is None:
+            from backend.sqlite_store import SQLiteStore
+            schema = {Path(name).stem: fields for name, fields in FIELDNAMES.items()}
+            shard.sqlite = SQLiteStore(_sqlite_path(shard), schema, pool_size=SQLITE_POOL_SIZE)
+        return shard.sqlite
+
+def close_tables():
+    for shard in SHARDS.open_shards():
+        with shard.lock:
+            for table in shard.tables.values():
+                table.close()
+            shard.tables.clear()
+            if shard.sqlite is not None:
+                shard.sqlite.close()
+                shard.sqlite = None
+
+atexit.register(close_tables)
+
+def _merge(histograms) -> dict:
+    merged = {}
+    for histogram in histograms:
+        for bucket, count in histogram.items():
+            merged[bucket] = merged.get(bucket, 0) + count
+    return merged
+
+def _collect_metrics() -> list:
+    lines = []
+    shards = SHARDS.open_shards()
+    coalesced = [s.coalescer.stats() for s in shards if s.coalescer is not None]
+    writers = [s.log_writer for s in shards if s.log_writer is not None]
+    if coalesced:
+        batches = sum(s["batches"] for s in coalesced)
+        lines += metrics.histogram_lines("due_commit_batch_size", "Due updates per group commit.",
+                                         _merge(s["batch_size_histogram"] for s in coalesced),
+                                         sum(s["items"] for s in coalesced), batches)
+        lines += metrics.histogram_lines("due_commit_duration_ms", "Group commit duration.",
+                                         _merge(s["commit_ms_histogram"] for s in coalesced),
+                                         sum(s["avg_commit_ms"] * s["batches"] for s in coalesced),
+                                         batches)
+    if writers:
+        lines += metrics.gauge_lines("log_queue_depth", "Activity log rows waiting to be written.",
+                                     sum(w.pending() for w in writers))
+    lines += metrics.gauge_lines("open_shards", "Tenant shards opened by this process.", len(shards))
+    return lines
+
+metrics.register_collector(_collect_metrics)
+
+def _read_csv_file(file: Path):
+    file = shard_path(file)
+    table = get_table(file)
+    if table is not None:
+        return table.rows()
+    ensure_headers(file)
+    with open(file, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+        metrics.STORAGE_BYTES.inc(f.tell(), direction="read", table=Path(file).stem)
+    return rows
 
 def read_csv(file: Path):
+    with metrics.storage_op("read_csv", Path(file).stem) as m:
+        db = get_sqlite()
+        rows = db.rows(Path(file).stem) if db is not None else _read_csv_file(file)
+        m["rows"] = len(rows)
+        return rows
+
+def iter_rows(file: Path):
+    """Stream rows one at a time instead of materializing the whole file."""
+    db = get_sqlite()
+    if db is not None:
+        yield from db.iter_where(Path(file).stem)
+        return
+    file = shard_path(file)
+    table = get_table(file)
+    if table is not None:
+        yield from table.rows()
+        return
     ensure_headers(file)
     with open(file, newline="", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
+        yield from csv.DictReader(f)
+
+def iter_records(file: Path):
+    """Like iter_rows, but yields typed records (money in paise) for known tables."""
+    record = RECORD_TYPES[Path(file).name]
+    table = get_table(file) if get_sqlite() is None else None
+    if table is not None:
+        yield from table.records()
+        return
+    for row in iter_rows(file):
+        yield record.from_row(row)
+
+def _row_filter(username=None, min_due=None, date_from=None, date_to=None):
+    """`min_due` is in paise; rows may be dicts or records."""
+    def keep(row):
+        if username and row.get("username") != username:
+            return False
+        if min_due is not None and money(row, "due") < min_due:
+            return False
+        date = row.get("date") or ""
+        if date_from and date < date_from:
+            return False
+        if date_to and date > date_to:
+            return False
+        return True
+    return keep
+
+def _iter_csv_from(file: Path, offset: int):
+    """
+    Yield (offset_after_row, row) starting at a byte offset. Rows are one line
+    each (append_rows() keeps them so); an offset that is not the start of a
+    row raises ValueError.
+    """
+    file = shard_path(file)
+    ensure_headers(file)
+    with open(file, "rb") as f:
+        fieldnames = next(csv.reader([f.readline().decode("utf-8")]), [])
+        if offset > f.tell():
+            f.seek(offset - 1)
+            if f.read(1) != b"\n":
+                raise ValueError("Invalid cursor")  # mid-row, e.g. a forged cursor
+        for line in iter(f.readline, b""):
+            if not line.endswith(b"\n"):
+                break  # row still being appended
+            values = next(csv.reader([line.decode("utf-8")]), None)
+            if values:
+                yield f.tell(), dict(zip(fieldnames, values))
+
+def iter_page(file: Path, after=None, limit: int = 100, username: str = None,
+              min_due: int = None, date_from: str = None, date_to: str = None):
+    """
+    Keyset pagination over a table: yields (cursor, row) for up to `limit`
+    matching rows after cursor `after`. Keyed tables are ordered by username;
+    append-only files by position (the cursor is a byte offset or row id).
+    `min_due` is in paise.
+    """
+    db = get_sqlite()
+    if db is not None:
+        clauses, params = [], []
+        if username:
+            clauses.append("username = ?")
+            params.append(username)
+        if min_due is not None:
+            clauses.append("CAST(ROUND(CAST(due AS REAL) * 100) AS INTEGER) >= ?")
+            params.append(min_due)
+        if date_from:
+            clauses.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("date <= ?")
+            params.append(date_to)
+        yield from db.iter_page(Path(file).stem, after, limit, " AND ".join(clauses), params)
+        return
+    keep = _row_filter(username, min_due, date_from, date_to)
+    table = get_table(file)
+    if table is not None and username:
+        # keyed by username: a single lookup instead of a filtered walk
+        row = table.get(username) if after is None or username > after else None
+        if row is not None and limit > 0 and keep(row):
+            yield username, row
+        return
+    if table is not None:
+        for row in table.page(after, limit, keep):
+            yield row["username"], row
+        return
+    count = 0
+    for cursor, row in _iter_csv_from(file, int(after or 0)):
+        if count >= limit:
+            return
+        if keep(row):
+            count += 1
+            yield cursor, row
+
+def data_version(file: Path) -> str:
+    """Opaque token that changes whenever the file's data changes (for ETags)."""
+    tenant = current_shard().name
+    prefix = f"{tenant}:" if tenant else ""  # tenants' SQLite versions may coincide
+    db = get_sqlite()
+    if db is not None:
+        return f"{prefix}db-{db.version(Path(file).stem)}"
+    file = shard_path(file)
+    table = get_table(file)
+    if table is not None:
+        return prefix + table.version()
+    ensure_headers(file)
+    st = file.stat()
+    return f"{prefix}{st.st_ino}-{st.st_mtime_ns}-{st.st_size}"
 
 def write_csv(file: Path, fieldnames: list, rows: list):
-    with open(file, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+    with metrics.storage_op("write_csv", Path(file).stem) as m:
+        m["rows"] = len(rows)
+        db = get_sqlite()
+        if db is not None:
+            db.replace_all(Path(file).stem, rows)
+            return
+        table = get_table(file)
+        if table is not None:
+            table.replace_all(rows)
+            return
+        file = shard_path(file)
+        atomic_write_csv(file, fieldnames, rows)
+        metrics.STORAGE_BYTES.inc(file.stat().st_size, direction="write", table=Path(file).stem)
+
+def get_row(file: Path, username: str):
+    """Indexed lookup of a single row by username (None if missing)."""
+    with metrics.storage_op("get_row", Path(file).stem) as m:
+        db = get_sqlite()
+        row = db.get(Path(file).stem, username) if db is not None else get_table(file).get(username)
+        m["rows"] = row is not None
+        return row
+
+def find_rows(file: Path, field: str, value: str) -> list:
+    """Indexed lookup by a LOOKUP_FIELDS field, ignoring case and surrounding spaces."""
+    if field not in LOOKUP_FIELDS.get(Path(file).name, ()):
+        raise ValueError(f"{field} is not indexed in {Path(file).name}")
+    with metrics.storage_op("find_rows", Path(file).stem) as m:
+        db = get_sqlite()
+        if db is not None:
+            rows = list(db.iter_where(Path(file).stem, f"lower(trim({field})) = ?", (index_value(value),)))
+        else:
+            rows = get_table(file).find(field, value)
+        m["rows"] = len(rows)
+        return rows
+
+def put_row(file: Path, row: dict):
+    """Insert or replace a single row; costs one journal append."""
+    put_rows(file, [row])
+
+def put_rows(file: Path, rows: list):
+    """Insert or replace many rows with a single journal append (or one transaction)."""
+    with metrics.storage_op("put_rows", Path(file).stem) as m:
+        m["rows"] = len(rows)
+        db = get_sqlite()
+        if db is not None:
+            db.put_many(Path(file).stem, rows)
+            return
+        get_table(file).put_many(rows)
+
+def update_row(file: Path, username: str, fn):
+    """
+    Atomically read-modify-write one row. `fn(row)` returns the new row, or
+    None to leave it untouched. Only updates to the same username serialize.
+    Returns the written row, or None if the row is missing or fn declined.
+    """
+    with metrics.storage_op("update_row", Path(file).stem) as m:
+        db = get_sqlite()
+        if db is not None:
+            row = db.update(Path(file).stem, username, fn)
+        else:
+            table = get_table(file)
+            with table.user_locks.hold(username):
+                row = table.get(username)
+                if row is not None:
+                    row = fn(row)
+                    if row is not None:
+                        table.put(row)
+        m["rows"] = row is not None
+        return row
+
+def update_rows(file: Path, usernames: list, fn):
+    """
+    Read-modify-write several rows with a single durable write. `fn(rows)`
+    gets {username: row} for the usernames that exist and returns the rows
+    to write back.
+    """
+    with metrics.storage_op("update_rows", Path(file).stem) as m:
+        db = get_sqlite()
+        if db is not None:
+            changed = db.update_many(Path(file).stem, usernames, fn)
+        else:
+            table = get_table(file)
+            with table.user_locks.hold(*usernames):
+                rows = {}
+                for u in usernames:
+                    row = table.get(u)
+                    if row is not None:
+                        rows[u] = row
+                changed = fn(rows)
+                table.put_many(changed)
+        m["rows"] = len(changed)
+        return changed
+
+def adjust_dues(deltas: list) -> list:
+    """
+    Apply [(username, delta_paise), ...] in order, each clamped at zero, with
+    one durable write. Returns the dues row as it stood after each delta
+    (None for unknown usernames).
+    """
+    results = []
+    changes = []
+
+    def apply(rows):
+        for username, delta in deltas:
+            row = rows.get(username)
+            if row is not None:
+                old = money(row, "due")
+                new = max(0, old + delta)
+                row["due"] = format_paise(new)
+                changes.append((old, new))
+                row = dict(row)
+            results.append(row)
+        return list(rows.values())
+
+    update_rows(DUES_CSV, list(dict.fromkeys(u for u, _ in deltas)), apply)
+    from backend import stats
+    stats.dues_changed(changes)
+    return results
+
+def get_coalescer():
+    """Return the shard's DueCoalescer, or None when group commit is disabled."""
+    if DUE_COMMIT_WINDOW_MS <= 0:
+        return None
+    shard = current_shard()
+    with shard.lock:
+        if shard.coalescer is None:
+            from backend.coalescer import DueCoalescer
+            # commits run on the coalescer's thread, so they are bound to the shard
+            shard.coalescer = DueCoalescer(shard.bind(adjust_dues), window=DUE_COMMIT_WINDOW_MS / 1000,
+                                           max_batch=DUE_COMMIT_MAX_BATCH)
+        return shard.coalescer
+
+def adjust_due(username: str, delta: int):
+    """Add `delta` paise to a customer's due, clamped at zero. Returns the dues row or None."""
+    coalescer = get_coalescer()
+    if coalescer is not None:
+        return coalescer.submit(username, delta)
+    return adjust_dues([(username, delta)])[0]
+
+def get_ledger():
+    """Return the shard's per-customer transaction Ledger, or None on SQLite."""
+    if STORAGE_BACKEND == "sqlite":
+        return None
+    shard = current_shard()
+    with shard.lock:
+        if shard.ledger is None:
+            from backend.ledger import Ledger
+            shard.ledger = Ledger(shard_path(LEDGER_DIR), shard_path(TRANSACTIONS_CSV),
+                                  FIELDNAMES["transactions.csv"])
+        return shard.ledger
+
+_NEWLINES = str.maketrans("\r\n", "  ")
+
+def _one_line(row: dict) -> dict:
+    """Append-only CSVs are read line by line (_iter_csv_from), so no value may span lines."""
+    return {k: v.translate(_NEWLINES) if isinstance(v, str) else v for k, v in row.items()}
+
+def append_rows(file: Path, rows: list):
+    """Append rows to an append-only file (transactions, logs) in one write."""
+    with metrics.storage_op("append_rows", Path(file).stem) as m:
+        m["rows"] = len(rows)
+        db = get_sqlite()
+        if db is not None:
+            db.append(Path(file).stem, rows)
+            return
+
+        path = shard_path(file)
+        rows = [_one_line(r) for r in rows]  # names and webhook notes may carry newlines
+
+        def write():
+            ensure_headers(path)
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                start = f.tell()
+                writer = csv.DictWriter(f, fieldnames=FIELDNAMES[Path(file).name], extrasaction="ignore")
+                writer.writerows(rows)
+                metrics.STORAGE_BYTES.inc(f.tell() - start, direction="write", table=Path(file).stem)
+
+        if Path(file).name == TRANSACTIONS_CSV.name:
+            get_ledger().append(rows, write)
+        else:
+            write()
+
+def _append_log_has(file: Path, field: str, value: str) -> bool:
+    """
+    Whether some row of an append-only CSV has `field` == `value`: a byte
+    search over the file that parses only the lines containing the value.
+    """
+    file = shard_path(file)
+    ensure_headers(file)
+    needle = value.encode("utf-8")
+    with open(file, "rb") as f:
+        fieldnames = next(csv.reader([f.readline().decode("utf-8")]), [])
+        if field not in fieldnames or not needle:
+            return False
+        column = fieldnames.index(field)
+        carry = b""
+        for block in iter(lambda: f.read(1 << 20), b""):
+            data = carry + block
+            cut = data.rfind(b"\n") + 1
+            data, carry = data[:cut], data[cut:]  # a row split across blocks waits for the next one
+            start = data.find(needle)
+            while start >= 0:
+                line_start = data.rfind(b"\n", 0, start) + 1
+                line_end = data.find(b"\n", start) + 1
+                values = next(csv.reader([data[line_start:line_end].decode("utf-8", "replace")]), [])
+                if len(values) > column and values[column] == value:
+                    return True
+                start = data.find(needle, line_end)
+    return False
+
+def transaction_exists(order_id: str) -> bool:
+    """Check storage for a transaction with this order_id, whichever customer it belongs to."""
+    db = get_sqlite()
+    if db is not None:
+        return next(db.iter_where("transactions", "order_id = ?", [order_id]), None) is not None
+    return _append_log_has(TRANSACTIONS_CSV, "order_id", order_id)
+
+def get_order_index():
+    """Return the shard's OrderIndex of recorded order_ids (see backend/idempotency.py)."""
+    shard = current_shard()
+    with shard.lock:
+        if shard.order_index is None:
+            from backend.idempotency import OrderIndex
+            shard.order_index = OrderIndex(
+                shard.bind(lambda after: iter_page(TRANSACTIONS_CSV, after, sys.maxsize)),
+                shard_path(DATA_PATH / "order_ids.lock"),
+                lookup=shard.bind(transaction_exists),
+                bloom_capacity=ORDER_INDEX_BLOOM_CAPACITY,
+            )
+        return shard.order_index
+
+def iter_history(username: str, before=None, limit: int = 100):
+    """Yield (cursor, row) for one customer's transactions, newest first."""
+    db = get_sqlite()
+    if db is not None:
+        yield from db.iter_page("transactions", before, limit, "username = ?", [username],
+                                descending=True)
+        return
+    yield from get_ledger().history(username, before, limit)
+
+def migrate_csv_to_sqlite() -> dict:
+    """
+    Load the shard's CSV files into its SQLite database, replacing its
+    contents. The activity log is read from its rotated segments too.
+    """
+    from backend.sqlite_store import SQLiteStore
+    schema = {Path(name).stem: fields for name, fields in FIELDNAMES.items()}
+    db = SQLiteStore(_sqlite_path(current_shard()), schema, pool_size=1)
+    counts = {}
+    flush_logs()
+    try:
+        for name in FIELDNAMES:
+            if name == LOGS_CSV.name:
+                rows = list(_iter_log_segments(shard_path(LOGS_CSV), shard_path(LOG_SEGMENT_DIR)))
+            else:
+                rows = _read_csv_file(DATA_PATH / name)
+            db.replace_all(Path(name).stem, rows)
+            counts[Path(name).stem] = len(rows)
+    finally:
+        db.close()
+    return counts
+
+class _AppendSink:
+    """Log sink for the SQLite engine: one multi-row insert per batch."""
+
+    def __init__(self, file: Path, shard):
+        self.file = file
+        self.write = shard.bind(self._write)  # called from the log writer thread
+
+    def _write(self, rows: list):
+        append_rows(self.file, rows)
+
+    def close(self):
+        pass
+
+def get_log_sink():
+    shard = current_shard()
+    with shard.lock:
+        if shard.log_sink is None:
+            if STORAGE_BACKEND == "sqlite":
+                shard.log_sink = _AppendSink(LOGS_CSV, shard)
+            else:
+                shard.log_sink = CsvSink(shard_path(LOGS_CSV), FIELDNAMES["logs.csv"],
+                                         segment_dir=shard_path(LOG_SEGMENT_DIR),
+                                         max_bytes=LOG_ROTATE_BYTES, daily=LOG_ROTATE_DAILY)
+        return shard.log_sink
+
+def get_log_writer():
+    """Return the shard's background LogWriter, or None when LOG_ASYNC=0."""
+    if not LOG_ASYNC:
+        return None
+    sink = get_log_sink()
+    shard = current_shard()
+    with shard.lock:
+        if shard.log_writer is None:
+            shard.log_writer = LogWriter(sink, max_queue=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE,
+                                         flush_interval=LOG_FLUSH_INTERVAL_MS / 1000)
+            # registered after close_tables, so it runs first and can still use SQLite
+            atexit.register(shard.log_writer.close)
+        return shard.log_writer
+
+def flush_logs():
+    """Wait until every queued log row of the current shard has been written."""
+    writer = current_shard().log_writer
+    if writer is not None:
+        writer.flush()
 
 def log_action(action: str, details: str):
-    ensure_headers(LOGS_CSV)
-    with open(LOGS_CSV, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["timestamp", "action", "details"])
-        writer.writerow({
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "action": action,
-            "details": details
-        })
+    row = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "action": action,
+        "details": details
+    }
+    writer = get_log_writer()
+    if writer is None:
+        get_log_sink().write([row])
+    else:
+        writer.write(row)
+
+def iter_logs(start: str = None, end: str = None, action: str = None):
+    """Yield activity log rows in [start, end] (timestamp strings), oldest first."""
+    flush_logs()
+    db = get_sqlite()
+    if db is not None:
+        clauses, params = [], []
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        if action:
+            clauses.append("action = ?")
+            params.append(action)
+        yield from db.iter_where("logs", " AND ".join(clauses), params)
+        return
+    yield from _iter_log_segments(shard_path(LOGS_CSV), shard_path(LOG_SEGMENT_DIR), start, end, action)
+
+# ---------- Timestamps ----------
+
+# what date filters and uploaded dates accept: YYYY-MM-DD, optionally with HH:MM[:SS]
+TIMESTAMP_RE = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2})?)?$")
+
+def normalize_timestamp(value: str) -> str:
+    """A TIMESTAMP_RE value as stored: "YYYY-MM-DD HH:MM:SS". Raises ValueError if it is not a real time."""
+    value = (value or "").strip()
+    if not TIMESTAMP_RE.match(value):
+        raise ValueError(f"invalid timestamp: {value!r}")
+    value = value.replace("T", " ")
+    value += " 00:00:00"[len(value) - 10:]  # fill in a missing time or seconds
+    datetime.strptime(value, "%Y-%m-%d %H:%M:%S")  # 2026-02-30 matches the pattern but is not a date
+    return value
 
 # ---------- Username & Password ----------
 
@@ -59,16 +688,28 @@ def clean_username_from_name(name: str) -> str:
     base = re.sub(r'[^a-zA-Z0-9]', '', (name or "")).lower()
     return base or "user"
 
+def existing_usernames() -> set:
+    return {u["username"].lower() for u in iter_rows(CUSTOMERS_CSV) if u.get("username")}
+
+def get_username_allocator():
+    """Return the shard's UsernameAllocator, seeded from customers on first use."""
+    shard = current_shard()
+    with shard.lock:
+        allocator = shard.usernames
+    if allocator is None:
+        from backend.usernames import UsernameAllocator
+        # seeded outside shard.lock: reading customers may open its table
+        allocator = UsernameAllocator(existing_usernames(),
+                                      exists=shard.bind(lambda u: get_row(CUSTOMERS_CSV, u) is not None))
+        with shard.lock:
+            if shard.usernames is None:
+                shard.usernames = allocator
+            allocator = shard.usernames
+    return allocator
+
 def generate_unique_username(name: str) -> str:
-    users = read_csv(CUSTOMERS_CSV)
-    existing = {u["username"].lower() for u in users if u.get("username")}
-    base = clean_username_from_name(name)
-    username = base
-    i = 1
-    while username.lower() in existing:
-        username = f"{base}{i}"
-        i += 1
-    return username
+    """Pick a free username for `name` (base, base1, base2, ...) in O(1)."""
+    return get_username_allocator().allocate(clean_username_from_name(name))
 
 def generate_random_password(length: int = 10) -> str:
     alphabet = string.ascii_letters + string.digits
@@ -0,0 +1,304 @@
+# backend/webhooks.py
+"""
+Razorpay webhook ingestion.
+
+/api/razorpay/webhook only verifies the X-Razorpay-Signature HMAC and
+appends the raw event to an append-only inbox (webhooks/inbox.jsonl), then
+answers 200. Accepting an event therefore costs one small file append no
+matter how busy the CSV files or the database are.
+
+A background worker drains the inbox in batches: payment events become
+transactions and due reductions through services.apply_payments (one write
+each per batch, deduped on order_id), and the consumed offset is saved after
+every batch. Any number of API processes may run a worker; a lock on
+`webhooks/inbox.lock` lets one of them drain at a time. Each tenant shard
+has its own inbox and worker. The tenant is read from the order's notes
+(set by /api/create_order), which the signature covers, so a signed event
+cannot be replayed into another shop; events without one go to the default
+shard.
+
+Razorpay sends every tenant's events to the same URL, so with pinned workers
+(SHARD_WORKER, see backend/shards.py) any worker accepts any event. One for
+a tenant pinned elsewhere is appended straight to that tenant's inbox file,
+under the inbox's own file lock and without opening the shard; the owning
+process drains it like any other. That process starts the tenant's worker at
+startup, or when the tenant creates its first order. The worker can also run
+on its own:
+
+    python -m backend.webhooks
+    TENANT=shop1 python -m backend.webhooks
+"""
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from os import getenv
+
+from backend.locks import FileLock
+from backend.shards import tenant_name, use_shard
+from backend.records import format_paise
+from backend.utils import (
+    DATA_PATH, DUES_CSV, SHARDS, TENANTS_DIR, current_shard, get_row, log_action, shard_path
+)
+
+WEBHOOK_SECRET = getenv("RAZORPAY_WEBHOOK_SECRET", "")
+WEBHOOK_WORKER = getenv("WEBHOOK_WORKER", "1") == "1"  # drain the inbox inside the API process
+WEBHOOK_FSYNC = getenv("WEBHOOK_FSYNC", "1") == "1"
+WEBHOOK_BATCH_SIZE = int(getenv("WEBHOOK_BATCH_SIZE", "500"))
+WEBHOOK_POLL_MS = float(getenv("WEBHOOK_POLL_MS", "500"))
+WEBHOOK_INBOX_MAX_BYTES = int(getenv("WEBHOOK_INBOX_MAX_BYTES", str(64 * 1024 * 1024)))
+
+WEBHOOK_DIR = DATA_PATH / "webhooks"
+
+# events that mean money arrived; both may be sent for one order
+PAYMENT_EVENTS = {"payment.captured", "order.paid"}
+
+# byte 0 of inbox.lock: appenders shared, rotation exclusive; byte 1: the draining worker
+_APPEND = 0
+_DRAIN = 1
+
+
+def verify_signature(body: bytes, signature: str, secret: str = None) -> bool:
+    secret = WEBHOOK_SECRET if secret is None else secret
+    if not (secret and signature):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+class Inbox:
+    def __init__(self, folder=None):
+        self.folder = folder = folder or shard_path(WEBHOOK_DIR)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.path = folder / "inbox.jsonl"
+        self.offset_path = folder / "inbox.offset"
+        self.unmatched_path = folder / "unmatched.jsonl"
+        self.lock = FileLock(folder / "inbox.lock")
+
+    def append(self, body: bytes, event_id: str = ""):
+        """Persist one raw event (a single O_APPEND write)."""
+        line = json.dumps({
+            "received": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "event_id": event_id,
+            "body": body.decode("utf-8", "replace"),
+        }).encode("utf-8") + b"\n"
+        with self.lock.hold(_APPEND, shared=True):
+            with open(self.path, "ab", buffering=0) as f:
+                f.write(line)
+                if WEBHOOK_FSYNC:
+                    os.fsync(f.fileno())
+
+    def _offset(self) -> int:
+        try:
+            return int(self.offset_path.read_text() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _save_offset(self, offset: int):
+        tmp = self.offset_path.with_name(self.offset_path.name + ".tmp")
+        tmp.write_text(str(offset))
+        os.replace(tmp, self.offset_path)
+
+    def _rotate(self, offset: int):
+        """Archive a fully consumed inbox once it is large."""
+        with self.lock.hold(_APPEND):
+            if not self.path.exists() or self.path.stat().st_size != offset:
+                return  # something was appended meanwhile; try again later
+            os.replace(self.path, self.folder / f"processed-{datetime.now():%Y%m%d-%H%M%S-%f}.jsonl")
+            self._save_offset(0)
+
+    def drain(self, handle, batch_size: int = WEBHOOK_BATCH_SIZE) -> int:
+        """Pass up to `batch_size` unconsumed events to `handle(events)`; returns how many."""
+        with self.lock.hold(_DRAIN):
+            offset = self._offset()
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(offset)
+                    lines = []
+                    for line in iter(f.readline, b""):
+                        if not line.endswith(b"\n") or len(lines) >= batch_size:
+                            break  # the last event may still be being written
+                        lines.append(line)
+            except FileNotFoundError:
+                return 0
+            events = []
+            for line in lines:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    pass
+            if events:
+                handle(events)
+            offset += sum(len(line) for line in lines)
+            if lines:
+                self._save_offset(offset)
+            if offset >= WEBHOOK_INBOX_MAX_BYTES:
+                self._rotate(offset)
+            return len(lines)
+
+    def dead_letter(self, records: list):
+        with open(self.unmatched_path, "ab") as f:
+            f.write(b"".join(json.dumps(r).encode("utf-8") + b"\n" for r in records))
+
+
+# ---------- Applying events ----------
+
+def _entities(event: dict):
+    """(payment, order, notes) entities of an event; missing ones are empty."""
+    payload = event.get("payload") or {}
+    payment = (payload.get("payment") or {}).get("entity") or {}
+    order = (payload.get("order") or {}).get("entity") or {}
+    return payment, order, payment.get("notes") or order.get("notes") or {}
+
+
+def event_tenant(body: bytes) -> str:
+    """The tenant named in a (verified) event's notes, or "" for the default shard."""
+    try:
+        tenant = _entities(json.loads(body))[2].get("tenant")
+    except (AttributeError, TypeError, ValueError):
+        return ""
+    return tenant if isinstance(tenant, str) else ""
+
+
+def _payment(event: dict):
+    """Turn a payment event into a transaction row (None if it is not one)."""
+    if event.get("event") not in PAYMENT_EVENTS:
+        return None
+    payment, order, notes = _entities(event)
+    order_id = payment.get("order_id") or order.get("id") or payment.get("id")
+    amount = payment.get("amount") or order.get("amount_paid") or 0
+    created = payment.get("created_at") or event.get("created_at") or time.time()
+    if not (order_id and amount):
+        return None
+    return {
+        "date": datetime.fromtimestamp(float(created)).strftime("%Y-%m-%d %H:%M:%S"),
+        "username": str(notes.get("username") or ""),
+        "customer": str(notes.get("customer") or ""),
+        "amount": format_paise(int(amount)),  # Razorpay sends paise
+        "order_id": str(order_id),
+        "status": "Success",
+        "mode": str(notes.get("mode") or payment.get("method") or "razorpay").lower(),
+    }
+
+
+def process_events(inbox: Inbox, records: list):
+    from backend.services import apply_payments
+
+    payments, unmatched = {}, []
+    for record in records:
+        try:
+            event = json.loads(record["body"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        try:
+            t = _payment(event)
+        except Exception as e:
+            # a signed event with a malformed field: set it aside rather than retry the batch forever
+            unmatched.append(dict(record, error=f"{type(e).__name__}: {e}"))
+            continue
+        if t is None:
+            continue
+        if not t["username"] or get_row(DUES_CSV, t["username"]) is None:
+            unmatched.append(record)
+            continue
+        payments.setdefault(t["order_id"], t)  # order.paid + payment.captured for one order
+    applied = apply_payments(list(payments.values()))
+    if unmatched:
+        inbox.dead_letter(unmatched)
+    if applied or unmatched:
+        log_action("webhook_payments", f"{len(applied)} payments applied, "
+                                       f"{len(unmatched)} unmatched from {len(records)} events")
+
+
+class WebhookWorker:
+    def __init__(self, inbox: Inbox, poll_interval: float = WEBHOOK_POLL_MS / 1000):
+        self.inbox = inbox
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = False
+        shard = current_shard()
+        self._thread = threading.Thread(target=shard.bind(self._run), daemon=True,
+                                        name=f"webhook-worker-{shard.name or 'default'}")
+        self._thread.start()
+
+    def notify(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop:
+            try:
+                if self.inbox.drain(lambda events: process_events(self.inbox, events)):
+                    continue  # there may be more
+            except Exception as e:
+                # a storage error: keep the offset where it is and retry on the next round
+                log_action("webhook_error", str(e))
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+
+_autostart = False  # start_workers() was called: tenants get a worker with their first event
+_foreign_inboxes = {}  # tenant -> Inbox, for tenants pinned to other processes
+_foreign_lock = threading.Lock()
+
+
+def get_inbox() -> Inbox:
+    """The current shard's inbox."""
+    return current_shard().resource("webhook_inbox", lambda shard: Inbox())
+
+
+def start_worker():
+    """Start (once) the worker that drains the current shard's inbox."""
+    inbox = get_inbox()
+    return current_shard().resource("webhook_worker", lambda shard: WebhookWorker(inbox))
+
+
+def watch():
+    """Start the current shard's worker if this process runs workers (its events may come via others)."""
+    if _autostart:
+        start_worker()
+
+
+def start_workers():
+    """Start workers for the default shard and every tenant shard this process serves."""
+    global _autostart
+    _autostart = True
+    start_worker()
+    for tenant in SHARDS.tenants():
+        with use_shard(SHARDS.get(tenant)):
+            start_worker()
+
+
+def accept(body: bytes, event_id: str = ""):
+    """Persist a verified event and nudge the shard's worker."""
+    get_inbox().append(body, event_id)
+    worker = start_worker() if _autostart else current_shard().peek("webhook_worker")
+    if worker is not None:
+        worker.notify()
+
+
+def forward(tenant: str, body: bytes, event_id: str = ""):
+    """Persist a verified event for a tenant pinned to another process; its worker drains it."""
+    name = tenant_name(tenant)
+    with _foreign_lock:
+        inbox = _foreign_inboxes.get(name)
+        if inbox is None:
+            inbox = _foreign_inboxes[name] = Inbox(TENANTS_DIR / name / WEBHOOK_DIR.name)
+    inbox.append(body, event_id)
+
+
+if __name__ == "__main__":
+    worker = start_worker()
+    print(f"draining {get_inbox().path} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.stop()
@@ -0,0 +1,89 @@
+"""
+Latency of the analytics reports (/api/analytics/aging and /collections).
+
+Seeds a throwaway data directory with --transactions payments spread over a
+year and --customers customers, then times each report cold (first load
+into columnar frames), warm (memoized) and right after a few new payments
+(only the appended rows are read).
+
+    python benchmarks/bench_analytics.py                          # 1m transactions, 20k customers
+    python benchmarks/bench_analytics.py --transactions 100k --backend sqlite
+"""
+import argparse
+import csv
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_api import parse_size  # noqa: E402
+
+REPORTS = ["/api/analytics/aging", "/api/analytics/collections",
+           "/api/analytics/collections?period=week", "/api/analytics/collections?period=day"]
+
+
+def seed(data_dir: Path, transactions: int, customers: int):
+    start = datetime.now() - timedelta(days=365)
+    with open(data_dir / "customers.csv", "w", newline="", encoding="utf-8") as c, \
+            open(data_dir / "dues.csv", "w", newline="", encoding="utf-8") as d:
+        cw, dw = csv.writer(c), csv.writer(d)
+        cw.writerow(["name", "email", "phone", "username", "password"])
+        dw.writerow(["username", "customer", "due"])
+        for i in range(customers):
+            cw.writerow([f"Seed {i}", "", "", f"seed{i}", f"pw{i}"])
+            dw.writerow([f"seed{i}", f"Seed {i}", f"{(i * 7919) % 20000:.2f}"])
+    with open(data_dir / "transactions.csv", "w", newline="", encoding="utf-8") as t:
+        tw = csv.writer(t)
+        tw.writerow(["date", "username", "customer", "amount", "order_id", "status", "mode"])
+        for i in range(transactions):
+            u = (i * 31) % customers
+            date = start + timedelta(seconds=i * 31_536_000 // max(transactions, 1))
+            tw.writerow([date.strftime("%Y-%m-%d %H:%M:%S"), f"seed{u}", f"Seed {u}",
+                         f"{1 + i % 500:.2f}", f"seed_order_{i}", "Success", ("upi", "cash", "card")[i % 3]])
+
+
+def timed(client, url: str) -> float:
+    started = time.perf_counter()
+    r = client.get(url)
+    assert r.status_code == 200, r.get_data(as_text=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--transactions", default="1m")
+    parser.add_argument("--customers", default="20k")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    data_dir = Path(tempfile.mkdtemp(prefix="due_tracker_analytics_"))
+    seed(data_dir, parse_size(args.transactions), parse_size(args.customers))
+    os.environ.update(DATA_DIR=str(data_dir), STORAGE_BACKEND=args.backend, WEBHOOK_WORKER="0")
+    from backend import utils
+    from backend.app import create_app
+    if args.backend == "sqlite":
+        utils.migrate_csv_to_sqlite()
+    utils.get_row(utils.DUES_CSV, "seed0")  # load the dues table outside the timings
+
+    client = create_app().test_client()
+    print(f"{args.transactions} transactions, {args.customers} customers, {args.backend}, data in {data_dir}")
+    for url in REPORTS:
+        cold = timed(client, url)
+        warm = statistics.median(timed(client, url) for _ in range(args.runs))
+        fresh = []
+        for i in range(args.runs):
+            client.post("/api/record_offline_payment",
+                        json={"username": f"seed{i}", "customer": f"Seed {i}", "amount": 1})
+            fresh.append(timed(client, url))
+        print(f"{url:<40} cold {cold:8.1f} ms  warm {warm:6.1f} ms  "
+              f"after a payment {statistics.median(fresh):7.1f} ms")
+
+if __name__ == "__main__":
+    main()
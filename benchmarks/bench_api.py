@@ -0,0 +1,229 @@
+"""
+HTTP load benchmark for the write endpoints, with a JSON baseline.
+
+For each dataset size a fresh server process is seeded with that many
+synthetic customers, dues and transactions, then serves the app from
+create_app() over real HTTP. This process drives /api/create_customer,
+/api/record_offline_payment, /api/confirm_payment and /api/change_password
+concurrently and reports throughput and p50/p95/p99 latency.
+
+    python benchmarks/bench_api.py                                # 1k and 10k rows
+    python benchmarks/bench_api.py --sizes 1k,10k,100k,1m --backend sqlite
+    python benchmarks/bench_api.py --save benchmarks/baseline.json  # record a baseline
+    python benchmarks/bench_api.py --check benchmarks/baseline.json # exit 1 on regression
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+ENDPOINTS = ["create_customer", "record_offline_payment", "confirm_payment", "change_password"]
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * factor)
+
+
+# ---------- Server process ----------
+
+def seed(data_dir: Path, rows: int):
+    """Write customers, dues and transactions CSVs directly (fast even at 1M rows)."""
+    start = datetime.now() - timedelta(days=365)
+    with open(data_dir / "customers.csv", "w", newline="", encoding="utf-8") as c, \
+            open(data_dir / "dues.csv", "w", newline="", encoding="utf-8") as d, \
+            open(data_dir / "transactions.csv", "w", newline="", encoding="utf-8") as t:
+        cw, dw, tw = csv.writer(c), csv.writer(d), csv.writer(t)
+        cw.writerow(["name", "email", "phone", "username", "password"])
+        dw.writerow(["username", "customer", "due"])
+        tw.writerow(["date", "username", "customer", "amount", "order_id", "status", "mode"])
+        for i in range(rows):
+            u = f"seed{i}"
+            cw.writerow([f"Seed {i}", "", "", u, f"pw{i}"])
+            dw.writerow([u, f"Seed {i}", f"{1000 + i % 5000:.2f}"])
+            date = start + timedelta(seconds=i * 31_536_000 // max(rows, 1))
+            tw.writerow([date.strftime("%Y-%m-%d %H:%M:%S"), u, f"Seed {i}",
+                         f"{1 + i % 500:.2f}", f"seed_order_{i}", "Success", "upi"])
+
+
+def serve(data_dir: Path, rows: int, backend: str, ready):
+    os.environ.update({"DATA_DIR": str(data_dir), "STORAGE_BACKEND": backend})
+    seed(data_dir, rows)
+
+    from werkzeug.serving import make_server
+    from backend import utils
+    from backend.app import create_app
+
+    if backend == "sqlite":
+        utils.migrate_csv_to_sqlite()
+    # build the lazily created indexes now, so the first timed request doesn't pay for them
+    utils.get_order_index().seen("warmup")
+    utils.get_row(utils.DUES_CSV, "seed0")
+    utils.get_row(utils.CUSTOMERS_CSV, "seed0")
+    if utils.get_ledger() is not None:
+        utils.get_ledger().ensure_built()
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no per-request access log
+    server = make_server("127.0.0.1", port, create_app(), threaded=True)
+    ready.put(port)
+    server.serve_forever()
+
+
+# ---------- Load generator ----------
+
+def requests_for(endpoint: str, count: int, rows: int, rng: random.Random) -> list:
+    users = [rng.randrange(rows) for _ in range(count)] if rows else [0] * count
+    if endpoint == "create_customer":
+        return [("/api/create_customer", {"name": f"Bench {rng.random()}", "email": "", "phone": ""})
+                for _ in range(count)]
+    if endpoint == "record_offline_payment":
+        return [("/api/record_offline_payment", {"username": f"seed{u}", "customer": f"Seed {u}", "amount": 1.5})
+                for u in users]
+    if endpoint == "confirm_payment":
+        return [("/api/confirm_payment", {"order_id": f"bench_{i}_{rng.random()}", "customer_name": f"Seed {u}",
+                                          "username": f"seed{u}", "amount": 2.5, "mode": "test"})
+                for i, u in enumerate(users)]
+    return [("/api/change_password", {"username": f"seed{u}", "old_password": f"pw{u}", "new_password": f"pw{u}"})
+            for u in users]
+
+
+def drive(base_url: str, calls: list, threads: int) -> dict:
+    local = threading.local()
+
+    def one(call):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        path, body = call
+        started = time.perf_counter()
+        r = session.post(base_url + path, json=body)
+        elapsed = time.perf_counter() - started
+        return elapsed, r.status_code < 400
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(one, calls))
+    wall = time.perf_counter() - started
+    latencies = sorted(t for t, _ in results)
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+    return {
+        "requests": len(calls),
+        "errors": sum(1 for _, ok in results if not ok),
+        "rps": round(len(calls) / wall, 1),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def run_size(rows: int, args) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    data_dir = Path(tempfile.mkdtemp(prefix="due_tracker_bench_"))
+    server = ctx.Process(target=serve, args=(data_dir, rows, args.backend, ready), daemon=True)
+    server.start()
+    try:
+        port = ready.get(timeout=args.seed_timeout)
+        base_url = f"http://127.0.0.1:{port}"
+        rng = random.Random(rows)
+        results = {}
+        for endpoint in ENDPOINTS:
+            drive(base_url, requests_for(endpoint, args.warmup, rows, rng), args.threads)
+            results[endpoint] = drive(base_url, requests_for(endpoint, args.requests, rows, rng), args.threads)
+            r = results[endpoint]
+            print(f"{rows:>9,} rows  {endpoint:<24} {r['rps']:8.1f} req/s  p50 {r['p50_ms']:7.2f}  "
+                  f"p95 {r['p95_ms']:7.2f}  p99 {r['p99_ms']:7.2f} ms  errors {r['errors']}")
+        return results
+    finally:
+        server.terminate()
+        server.join()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """Regressions: throughput down or p95 up by more than `tolerance` (a fraction)."""
+    problems = []
+    for size, endpoints in current["results"].items():
+        for endpoint, now in endpoints.items():
+            before = baseline.get("results", {}).get(size, {}).get(endpoint)
+            if before is None:
+                continue
+            if now["rps"] < before["rps"] * (1 - tolerance):
+                problems.append(f"{size} {endpoint}: {now['rps']} req/s vs baseline {before['rps']}")
+            if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                problems.append(f"{size} {endpoint}: p95 {now['p95_ms']} ms vs baseline {before['p95_ms']}")
+            if now["errors"] > before.get("errors", 0):
+                problems.append(f"{size} {endpoint}: {now['errors']} errors")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1k,10k", help="comma-separated row counts (1k, 10k, 100k, 1m)")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400, help="timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed-timeout", type=float, default=1800)
+    parser.add_argument("--save", metavar="FILE", help="write the results as a JSON baseline")
+    parser.add_argument("--check", metavar="FILE", help="compare against a baseline; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    current = {
+        "meta": {
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "backend": args.backend,
+            "threads": args.threads,
+            "requests": args.requests,
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        },
+        "results": {},
+    }
+    for size in args.sizes.split(","):
+        rows = parse_size(size)
+        current["results"][str(rows)] = run_size(rows, args)
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline written to {args.save}")
+    if args.check:
+        baseline = json.loads(Path(args.check).read_text(encoding="utf-8"))
+        if baseline.get("meta", {}).get("backend") != args.backend:
+            print(f"note: baseline was recorded with backend={baseline.get('meta', {}).get('backend')}")
+        problems = compare(baseline, current, args.tolerance)
+        if problems:
+            print("REGRESSIONS:\n  " + "\n  ".join(problems))
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} of {args.check}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Mail delivery throughput: one connection per message (send_email) versus
+the pooled queue (queue_email), both against the local SMTP sink.
+
+    python benchmarks/bench_email.py --messages 500 --latency-ms 10 --workers 8
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from smtp_sink import start_sink  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    os.environ.update({
+        "SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(args.port), "SMTP_STARTTLS": "0",
+        "SMTP_USER": "bench", "SMTP_PASS": "bench", "MAIL_WORKERS": str(args.workers),
+    })
+    from backend.notifications import email_service
+
+    controller, handler = start_sink(args.port, args.latency_ms / 1000)
+    try:
+        sequential = max(1, args.messages // 10)  # one connection each: keep it short
+        started = time.perf_counter()
+        ok = sum(email_service.send_email(f"c{i}@example.com", "Bench", "<p>hi</p>")
+                 for i in range(sequential))
+        elapsed = time.perf_counter() - started
+        print(f"send_email : {ok}/{sequential} sent, {sequential / elapsed:8.1f} msg/s, "
+              f"{handler.connections} connections")
+
+        before = handler.connections
+        started = time.perf_counter()
+        futures = [email_service.queue_email(f"c{i}@example.com", "Bench", "<p>hi</p>")
+                   for i in range(args.messages)]
+        ok = sum(f.result() for f in futures)
+        elapsed = time.perf_counter() - started
+        print(f"queue_email: {ok}/{args.messages} sent, {args.messages / elapsed:8.1f} msg/s, "
+              f"{handler.connections - before} connections ({args.workers} workers)")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
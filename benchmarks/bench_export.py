@@ -0,0 +1,100 @@
+"""
+Throughput and memory of the streaming exports (/api/export/transactions).
+
+Starts a server process seeded with --rows customers, dues and transactions
+(see bench_api.py), then downloads the full export in each format over HTTP
+while polling /api/dues?limit=10 from another thread. Reports rows/s and
+output size, how far the server's resident memory rose above its level
+before the export (sampled from /proc, so Linux only), and the latency of
+the small requests served while the export was streaming.
+
+    python benchmarks/bench_export.py                     # 200k rows
+    python benchmarks/bench_export.py --rows 1m --backend sqlite
+"""
+import argparse
+import multiprocessing
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_api import parse_size, serve  # noqa: E402
+
+EXPORTS = ["format=csv", "compress=gzip", "format=parquet"]
+
+
+def rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def export(base_url: str, pid: int, query: str) -> dict:
+    done = threading.Event()
+    baseline = rss_mb(pid)
+    peak = [baseline]
+    latencies = []
+
+    def watch():
+        session = requests.Session()
+        while not done.is_set():
+            peak[0] = max(peak[0], rss_mb(pid))
+            started = time.perf_counter()
+            session.get(f"{base_url}/api/dues?limit=10").raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    started = time.perf_counter()
+    size = 0
+    with requests.get(f"{base_url}/api/export/transactions?{query}", stream=True) as r:
+        r.raise_for_status()
+        for chunk in r.raw.stream(1 << 16, decode_content=False):
+            size += len(chunk)
+    elapsed = time.perf_counter() - started
+    done.set()
+    watcher.join()
+    return {"elapsed": elapsed, "size": size, "rss_growth": peak[0] - baseline,
+            "latencies": latencies or [float("nan")]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="200k")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--seed-timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    rows = parse_size(args.rows)
+    data_dir = Path(tempfile.mkdtemp(prefix="due_tracker_export_"))
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    server = ctx.Process(target=serve, args=(data_dir, rows, args.backend, ready), daemon=True)
+    server.start()
+    try:
+        base_url = f"http://127.0.0.1:{ready.get(timeout=args.seed_timeout)}"
+        print(f"{args.rows} transactions, {args.backend}, data in {data_dir}")
+        for query in EXPORTS:
+            res = export(base_url, server.pid, query)
+            lat = res["latencies"]
+            print(f"{query:<16} {res['size'] / 1e6:8.1f} MB  {rows / res['elapsed']:8.0f} rows/s  "
+                  f"server RSS +{res['rss_growth']:5.1f} MB  /api/dues meanwhile "
+                  f"p50 {statistics.median(lat):5.1f} ms max {max(lat):6.1f} ms")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Order creation throughput and latency against the local fake Razorpay server:
+a new client per order, cached clients, and async mode (202 + polling).
+
+    python benchmarks/bench_orders.py --orders 400 --threads 16 --latency-ms 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_razorpay import start_fake  # noqa: E402
+
+ORDER = {"amount": 100, "mode": "test", "key_id": "rzp_test_bench", "key_secret": "secret",
+         "upi_id": "shop@upi", "customer_name": "Bench", "username": "bench"}
+
+
+def run(app, label: str, orders: int, threads: int, server, body: dict):
+    before_req, before_conn = server.requests, server.connections
+    latencies = []
+
+    def one(_):
+        client = app.test_client()
+        started = time.perf_counter()
+        r = client.post("/api/create_order", json=body)
+        latencies.append(time.perf_counter() - started)
+        if r.status_code == 202:
+            pending_id = r.get_json()["pending_id"]
+            while client.get(f"/api/orders/{pending_id}").get_json()["status"] == "pending":
+                time.sleep(0.005)
+        else:
+            assert r.status_code == 200, r.get_data(as_text=True)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(orders)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(f"{label:<14} {orders / elapsed:8.1f} orders/s  "
+          f"response p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} ms  "
+          f"{server.connections - before_conn:4d} connections for {server.requests - before_req} orders")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="due_tracker_orders_")
+    os.environ["RAZORPAY_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("ORDER_WORKERS", str(args.threads))
+    server = start_fake(args.port, args.latency_ms / 1000)
+
+    from backend import razorpay_orders
+    from backend.app import create_app
+    app = create_app()
+
+    razorpay_orders.RAZORPAY_CLIENT_CACHE = 0
+    run(app, "new client", args.orders, args.threads, server, ORDER)
+    razorpay_orders.RAZORPAY_CLIENT_CACHE = 32
+    run(app, "cached client", args.orders, args.threads, server, ORDER)
+    run(app, "async", args.orders, args.threads, server, dict(ORDER, **{"async": True}))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Cold-start benchmark: import time, create_app() time and time to first request.
+
+Each run starts a fresh interpreter that imports backend.app, builds the app
+and serves it, while this process polls until the first request succeeds.
+Reported per run and as medians; the modules list shows which heavy
+dependencies were loaded before the first request.
+
+    python benchmarks/bench_startup.py                       # 5 runs, 10k seeded rows
+    python benchmarks/bench_startup.py --runs 10 --rows 100k --path /api/dues --backend sqlite
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_api import parse_size, seed  # noqa: E402
+
+HEAVY_MODULES = ["razorpay", "requests", "smtplib", "dotenv", "email.mime.text", "pandas"]
+
+# runs in the child: report timings on stdout, then serve forever
+SERVER = """
+import json, logging, sys, time
+started = time.perf_counter()
+from backend.app import create_app
+imported = time.perf_counter()
+app = create_app()
+built = time.perf_counter()
+from werkzeug.serving import make_server
+logging.getLogger("werkzeug").setLevel(logging.ERROR)
+server = make_server("127.0.0.1", int(sys.argv[1]), app, threaded=True)
+print(json.dumps({"import_ms": (imported - started) * 1000, "create_app_ms": (built - imported) * 1000,
+                  "modules": [m for m in %r if m in sys.modules]}), flush=True)
+server.serve_forever()
+"""
+
+
+def free_port() -> int:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def get(url: str, timeout: float = 30) -> float:
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+        r.read()
+    return (time.perf_counter() - started) * 1000
+
+
+def run_once(env: dict, path: str, timeout: float) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{path}"
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", SERVER % HEAVY_MODULES, str(port)],
+                            cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    try:
+        while True:
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError(f"no answer from {url} after {timeout}s")
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with {proc.returncode}")
+            try:
+                first_ms = get(url)
+                break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        ready_ms = (time.perf_counter() - started) * 1000
+        warm_ms = statistics.median(get(url) for _ in range(5))
+        report = json.loads(proc.stdout.readline())
+    finally:
+        proc.terminate()
+        proc.wait()
+    return dict(report, first_request_ms=first_ms, time_to_first_response_ms=ready_ms, warm_request_ms=warm_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rows", default="10k", help="seeded customers/dues/transactions (1k, 10k, 100k, 1m)")
+    parser.add_argument("--path", default="/api/stats", help="endpoint of the first request")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    data_dir = Path(tempfile.mkdtemp(prefix="due_tracker_startup_"))
+    try:
+        seed(data_dir, parse_size(args.rows))
+        env = dict(os.environ, DATA_DIR=str(data_dir), STORAGE_BACKEND=args.backend,
+                   PYTHONPATH=str(ROOT), WEBHOOK_WORKER="0")
+        if args.backend == "sqlite":
+            subprocess.run([sys.executable, "-m", "backend.sqlite_store", "migrate"],
+                           cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+
+        keys = ["import_ms", "create_app_ms", "time_to_first_response_ms", "first_request_ms", "warm_request_ms"]
+        results = []
+        for i in range(args.runs):
+            r = run_once(env, args.path, args.timeout)
+            results.append(r)
+            print(f"run {i + 1}: " + "  ".join(f"{k[:-3]} {r[k]:7.1f} ms" for k in keys))
+        print("median: " + "  ".join(f"{k[:-3]} {statistics.median(r[k] for r in results):7.1f} ms" for k in keys))
+        print(f"heavy modules loaded at startup: {', '.join(results[-1]['modules']) or 'none'}")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Write throughput with one tenant versus many pinned tenant shards.
+
+Runs the same offline-payment load twice against a throwaway data directory:
+first every process writes to a single shard, then the load is spread over
+--tenants shards with each process pinned to its own (SHARD_WORKER=i/n, see
+backend/shards.py). Each process drives the app in-process from many
+threads; dues and transaction counts are checked to be exact afterwards.
+
+    python benchmarks/bench_tenants.py --processes 4 --tenants 8
+    python benchmarks/bench_tenants.py --backend sqlite --payments 8000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+INITIAL_DUE = 1_000_000.00
+AMOUNT = 1.25
+CUSTOMERS = 25
+API_KEY = "bench-operator"  # naming a tenant with X-Tenant needs the operator key
+
+
+def worker(index: int, processes: int, pinned: bool, threads: int, jobs: list) -> int:
+    if pinned:
+        os.environ["SHARD_WORKER"] = f"{index}/{processes}"
+    from backend.app import create_app
+
+    app = create_app()
+    app.testing = True
+
+    def pay(job):
+        tenant, username = job
+        r = app.test_client().post("/api/record_offline_payment", headers={"X-Tenant": tenant, "x-api-key": API_KEY},
+                                   json={"username": username, "customer": username, "amount": AMOUNT})
+        assert r.status_code == 200, r.get_data(as_text=True)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(pay, jobs))
+    return len(jobs)
+
+
+def run(label: str, tenants: list, pinned: bool, args) -> float:
+    from backend import stats, utils
+    from backend.shards import use_shard, worker_for
+
+    usernames = [f"cust{i}" for i in range(CUSTOMERS)]
+    for tenant in tenants:
+        with use_shard(utils.get_shard(tenant)):
+            utils.put_rows(utils.DUES_CSV, [{"username": u, "customer": u, "due": f"{INITIAL_DUE:.2f}"}
+                                            for u in usernames])
+            stats.rebuild()
+    utils.close_tables()
+
+    per_process = args.payments // args.processes
+    work = []
+    for i in range(args.processes):
+        mine = [t for t in tenants if not pinned or worker_for(t, args.processes) == i]
+        work.append([(mine[n % len(mine)], usernames[n % len(usernames)]) for n in range(per_process)])
+
+    started = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+        total = sum(pool.starmap(worker, [(i, args.processes, pinned, args.threads, jobs)
+                                          for i, jobs in enumerate(work)]))
+    elapsed = time.perf_counter() - started
+
+    paid = {}
+    for jobs in work:
+        for tenant, username in jobs:
+            paid[tenant, username] = paid.get((tenant, username), 0) + 1
+    errors = []
+    for tenant in tenants:
+        with use_shard(utils.get_shard(tenant)):
+            dues = {d["username"]: d["due"] for d in utils.read_csv(utils.DUES_CSV)}
+            for u in usernames:
+                expected = f"{INITIAL_DUE - paid.get((tenant, u), 0) * AMOUNT:.2f}"
+                if dues.get(u) != expected:
+                    errors.append(f"{tenant}/{u}: due {dues.get(u)} != {expected}")
+    if errors:
+        print(f"{label}: FAILED\n  " + "\n  ".join(errors[:10]))
+        sys.exit(1)
+    print(f"{label:<28} {total} payments in {elapsed:6.2f}s  {total / elapsed:7.0f}/s")
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--tenants", type=int, default=8)
+    parser.add_argument("--payments", type=int, default=4000, help="total payments per run")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="due_tracker_tenants_")
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["WEBHOOK_WORKER"] = "0"
+    os.environ["API_KEY"] = API_KEY
+
+    from backend.shards import worker_for
+    # enough tenants that every pinned process owns at least one
+    tenants, n = [], 0
+    while len(tenants) < args.tenants or {worker_for(t, args.processes) for t in tenants} != set(
+            range(args.processes)):
+        tenants.append(f"shop{n}")
+        n += 1
+
+    single = run("1 tenant, shared", ["solo"], False, args)
+    sharded = run(f"{len(tenants)} tenants, pinned", tenants, True, args)
+    print(f"speedup: {sharded / single:.2f}x with {args.processes} processes "
+          f"on {os.cpu_count()} cores; data in {os.environ['DATA_DIR']}")
+
+
+if __name__ == "__main__":
+    main()
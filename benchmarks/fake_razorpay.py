@@ -0,0 +1,80 @@
+"""
+Local stand-in for the Razorpay orders API, for benchmarks and offline testing.
+
+Answers POST /v1/orders with an order after an artificial delay and counts
+requests and TCP connections, so client reuse shows up in the numbers.
+Point the backend at it with RAZORPAY_BASE_URL=http://127.0.0.1:<port>
+
+    python benchmarks/fake_razorpay.py --port 8099 --latency-ms 80
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeRazorpay(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, latency: float = 0.05):
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        super().__init__(("127.0.0.1", port), _Handler)
+
+    def next_id(self) -> str:
+        with self._lock:
+            self.requests += 1
+            return f"order_fake{next(self._ids):010d}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if self.path.rstrip("/") != "/v1/orders" or not self.headers.get("Authorization"):
+            self._reply(400, {"error": {"code": "BAD_REQUEST_ERROR", "description": "bad request"}})
+            return
+        time.sleep(self.server.latency)
+        self._reply(200, {
+            "id": self.server.next_id(), "entity": "order", "amount": body.get("amount"),
+            "currency": body.get("currency", "INR"), "status": "created",
+            "notes": body.get("notes", {}), "created_at": int(time.time()),
+        })
+
+    def _reply(self, code: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_fake(port: int = 8099, latency: float = 0.05) -> FakeRazorpay:
+    server = FakeRazorpay(port, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    args = parser.parse_args()
+    server = FakeRazorpay(args.port, args.latency_ms / 1000)
+    print(f"fake Razorpay on http://127.0.0.1:{args.port}")
+    server.serve_forever()
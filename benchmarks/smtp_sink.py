@@ -0,0 +1,75 @@
+"""
+Local stand-in SMTP server for mail tests and throughput benchmarks.
+
+Accepts any AUTH credentials without TLS, counts connections and messages,
+and can add an artificial per-message latency to mimic a remote provider.
+
+    python benchmarks/smtp_sink.py --port 8025 --latency-ms 20
+
+Point the app at it with:
+    SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_STARTTLS=0 SMTP_USER=test SMTP_PASS=test
+
+Requires aiosmtpd (pip install -r requirements-dev.txt).
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+# aiosmtpd logs a deprecation warning about its own internals on every AUTH
+logging.getLogger("mail.log").setLevel(logging.ERROR)
+
+
+class CountingHandler:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.connections = 0
+        self.messages = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.messages += 1
+        return "250 Message accepted"
+
+
+def start_sink(port: int = 8025, latency: float = 0.0):
+    """Start the sink in a background thread; returns (controller, handler)."""
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+
+    handler = CountingHandler(latency)
+    controller = Controller(
+        handler, hostname="127.0.0.1", port=port,
+        auth_require_tls=False,
+        authenticator=lambda *args: AuthResult(success=True),
+    )
+    controller.start()
+    return controller, handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    controller, handler = start_sink(args.port, args.latency_ms / 1000)
+    print(f"SMTP sink listening on 127.0.0.1:{args.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"connections={handler.connections} messages={handler.messages}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
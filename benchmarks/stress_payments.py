@@ -0,0 +1,115 @@
+"""
+Concurrency stress test for the payment endpoints.
+
+Fires thousands of /api/record_offline_payment and /api/confirm_payment
+calls from several processes, each with many threads, against a throwaway
+data directory, then checks that every customer's final due is exact and
+that every payment produced exactly one transaction row and was counted
+once in the dashboard aggregates.
+
+    python benchmarks/stress_payments.py --processes 4 --threads 16 --payments 4000
+    python benchmarks/stress_payments.py --backend sqlite
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+INITIAL_DUE = 1_000_000.00
+AMOUNT = 1.25
+
+
+def worker(index: int, threads: int, payments: int, usernames: list) -> Counter:
+    from backend.app import create_app
+
+    app = create_app()
+    app.testing = True  # surface server errors with their traceback
+    rng = random.Random(index)
+    jobs = [(rng.choice(usernames), i % 2 == 0) for i in range(payments)]
+
+    def pay(job):
+        username, offline = job
+        client = app.test_client()
+        if offline:
+            r = client.post("/api/record_offline_payment",
+                            json={"username": username, "customer": username, "amount": AMOUNT})
+        else:
+            r = client.post("/api/confirm_payment", json={
+                "order_id": f"order_{index}_{rng.random()}", "customer_name": username,
+                "username": username, "amount": AMOUNT, "mode": "test"})
+        assert r.status_code == 200, r.get_data(as_text=True)
+        return job
+
+    paid = Counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for username, offline in pool.map(pay, jobs):
+            paid[(username, offline)] += 1
+    return paid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--payments", type=int, default=4000, help="total payments across all processes")
+    parser.add_argument("--customers", type=int, default=25)
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="due_tracker_stress_")
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ.setdefault("JOURNAL_COMPACT_EVERY", "250")  # exercise compaction under load
+
+    from backend import utils, stats
+    from backend.records import rupees, to_paise
+    usernames = [f"cust{i}" for i in range(args.customers)]
+    for u in usernames:
+        utils.put_row(utils.DUES_CSV, {"username": u, "customer": u, "due": f"{INITIAL_DUE:.2f}"})
+    stats.rebuild()
+    utils.close_tables()
+
+    per_process = args.payments // args.processes
+    started = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+        results = pool.starmap(worker, [(i, args.threads, per_process, usernames)
+                                        for i in range(args.processes)])
+    elapsed = time.perf_counter() - started
+
+    paid = sum(results, Counter())
+    dues = {d["username"]: d["due"] for d in utils.read_csv(utils.DUES_CSV)}
+    transactions = utils.read_csv(utils.TRANSACTIONS_CSV)
+
+    errors = []
+    for u in usernames:
+        count = paid[(u, True)] + paid[(u, False)]
+        expected = f"{INITIAL_DUE - count * AMOUNT:.2f}"
+        if dues.get(u) != expected:
+            errors.append(f"{u}: due {dues.get(u)} != expected {expected} after {count} payments")
+    total = per_process * args.processes
+    if len(transactions) != total:
+        errors.append(f"{len(transactions)} transaction rows != {total} payments")
+    dashboard = stats.dashboard()
+    expected_due = rupees(sum(to_paise(d) for d in dues.values()))
+    if dashboard["total_due"] != expected_due:
+        errors.append(f"stats total_due {dashboard['total_due']} != {expected_due}")
+    if dashboard["payments_today"]["count"] != total:
+        errors.append(f"stats counted {dashboard['payments_today']['count']} payments != {total}")
+
+    print(f"{total} payments in {elapsed:.2f}s ({total / elapsed:.0f}/s), data in {data_dir}")
+    if errors:
+        print("FAILED:\n  " + "\n  ".join(errors))
+        sys.exit(1)
+    print(f"OK: {len(usernames)} balances exact, {total} transactions recorded, stats exact")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# frontend/api_client.py
+"""
+Data layer for the Streamlit app.
+
+Every request goes through one pooled keep-alive requests.Session per
+Streamlit server process. Reads are cached with st.cache_data for
+FRONTEND_CACHE_TTL seconds and, once an entry expires, revalidated with
+If-None-Match, so an unchanged page costs the backend a 304 instead of a new
+body. Reads are paged (or served from /api/stats), never full-table dumps.
+Writes made through this module clear the cached reads they affect.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+import pandas as pd
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+API_URL = os.getenv("API_URL", "http://localhost:5000/api").rstrip("/")
+API_KEY = os.getenv("API_KEY", "")  # a tenant key selects that shop's data
+TENANT = os.getenv("TENANT", "")  # sent as X-Tenant with the operator API_KEY
+CACHE_TTL = float(os.getenv("FRONTEND_CACHE_TTL", "30"))
+PAGE_SIZE = int(os.getenv("FRONTEND_PAGE_SIZE", "100"))
+POOL_SIZE = int(os.getenv("FRONTEND_POOL_SIZE", "16"))
+TIMEOUT = float(os.getenv("FRONTEND_TIMEOUT", "15"))
+ORDER_WAIT = float(os.getenv("FRONTEND_ORDER_WAIT", "60"))  # how long to poll an async order
+ORDER_POLL_INTERVAL = 0.5
+VALIDATOR_CACHE_SIZE = 1024
+
+
+class _Validators:
+    """(path, params) -> (etag, body) of the latest 200 response, LRU-bounded."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag: str, body):
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+@st.cache_resource
+def _session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if API_KEY:
+        session.headers["X-API-Key"] = API_KEY
+    if TENANT:
+        session.headers["X-Tenant"] = TENANT
+    return session
+
+
+@st.cache_resource
+def _validators() -> _Validators:
+    return _Validators(VALIDATOR_CACHE_SIZE)
+
+
+def _get(path: str, params: dict = None):
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    key = (path, tuple(sorted(params.items())))
+    cached = _validators().get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    r = _session().get(API_URL + path, params=params, headers=headers, timeout=TIMEOUT)
+    if r.status_code == 304 and cached:
+        return cached[1]
+    r.raise_for_status()
+    body = r.json()
+    if r.headers.get("ETag"):
+        _validators().put(key, r.headers["ETag"], body)
+    return body
+
+
+def _post(path: str, invalidate=(), **kwargs) -> requests.Response:
+    r = _session().post(API_URL + path, timeout=TIMEOUT, **kwargs)
+    if r.status_code < 400:
+        for fn in invalidate:
+            fn.clear()
+    return r
+
+
+def _page(path: str, cursor=None, **params):
+    body = _get(path, dict(params, cursor=cursor, limit=PAGE_SIZE))
+    return pd.DataFrame(body.get("items", [])), body.get("next_cursor")
+
+
+# ---------- Cached reads ----------
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def dashboard() -> dict:
+    return _get("/stats")
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def customers_page(cursor: str = None, username: str = None):
+    """(DataFrame, next_cursor) for one page of customers."""
+    return _page("/customers", cursor, username=username)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def dues_page(cursor: str = None, username: str = None, min_due: float = None):
+    return _page("/dues", cursor, username=username, min_due=min_due)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def transactions_page(cursor: str = None):
+    return _page("/transactions", cursor)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def history_page(username: str, cursor: str = None):
+    """One customer's payments, newest first."""
+    return _page(f"/transactions/{quote(username, safe='')}", cursor)
+
+
+def due_of(username: str) -> dict:
+    df, _ = dues_page(username=username)
+    return df.iloc[0].to_dict() if not df.empty else None
+
+
+# ---------- Writes ----------
+
+def _payments_changed():
+    return (dashboard, dues_page, transactions_page, history_page)
+
+
+def login(identifier: str, password: str) -> requests.Response:
+    return _post("/login", json={"username": identifier, "password": password})
+
+
+def add_customer(name: str, email: str, phone: str = "", due: float = 0) -> dict:
+    """Create one customer (with an opening due) through the bulk endpoint; returns its result row."""
+    r = _post("/customers/bulk", invalidate=(dashboard, customers_page, dues_page),
+              data=json.dumps({"name": name, "email": email, "phone": phone, "due": due}) + "\n",
+              headers={"Content-Type": "application/x-ndjson"})
+    if r.status_code >= 400:
+        return {"error": r.json().get("error", "Request failed")}
+    return json.loads(r.text.splitlines()[0])
+
+
+def change_password(username: str, old_password: str, new_password: str) -> requests.Response:
+    return _post("/change_password", json={"username": username, "old_password": old_password,
+                                           "new_password": new_password})
+
+
+def record_offline_payment(username: str, customer: str, amount: float) -> requests.Response:
+    return _post("/record_offline_payment", invalidate=_payments_changed(),
+                 json={"username": username, "customer": customer, "amount": amount})
+
+
+def create_order(async_: bool = False, **order) -> requests.Response:
+    """With async_, the API answers 202 with a pending_id; see await_order()."""
+    return _post("/create_order", json=dict(order, **{"async": True} if async_ else {}))
+
+
+def await_order(r: requests.Response) -> dict:
+    """
+    The order a create_order() response stands for: {"status": "created",
+    "order_id", ...}, {"status": "failed", "error"}, or {"status": "pending"}
+    if an async order is still not created after ORDER_WAIT seconds.
+    """
+    body = r.json()
+    if r.status_code == 200:
+        return body
+    if r.status_code != 202:
+        return {"status": "failed", "error": body.get("error", "Failed to create order")}
+    url = f"{API_URL}/orders/{quote(body['pending_id'], safe='')}"
+    deadline = time.monotonic() + ORDER_WAIT
+    while body.get("status") == "pending" and time.monotonic() < deadline:
+        time.sleep(ORDER_POLL_INTERVAL)
+        r = _session().get(url, timeout=TIMEOUT)
+        body = r.json()
+        if r.status_code != 200:
+            return {"status": "failed", "error": body.get("error", "Failed to create order")}
+    return body
+
+
+def confirm_payment(**payment) -> requests.Response:
+    return _post("/confirm_payment", invalidate=_payments_changed(), json=payment)
@@ -1,40 +1,35 @@
-import streamlit as st
-import pandas as pd
-import requests
 import os
 
-API_URL = os.getenv("API_URL", "http://localhost:5000")
+import requests
+import streamlit as st
+
+import api_client as api
+
+# Razorpay settings for customer payments (see /api/create_order)
+RAZORPAY_MODE = os.getenv("RAZORPAY_MODE", "test")
+RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID", "")
+RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET", "")
+OWNER_UPI = os.getenv("OWNER_UPI", "")
+RAZORPAY_ASYNC = os.getenv("RAZORPAY_ASYNC", "0") == "1"  # create orders in the background and poll
 
 # ---------------- Helper Functions ----------------
-def load_customers():
-    response = requests.get(f"{API_URL}/customers")
-    if response.status_code == 200:
-        return pd.DataFrame(response.json())
-    return pd.DataFrame()
-
-def load_dues():
-    response = requests.get(f"{API_URL}/dues")
-    if response.status_code == 200:
-        return pd.DataFrame(response.json())
-    return pd.DataFrame()
-
-def load_transactions():
-    response = requests.get(f"{API_URL}/transactions")
-    if response.status_code == 200:
-        return pd.DataFrame(response.json())
-    return pd.DataFrame()
-
-def add_customer(name, email, due):
-    response = requests.post(f"{API_URL}/customers", json={"name": name, "email": email, "due": due})
-    return response
-
-def record_payment(customer_id, amount, method="online"):
-    response = requests.post(f"{API_URL}/pay", json={"customer_id": customer_id, "amount": amount, "method": method})
-    return response
-
-def change_customer_password(email, new_password):
-    response = requests.post(f"{API_URL}/change_password", json={"email": email, "new_password": new_password})
-    return response
+def paged_table(key, fetch):
+    """Show one page from `fetch(cursor)` with Previous/Next buttons (cursor stack kept per table)."""
+    cursors = st.session_state.setdefault(f"{key}_cursors", [None])
+    df, next_cursor = fetch(cursors[-1])
+    st.dataframe(df, width="stretch")
+    prev_col, next_col = st.columns(2)
+    if prev_col.button("◀ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if next_col.button("Next ▶", key=f"{key}_next", disabled=not next_cursor):
+        cursors.append(next_cursor)
+        st.rerun()
+
+def logout():
+    for k in list(st.session_state.keys()):
+        del st.session_state[k]
+    st.rerun()
 
 # ---------------- Streamlit App ----------------
 st.set_page_config(page_title="Customer Due Tracker", layout="wide")
@@ -42,182 +37,172 @@ st.set_page_config(page_title="Customer Due Tracker", layout="wide")
 # Login Section
 if "role" not in st.session_state:
     st.session_state.role = None
-if "user_email" not in st.session_state:
-    st.session_state.user_email = None
+if "username" not in st.session_state:
+    st.session_state.username = None
 
 st.title("💰 Customer Due Tracking System")
 
 if st.session_state.role is None:
     st.subheader("Login")
     role = st.selectbox("Login as", ["Owner", "Customer"])
-    username = st.text_input("Username")
+    username = st.text_input("Username or email")
     password = st.text_input("Password", type="password")
     if st.button("Login"):
         if role == "Owner" and username == "admin" and password == "admin":
             st.session_state.role = "owner"
+            st.rerun()
         else:
             # For customers, backend validates
-            response = requests.post(f"{API_URL}/login", json={"email": username, "password": password})
-            if response.status_code == 200:
-                st.session_state.role = "customer"
-                st.session_state.user_email = username
+            try:
+                response = api.login(username, password)
+            except requests.RequestException as e:
+                st.error(f"Request failed: {e}")
             else:
-                st.error("Invalid credentials")
+                if response.status_code == 200:
+                    customer = response.json()["customer"]
+                    st.session_state.role = "customer"
+                    st.session_state.username = customer["username"]
+                    st.session_state.customer_name = customer["name"]
+                    st.rerun()
+                else:
+                    st.error("Invalid credentials")
 
 # Owner Interface
 elif st.session_state.role == "owner":
-    menu = ["Dashboard", "Manage Customers", "Transactions", "Logout"]
+    menu = ["Dashboard", "Manage Customers", "Dues", "Transactions", "Logout"]
     choice = st.sidebar.selectbox("Menu", menu)
 
     if choice == "Dashboard":
         st.subheader("📊 Dashboard")
-        df_customers = load_customers()
-        st.metric("Total Customers", len(df_customers))
-        df_dues = load_dues()
-        st.metric("Total Dues", df_dues["amount"].sum() if not df_dues.empty else 0.0)
+        stats = api.dashboard()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total Customers", stats["total_customers"])
+        col2.metric("Total Dues", f"₹{stats['total_due']:,.2f}")
+        col3.metric("Customers With Dues", stats["customers_with_due"])
+        today = stats["payments_today"]
+        st.metric("Collected Today", f"₹{today['amount']:,.2f}", f"{today['count']} payments")
+        if stats["collections_by_mode"]:
+            st.bar_chart(stats["collections_by_mode"])
 
     elif choice == "Manage Customers":
         st.subheader("Customer Management")
-        df = load_customers()
-        st.dataframe(df)
+        paged_table("customers", api.customers_page)
 
         with st.form("add_customer_form"):
             name = st.text_input("Customer Name")
             email = st.text_input("Customer Email")
+            phone = st.text_input("Customer Phone")
             due = st.number_input("Initial Due Amount", min_value=0.0, step=0.1)
             submitted = st.form_submit_button("Add Customer")
             if submitted:
                 if name and email:
-                    add_customer(name, email, due)
-                    st.success("Customer added successfully!")
+                    result = api.add_customer(name, email, phone, due)
+                    if "error" in result:
+                        st.error(result["error"])
+                    else:
+                        st.success(f"Customer added: username {result['username']}, "
+                                   f"password {result['password']}")
                 else:
                     st.error("Please provide both name and email")
 
+    elif choice == "Dues":
+        st.subheader("Outstanding Dues")
+        min_due = st.number_input("Minimum due", min_value=0.0, step=100.0)
+        paged_table(f"dues_{min_due}", lambda cursor: api.dues_page(cursor, min_due=min_due or None))
+
+        with st.form("offline_payment_form"):
+            username = st.text_input("Username")
+            amount = st.number_input("Amount received", min_value=0.0, step=0.1)
+            if st.form_submit_button("Record Offline Payment"):
+                due = api.due_of(username.strip()) if username.strip() else None
+                if due is None:
+                    st.error("Unknown username")
+                elif amount <= 0:
+                    st.error("Enter an amount")
+                else:
+                    resp = api.record_offline_payment(due["username"], due["customer"], amount)
+                    if resp.status_code == 200:
+                        st.success("Payment recorded")
+                    else:
+                        st.error(resp.json().get("error", "Failed to record payment"))
+
     elif choice == "Transactions":
         st.subheader("Transaction History")
-        df = load_transactions()
-        st.dataframe(df)
+        paged_table("transactions", api.transactions_page)
 
     elif choice == "Logout":
-        st.session_state.role = None
-        st.session_state.user_email = None
-        st.experimental_rerun()
+        logout()
 
 # Customer Interface
 elif st.session_state.role == "customer":
     menu = ["My Dues", "Make Payment", "Transactions", "Change Password", "Logout"]
     choice = st.sidebar.selectbox("Menu", menu)
+    username = st.session_state.username
 
     if choice == "My Dues":
         st.subheader("My Dues")
-        df_dues = load_dues()
-        my_dues = df_dues[df_dues["email"] == st.session_state.user_email]
-        st.dataframe(my_dues)
-
-    elif choice == "Make Payment":
-        st.subheader("Pay Due")
-        df_dues = load_dues()
-        my_dues = df_dues[df_dues["email"] == st.session_state.user_email]
-        if not my_dues.empty:
-            amount = st.number_input("Enter Amount", min_value=0.0, step=0.1)
-            if st.button("Pay"):
-                resp = record_payment(my_dues.iloc[0]["customer_id"], amount)
-                if resp.status_code == 200:
-                    st.success("Payment recorded successfully!")
-                else:
-                    st.error("Payment failed")
-        else:
-            st.info("No dues available")
-
-    elif choice == "Transactions":
-        st.subheader("My Transactions")
-        df = load_transactions()
-        my_txns = df[df["email"] == st.session_state.user_email]
-        st.dataframe(my_txns)
-
-    elif choice == "Change Password":
-        st.subheader("Change Password")
-        new_pass = st.text_input("New Password", type="password")
-        if st.button("Update Password"):
-            resp = change_customer_password(st.session_state.user_email, new_pass)
-            if resp.status_code == 200:
-                st.success("Password updated successfully!")
-            else:
-                st.error("Failed to update password")
-
-    elif choice == "Logout":
-        st.session_state.role = None
-        st.session_state.user_email = None
-        st.experimental_rerun()
-elif st.session_state.role == "customer":
-    menu = ["My Dues", "Make Payment", "Transactions", "Change Password", "Logout"]
-    choice = st.sidebar.selectbox("Menu", menu)
-
-    if choice == "My Dues":
-        st.subheader("My Dues")
-        df_dues = load_dues()
-        my_dues = df_dues[df_dues["email"] == st.session_state.user_email]
-        st.dataframe(my_dues)
+        due = api.due_of(username)
+        st.metric("Outstanding", f"₹{float(due['due']) if due else 0:,.2f}")
 
     elif choice == "Make Payment":
         st.subheader("Pay Due")
-        df_dues = load_dues()
-        my_dues = df_dues[df_dues["email"] == st.session_state.user_email]
-        if not my_dues.empty:
-            amount = st.number_input("Enter Amount", min_value=0.0, step=0.1)
-            if st.button("Pay"):
-                resp = record_payment(my_dues.iloc[0]["customer_id"], amount)
-                if resp.status_code == 200:
-                    st.success("Payment recorded successfully!")
-                else:
-                    st.error("Payment failed")
+        due = api.due_of(username)
+        if due and float(due["due"]) > 0:
+            st.write(f"Outstanding: ₹{float(due['due']):,.2f}")
+            amount = st.number_input("Enter Amount (₹)", min_value=1, step=1)
+            if st.button("Pay Now"):
+                try:
+                    r = api.create_order(amount=int(amount), mode=RAZORPAY_MODE, key_id=RAZORPAY_KEY_ID,
+                                         key_secret=RAZORPAY_KEY_SECRET, upi_id=OWNER_UPI,
+                                         customer_name=due["customer"], username=username,
+                                         async_=RAZORPAY_ASYNC)
+                    with st.spinner("Creating order..."):
+                        order = api.await_order(r)
+                    if order.get("status") == "created":
+                        st.success(f"Order created: {order['order_id']}")
+                        if RAZORPAY_MODE == "test":
+                            st.info("🧪 Use test UPI like `success@razorpay` in Razorpay’s test flow to simulate success.")
+
+                        # Simulated confirmation for testing (replace with webhook in prod)
+                        confirm = api.confirm_payment(order_id=order["order_id"], amount=amount,
+                                                      customer_name=due["customer"], username=username,
+                                                      mode=RAZORPAY_MODE)
+                        if confirm.status_code == 200:
+                            st.success("🎉 Payment confirmed & dues updated.")
+                        else:
+                            st.warning("Payment not confirmed. Please try again.")
+                    elif order.get("status") == "pending":
+                        st.warning(f"Order {order['pending_id']} is still being created. Please try again shortly.")
+                    else:
+                        st.error(order.get("error", "Failed to create order"))
+                except Exception as e:
+                    st.error(f"Request failed: {e}")
         else:
             st.info("No dues available")
 
     elif choice == "Transactions":
         st.subheader("My Transactions")
-        df = load_transactions()
-        my_txns = df[df["email"] == st.session_state.user_email]
-        st.dataframe(my_txns)
+        paged_table("history", lambda cursor: api.history_page(username, cursor))
 
     elif choice == "Change Password":
         st.subheader("Change Password")
+        old_pass = st.text_input("Current Password", type="password")
         new_pass = st.text_input("New Password", type="password")
         if st.button("Update Password"):
-            resp = change_customer_password(st.session_state.user_email, new_pass)
+            resp = api.change_password(username, old_pass, new_pass)
             if resp.status_code == 200:
                 st.success("Password updated successfully!")
             else:
                 st.error("Failed to update password")
 
     elif choice == "Logout":
-        st.session_state.role = None
-        st.session_state.user_email = None
-        st.experimental_rerun()                if st.session_state["mode"] == "test":
-                    st.info("🧪 Use test UPI like `success@razorpay` in Razorpay’s test flow to simulate success.")
-
-                # Simulated confirmation for testing (replace with webhook in prod)
-                confirm = requests.post(f"{API_URL}/confirm_payment", json={
-                    "order_id": order["order_id"],
-                    "amount": amount,
-                    "customer_name": customer_name,
-                    "username": username,
-                    "mode": st.session_state["mode"]
-                })
-                if confirm.status_code == 200:
-                    st.success("🎉 Payment confirmed & dues updated.")
-                else:
-                    st.warning("Payment not confirmed. Please try again.")
-            else:
-                st.error(r.json().get("error", "Failed to create order"))
-        except Exception as e:
-            st.error(f"Request failed: {e}")
+        logout()
 
 st.markdown("---")
 
 with st.expander("ℹ️ How to test payments"):
     st.write("""
-- Set **Mode = Test** and save your **Test Key ID/Secret** and **Owner UPI**.
+- Set **RAZORPAY_MODE=test** with your **RAZORPAY_KEY_ID/RAZORPAY_KEY_SECRET** and **OWNER_UPI** before starting the app.
 - Click **Pay Now** with any amount.
 - This demo calls `/confirm_payment` right away to simulate success and update dues.
 - For production, set up **Razorpay Webhooks** and only update dues after authenticating the webhook signature.